@@ -0,0 +1,47 @@
+import time
+from app.utils.node_index import NodeIndex
+
+NODE_COMMAND = "scontrol show node -o"
+
+class ClusterNodes:
+    """The app's view of the cluster's nodes, kept in a NodeIndex.
+
+    Snapshots go through the CommandCache, so they are reused for the
+    scontrol TTL and screens asking at the same time share one round trip.
+    A snapshot the index has already seen is not looked at again, and a new
+    one only re-indexes the nodes that changed.
+    """
+
+    def __init__(self, command_cache: object, helper_agent: object = None):
+        """
+        :param command_cache: The app's CommandCache.
+        :param helper_agent: An optional HelperAgentManager.
+        """
+        self.command_cache = command_cache
+        self.helper_agent = helper_agent
+        self.index = NodeIndex()
+        self.updated_at = None
+        self._snapshot = None
+
+    @property
+    def loaded(self):
+        return self.updated_at is not None
+
+    async def refresh(self, fresh=False):
+        """Update the index from a snapshot at most a TTL old (or a new one
+        with fresh=True). Returns the index."""
+        if self.helper_agent:
+            snapshot = await self.command_cache.request("nodes", fresh=fresh)
+        else:
+            snapshot = await self.command_cache.run(NODE_COMMAND, fresh=fresh)
+            if not snapshot.ok:
+                raise Exception(snapshot.output)
+        if snapshot is not self._snapshot:
+            self._snapshot = snapshot
+            self.index.update(snapshot if self.helper_agent else snapshot.stdout.splitlines())
+            self.updated_at = time.monotonic()
+        return self.index
+
+    def clear(self):
+        self.index = NodeIndex()
+        self.updated_at = self._snapshot = None
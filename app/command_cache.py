@@ -0,0 +1,154 @@
+import time
+import shlex
+import asyncio
+import fnmatch
+from app.config import COMMAND_CACHE_TTLS, CACHE_INVALIDATION_RULES
+
+# Programs behind the helper agent operations, so both paths share TTLs and
+# invalidation rules.
+HELPER_OP_PROGRAMS = {
+    "queue": "squeue",
+    "pending": "squeue",
+    "history": "sacct",
+    "history_window": "sacct",
+    "list_configs": "ls",
+    "cancel": "scancel",
+    "stat": "stat",
+    "nodes": "scontrol",
+}
+
+SHELL_SEPARATORS = {"&&", "||", ";", "|", "&"}
+
+def command_programs(command):
+    """Names of the programs a shell command line runs, e.g. ['mkdir', 'sbatch'].
+
+    Separators inside quotes (such as squeue -o '%i|%P') do not count.
+    """
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=";&|")
+    lexer.whitespace_split = True
+    try:
+        tokens = list(lexer)
+    except ValueError:
+        # Unbalanced quotes; fall back to plain whitespace splitting
+        tokens = command.split()
+    programs = []
+    starts_command = True
+    for token in tokens:
+        if token in SHELL_SEPARATORS:
+            starts_command = True
+        elif starts_command:
+            programs.append(token.rsplit("/", 1)[-1])
+            starts_command = False
+    return programs
+
+class CommandCache:
+    """TTL cache with single-flight deduplication in front of remote queries.
+
+    Results of read-only commands are kept for the TTL configured for their
+    program in COMMAND_CACHE_TTLS. Identical queries that are already in
+    flight are shared instead of being sent again. Running any command whose
+    program matches a key of CACHE_INVALIDATION_RULES drops the cached results
+    of the programs it lists, e.g. scancel invalidates squeue.
+    """
+
+    def __init__(self, ssh_manager: object, helper_agent: object = None,
+                 ttls=COMMAND_CACHE_TTLS, invalidation_rules=CACHE_INVALIDATION_RULES):
+        """
+        :param ssh_manager: An instance of SSHConnectionManager.
+        :param helper_agent: An optional HelperAgentManager.
+        """
+        self.ssh_manager = ssh_manager
+        self.helper_agent = helper_agent
+        self.ttls = ttls
+        self.invalidation_rules = invalidation_rules
+        # (program, key) -> (expires_at, value)
+        self._entries = {}
+        self._in_flight = {}
+        # Bumped on invalidation so results fetched before it are not stored
+        self._generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    async def run(self, command, fresh=False, **kwargs):
+        """Cached SSHConnectionManager.run_command_async.
+
+        Commands whose program has no TTL are always run, and then trigger
+        the invalidation rules. fresh=True skips the cached value but still
+        joins an identical query that is already in flight.
+        """
+        programs = command_programs(command)
+        program = programs[0] if len(programs) == 1 else None
+        if program in self.ttls:
+            return await self._get(program, command,
+                                   lambda: self.ssh_manager.run_command_async(command, idempotent=True, **kwargs),
+                                   fresh, lambda result: result.ok)
+        try:
+            return await self.ssh_manager.run_command_async(command, **kwargs)
+        finally:
+            self._apply_rules(programs)
+
+    async def request(self, op, fresh=False, **args):
+        """Cached HelperAgentManager.request."""
+        program = HELPER_OP_PROGRAMS.get(op, op)
+        if program in self.ttls:
+            key = (op, tuple(sorted((name, repr(value)) for name, value in args.items())))
+            return await self._get(program, key, lambda: self.helper_agent.request(op, **args), fresh)
+        try:
+            return await self.helper_agent.request(op, **args)
+        finally:
+            self._apply_rules([program])
+
+    def invalidate(self, program=None):
+        """Drop cached results of one program, or everything."""
+        self.invalidations += 1
+        for entry_key in list(self._entries):
+            if program is None or entry_key[0] == program:
+                del self._entries[entry_key]
+        names = [program] if program else set(self._generations) | {key[0] for key in self._in_flight}
+        for name in names:
+            self._generations[name] = self._generations.get(name, 0) + 1
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    async def _get(self, program, key, fetch, fresh, cacheable=lambda result: True):
+        entry_key = (program, key)
+        entry = self._entries.get(entry_key)
+        if entry and not fresh and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        in_flight = self._in_flight.get(entry_key)
+        if in_flight:
+            self.coalesced += 1
+            # Shielded so one caller being cancelled does not cancel the
+            # query for everybody else waiting on it.
+            return await asyncio.shield(in_flight)
+        self.misses += 1
+        generation = self._generations.get(program, 0)
+        task = asyncio.ensure_future(fetch())
+        self._in_flight[entry_key] = task
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            if self._in_flight.get(entry_key) is task:
+                del self._in_flight[entry_key]
+        if cacheable(result) and self._generations.get(program, 0) == generation:
+            self._entries[entry_key] = (time.monotonic() + self.ttls[program], result)
+        return result
+
+    def _apply_rules(self, programs):
+        for program in programs:
+            for pattern, invalidated in self.invalidation_rules.items():
+                if fnmatch.fnmatch(program, pattern):
+                    for name in invalidated:
+                        self.invalidate(name)
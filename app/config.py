@@ -2,8 +2,117 @@ from textual.binding import Binding
 
 SSH_BASE_HOST = "idun-login1.hpc.ntnu.no"
 
+# Seconds before a remote command is abandoned and its channel closed
+COMMAND_TIMEOUT = 30
+# Seconds the helper agent lets a SLURM command run, under COMMAND_TIMEOUT so
+# the app hears about a hung command instead of timing out itself
+HELPER_RUN_TIMEOUT = 25
+# Upper bound on exec channels open at once over the shared transport
+MAX_CONCURRENT_CHANNELS = 8
+# Idempotent commands are re-run this many times after a reconnect
+COMMAND_RETRIES = 2
+
+# Session supervision (seconds)
+KEEPALIVE_INTERVAL = 15
+KEEPALIVE_TIMEOUT = 10
+SUPERVISOR_CHECK_INTERVAL = 5
+RECONNECT_BACKOFF_INITIAL = 1
+RECONNECT_BACKOFF_MAX = 30
+RECONNECT_WAIT_TIMEOUT = 60
+
+# Seconds a read-only command's result is reused, keyed by program name
+COMMAND_CACHE_TTLS = {
+    "squeue": 5,
+    "sacct": 30,
+    "ls": 60,
+    "stat": 60,
+    # Node snapshots for the cluster view (and job lookups for the log viewer)
+    "scontrol": 60,
+}
+# Running a program matching a key drops cached results of the listed programs
+CACHE_INVALIDATION_RULES = {
+    "scancel": ["squeue", "sacct", "scontrol"],
+    "sbatch": ["squeue", "sacct", "scontrol"],
+    "salloc": ["squeue", "scontrol"],
+    "*.slurmconfig": ["squeue", "sacct", "scontrol"],
+    "touch": ["ls", "stat"],
+    "rm": ["ls", "stat"],
+}
+
+# Shared queue poll (seconds): the interval while jobs are pending, starting
+# or changing, the longest interval, how much it grows per unchanged poll,
+# the minimum interval in multiples of the squeue round trip, and how long
+# without input before polling pauses
+QUEUE_POLL_FAST = 3
+QUEUE_POLL_SLOW = 60
+QUEUE_POLL_SLOWDOWN = 1.5
+QUEUE_POLL_LATENCY_FACTOR = 10
+QUEUE_POLL_IDLE_AFTER = 300
+
+# Session daemon (IDUN_SESSION_DAEMON=1): seconds it lingers with no attached
+# UI and no tunnels, and seconds to wait for it to authenticate on start-up
+SESSION_DAEMON_PERSIST = 3600
+SESSION_DAEMON_START_TIMEOUT = 60
+
+# Local job history store: how far back the first sync reaches, how many
+# days each backfill query covers, and how far each incremental sync looks
+# behind the previous one (to allow for clock skew and late accounting)
+HISTORY_BACKFILL_DAYS = 365
+HISTORY_BACKFILL_CHUNK_DAYS = 30
+HISTORY_SYNC_OVERLAP_MINUTES = 10
+
+# Job log viewer: lines kept in memory, redraws per second, and lines of
+# existing output shown when it opens
+LOG_BUFFER_LINES = 10000
+LOG_FRAME_RATE = 20
+LOG_TAIL_INITIAL_LINES = 1000
+
+# Resource monitor: seconds between samples of all monitored jobs, samples
+# kept per metric (an hour's worth), and how long nvidia-smi may take on a node
+RESOURCE_SAMPLE_INTERVAL = 10
+RESOURCE_SAMPLES = 360
+RESOURCE_GPU_TIMEOUT = 20
+
+# Queue wait estimates: seconds between syncs of the history the wait model
+# learns from, and how long SLURM's expected start times are reused while
+# the same jobs are pending
+WAIT_MODEL_REFRESH = 900
+WAIT_ESTIMATE_INTERVAL = 60
+
+# Threads opening SSH channels for new tunnel clients; every tunnel's data
+# is forwarded by one engine thread however many clients there are
+TUNNEL_OPEN_WORKERS = 4
+# Tunnel data path: bytes buffered per direction of each client, the SSH
+# window each channel advertises (how much the node may send ahead), and
+# seconds between retries of a channel whose send window is full
+TUNNEL_BUFFER_SIZE = 256 * 1024
+TUNNEL_WINDOW_SIZE = 4 * 1024 * 1024
+TUNNEL_WINDOW_POLL = 0.001
+# Seconds to wait for the forwarded service to accept a probe connection
+# before a new tunnel is given up on
+TUNNEL_READY_TIMEOUT = 5
+# Seconds between updates of the tunnel traffic shown on the home screen
+# (also the shortest span rates are averaged over), and seconds without
+# clients or traffic before a tunnel is flagged idle
+TUNNEL_STATS_INTERVAL = 2
+TUNNEL_IDLE_AFTER = 15 * 60
+# Local port of the SOCKS5 proxy (dynamic forward) unless IDUN_SOCKS_PORT is set
+SOCKS_PORT = 1080
+
+# Remote file tree (job screen): seconds a directory listing is reused
+# before the directory's mtime is checked, and how many subdirectories of a
+# listed directory are listed ahead in the background
+REMOTE_LISTING_TTL = 30
+REMOTE_PREFETCH_DIRECTORIES = 16
+
 REMOTE_MNT_HOST = "idun-samba1.hpc.ntnu.no"
 REMOTE_MNT_DOMAIN = "WIN-NTNU-NO"
+# Optional CIFS mount of the home directory (IDUN_MOUNT_HOME=1): seconds a
+# mount or unmount command may take, seconds a probe of the mount point may
+# take before the mount counts as hung, and seconds between probes
+MOUNT_TIMEOUT = 30
+MOUNT_PROBE_TIMEOUT = 5
+MOUNT_CHECK_INTERVAL = 30
 
 SUCCESS_COLOR = "#22af4b"
 ERROR_COLOR = "#ee2524"
@@ -0,0 +1,168 @@
+import os
+import json
+import base64
+import asyncio
+import itertools
+from app.ssh_connection import SSHConnectionError, SSHConnectionLostError
+from app.utils.parser import SQUEUE_FORMAT, SQUEUE_COLUMNS, PENDING_FORMAT, PENDING_COLUMNS, SACCT_COLUMNS
+from app.resource_monitor import USAGE_FIELDS, ALLOC_FIELDS, GPU_QUERY
+from app.config import COMMAND_TIMEOUT, HELPER_RUN_TIMEOUT
+
+AGENT_SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "remote_agent.py")
+AGENT_BOOTSTRAP = "import base64,sys;exec(compile(base64.b64decode(sys.argv[1]),'remote_agent','exec'))"
+# First line the agent writes; anything before it (e.g. a banner printed by
+# the user's shell startup files) is not a response
+READY_MARKER = "idun-helper-agent ready"
+# Prepended to the agent's source, so it asks SLURM for exactly the fields the parsers expect
+AGENT_CONSTANTS = {
+    "SQUEUE_FORMAT": SQUEUE_FORMAT,
+    "SQUEUE_FIELDS": SQUEUE_COLUMNS,
+    "PENDING_FORMAT": PENDING_FORMAT,
+    "PENDING_FIELDS": PENDING_COLUMNS,
+    "SACCT_FIELDS": SACCT_COLUMNS,
+    "USAGE_FIELDS": USAGE_FIELDS,
+    "ALLOC_FIELDS": ALLOC_FIELDS,
+    "GPU_QUERY": GPU_QUERY,
+    "READY_MARKER": READY_MARKER,
+    "RUN_TIMEOUT": HELPER_RUN_TIMEOUT,
+}
+# Requests that are safe to send again if the connection drops mid-flight
+IDEMPOTENT_OPS = {"queue", "pending", "history", "history_window", "list_configs", "stat", "resources", "nodes", "ping"}
+
+class HelperAgentError(SSHConnectionError):
+    pass
+
+def agent_source():
+    """remote_agent.py with AGENT_CONSTANTS defined ahead of it."""
+    with open(AGENT_SOURCE_PATH) as f:
+        source = f.read()
+    return "".join(f"{name} = {value!r}\n" for name, value in AGENT_CONSTANTS.items()) + source
+
+class HelperAgentManager:
+    """Talks to a long-lived remote_agent.py process on the login node.
+
+    The agent is started lazily on the first request over one exec channel
+    and answers JSON-framed requests on it, so refreshing the queue or the
+    history no longer costs a channel open and a login shell per command.
+    Requests are pipelined: any number can be outstanding at once and
+    responses are matched back to callers by id.
+    """
+
+    def __init__(self, ssh_manager: object):
+        """
+        :param ssh_manager: An instance of SSHConnectionManager.
+        """
+        self.ssh_manager = ssh_manager
+        self.channel = None
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._buffer = bytearray()
+        self._stderr = bytearray()
+        # Whether READY_MARKER has been read on the current channel
+        self._ready = False
+        self._start_lock = asyncio.Lock()
+
+    @property
+    def running(self):
+        return self.channel is not None and not self.channel.closed
+
+    async def start(self):
+        async with self._start_lock:
+            if self.running:
+                return
+            await self.ssh_manager.ready()
+            transport = self.ssh_manager.get_transport()
+            encoded = base64.b64encode(agent_source().encode()).decode()
+            command = f"python3 -u -c \"{AGENT_BOOTSTRAP}\" {encoded}"
+            loop = asyncio.get_running_loop()
+            self.channel = await loop.run_in_executor(
+                None, self.ssh_manager._open_exec_channel, transport, command)
+            self._buffer.clear()
+            self._stderr.clear()
+            self._ready = False
+            loop.add_reader(self.channel.fileno(), self._on_readable)
+
+    async def request(self, op, timeout=COMMAND_TIMEOUT, **args):
+        """Send one request to the agent and wait for its result.
+
+        Read-only requests are sent again on a fresh agent if the session
+        drops while they are outstanding.
+        """
+        try:
+            return await self._request_once(op, timeout, args)
+        except SSHConnectionLostError:
+            if op not in IDEMPOTENT_OPS:
+                raise
+            self.ssh_manager.supervisor.report_lost()
+            await self.ssh_manager.wait_until_connected()
+            return await self._request_once(op, timeout, args)
+
+    async def _request_once(self, op, timeout, args):
+        if not self.running:
+            await self.start()
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            self.channel.sendall((json.dumps({"id": request_id, "op": op, "args": args}) + "\n").encode())
+            response = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise HelperAgentError(f"Helper agent did not answer '{op}' within {timeout}s.")
+        except OSError as e:
+            error_type = HelperAgentError if self.ssh_manager.is_connected() else SSHConnectionLostError
+            self._shutdown(error_type(f"Helper agent channel failed: {e}"))
+            raise error_type(f"Helper agent channel failed: {e}")
+        finally:
+            self._pending.pop(request_id, None)
+        if not response["ok"]:
+            raise HelperAgentError(response["error"])
+        return response["result"]
+
+    def _on_readable(self):
+        channel = self.channel
+        while channel.recv_stderr_ready():
+            # Only the tail is kept, to explain why the agent died
+            self._stderr = (self._stderr + channel.recv_stderr(32768))[-2048:]
+        finished = channel.eof_received or channel.closed
+        while channel.recv_ready():
+            self._buffer += channel.recv(32768)
+        *lines, rest = self._buffer.split(b"\n")
+        self._buffer = bytearray(rest)
+        for line in lines:
+            if not self._ready:
+                # Shell startup output comes before the agent's own
+                self._ready = line.strip() == READY_MARKER.encode()
+                continue
+            try:
+                response = json.loads(line)
+            except ValueError:
+                # Not ours, e.g. a stray print on the login node; the request it
+                # might have belonged to times out on its own
+                continue
+            if not isinstance(response, dict):
+                continue
+            future = self._pending.get(response.get("id"))
+            if future and not future.done():
+                future.set_result(response)
+        if finished:
+            if self.ssh_manager.is_connected():
+                reason = self._stderr.decode(errors="replace").strip() or "no output"
+                self._shutdown(HelperAgentError(f"Helper agent exited: {reason}"))
+            else:
+                self._shutdown(SSHConnectionLostError("Connection lost while talking to the helper agent."))
+
+    def _shutdown(self, error):
+        if self.channel is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(self.channel.fileno())
+        except RuntimeError:
+            pass
+        self.channel.close()
+        self.channel = None
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def close(self):
+        self._shutdown(SSHConnectionError("Helper agent was stopped."))
@@ -0,0 +1,213 @@
+import os
+import sqlite3
+import asyncio
+import datetime
+import threading
+import platformdirs
+from app.utils.parser import SACCT_COLUMNS, SacctJob, sacct_command, split_row
+from app.config import HISTORY_BACKFILL_DAYS, HISTORY_BACKFILL_CHUNK_DAYS, HISTORY_SYNC_OVERLAP_MINUTES
+
+# Rows are written to SQLite in batches of this size while a window streams in
+MERGE_BATCH_SIZE = 2000
+# Prefixed to every sacct window so the login node's clock sets the watermark
+REMOTE_NOW_COMMAND = "date +%Y-%m-%dT%H:%M:%S"
+
+COLUMN_LIST = ", ".join(f'"{column}"' for column in SACCT_COLUMNS)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS jobs (
+    {", ".join(f'{column} TEXT' for column in COLUMN_LIST.split(", "))},
+    PRIMARY KEY ("JobID")
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS jobs_start ON jobs ("Start");
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+# Sync progress, dropped when columns are added so the next sync refetches
+# the whole history with them
+SYNC_META_KEYS = ("watermark", "backfilled_until", "backfill_complete")
+
+def default_history_path(username, host):
+    return os.path.join(platformdirs.user_data_dir("idun-tui"), f"history-{username}@{host}.sqlite3")
+
+class HistoryStore:
+    """Local SQLite copy of a user's sacct history, kept up to date incrementally.
+
+    Every sync asks sacct only for jobs that were active since the last
+    watermark (minus a small overlap) and upserts them by JobID, so running
+    jobs that finished are updated in place. The first sync fetches the most
+    recent window and then backfills older history one chunk at a time; the
+    progress is stored, so an interrupted backfill resumes where it stopped.
+    With the helper agent, windows are fetched through it instead of a
+    channel and shell per window.
+    """
+
+    def __init__(self, ssh_manager: object, username, path=None, backfill_days=HISTORY_BACKFILL_DAYS,
+                 chunk_days=HISTORY_BACKFILL_CHUNK_DAYS, overlap_minutes=HISTORY_SYNC_OVERLAP_MINUTES,
+                 command_cache=None):
+        """
+        :param ssh_manager: An instance of SSHConnectionManager.
+        :param username: User whose jobs are stored.
+        :param path: SQLite file, defaults to one per user and host in the user data directory.
+        :param command_cache: The app's CommandCache, used when it has a helper agent.
+        """
+        self.ssh_manager = ssh_manager
+        self.command_cache = command_cache
+        self.username = username
+        self.path = path or default_history_path(username, ssh_manager.host)
+        self.backfill = datetime.timedelta(days=backfill_days)
+        self.chunk = datetime.timedelta(days=chunk_days)
+        self.overlap = datetime.timedelta(minutes=overlap_minutes)
+        # sacct rows of the last sync that could not be parsed and were left out
+        self.skipped = 0
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Writes happen in a worker thread so large merges never stall the UI
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        # The history screen and the wait estimator share one store; their syncs take turns
+        self._sync_lock = asyncio.Lock()
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+            self._add_missing_columns()
+
+    def _add_missing_columns(self):
+        """Upgrade a store written by a version with fewer SACCT_COLUMNS."""
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        missing = [column for column in SACCT_COLUMNS if column not in existing]
+        for column in missing:
+            self._db.execute(f'ALTER TABLE jobs ADD COLUMN "{column}" TEXT')
+        if missing:
+            self._db.execute(f"DELETE FROM meta WHERE key IN ({', '.join('?' for _ in SYNC_META_KEYS)})",
+                             SYNC_META_KEYS)
+
+    def jobs(self):
+        """All stored jobs as SacctJobs, most recent first."""
+        with self._lock:
+            rows = self._db.execute(
+                f'SELECT {COLUMN_LIST} FROM jobs ORDER BY "Start" DESC, "JobID" DESC').fetchall()
+        return [SacctJob(*row) for row in rows]
+
+    def jobs_started_outside(self, first, last):
+        """Started jobs whose start is before first or after last (ISO
+        timestamps; None for both gives every started job), in start order.
+
+        A sync only adds jobs that started after the previous one, or before
+        the backfilled part of the history, so this is what changed since a
+        consumer last saw the span first..last.
+        """
+        # Two ranges of the Start index rather than one OR, which would scan the table
+        query = f'SELECT {COLUMN_LIST} FROM jobs WHERE "Start" {{}} ? AND "Start" NOT IN (?, ?) ORDER BY "Start"'
+        with self._lock:
+            rows = self._db.execute(query.format("<"), (first or "", "Unknown", "None")).fetchall()
+            rows += self._db.execute(query.format(">"), (last or "", "Unknown", "None")).fetchall()
+        return [SacctJob(*row) for row in rows]
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def backfill_complete(self):
+        return self.get_meta("backfill_complete") == "1"
+
+    async def sync(self, on_progress=None):
+        """Bring the store up to date, returning the number of rows merged.
+
+        :param on_progress: Called after each window is merged, e.g. to
+                            redraw the table while a backfill is running.
+        """
+        async with self._sync_lock:
+            return await self._sync(on_progress)
+
+    async def _sync(self, on_progress):
+        merged = self.skipped = 0
+        watermark = self.get_meta("watermark")
+        if watermark:
+            start = (datetime.datetime.fromisoformat(watermark) - self.overlap).isoformat(timespec="seconds")
+        else:
+            start = f"now-{self.chunk.days}days"
+        remote_now, count = await self._fetch_window(start, "now")
+        merged += count
+        self.set_meta(watermark=remote_now.isoformat(timespec="seconds"))
+        if not watermark:
+            self.set_meta(backfilled_until=(remote_now - self.chunk).isoformat(timespec="seconds"))
+        if on_progress:
+            on_progress()
+
+        while not self.backfill_complete():
+            until = datetime.datetime.fromisoformat(self.get_meta("backfilled_until"))
+            start = until - self.chunk
+            _, count = await self._fetch_window(start.isoformat(timespec="seconds"), until.isoformat(timespec="seconds"))
+            merged += count
+            oldest = datetime.datetime.fromisoformat(self.get_meta("watermark")) - self.backfill
+            self.set_meta(backfilled_until=start.isoformat(timespec="seconds"),
+                           backfill_complete="1" if start <= oldest else "0")
+            if on_progress:
+                on_progress()
+        return merged
+
+    async def _fetch_window(self, starttime, endtime):
+        """Stream one sacct window into the store; returns (login node time, rows merged)."""
+        if self.command_cache is not None and self.command_cache.helper_agent:
+            return await self._request_window(starttime, endtime)
+        loop = asyncio.get_running_loop()
+        command = f"{REMOTE_NOW_COMMAND} && " + sacct_command(self.username, starttime=starttime, endtime=endtime,
+                                                              allocations_only=True)
+        remote_now = None
+        batch = []
+        merged = 0
+        async with self.ssh_manager.stream_command(command) as stream:
+            async for line in stream:
+                if not line:
+                    continue
+                if remote_now is None:
+                    remote_now = datetime.datetime.fromisoformat(line)
+                    continue
+                try:
+                    batch.append(split_row(line, len(SACCT_COLUMNS), 1))
+                except ValueError:
+                    self.skipped += 1
+                    continue
+                if len(batch) >= MERGE_BATCH_SIZE:
+                    merged += await loop.run_in_executor(None, self._merge, batch)
+                    batch = []
+        if not stream.ok:
+            raise Exception(stream.stderr or f"sacct exited with status {stream.exit_status}")
+        if batch:
+            merged += await loop.run_in_executor(None, self._merge, batch)
+        return remote_now, merged
+
+    async def _request_window(self, starttime, endtime):
+        """_fetch_window through the helper agent, which answers with the whole window at once."""
+        loop = asyncio.get_running_loop()
+        window = await self.command_cache.request("history_window", fresh=True, user=self.username,
+                                                  starttime=starttime, endtime=endtime)
+        rows = []
+        for job in window["jobs"]:
+            try:
+                rows.append([job[column] for column in SACCT_COLUMNS])
+            except KeyError:
+                self.skipped += 1
+        merged = 0
+        for start in range(0, len(rows), MERGE_BATCH_SIZE):
+            merged += await loop.run_in_executor(None, self._merge, rows[start:start + MERGE_BATCH_SIZE])
+        return datetime.datetime.fromisoformat(window["now"]), merged
+
+    def _merge(self, rows):
+        placeholders = ", ".join("?" for _ in SACCT_COLUMNS)
+        with self._lock, self._db:
+            self._db.executemany(f"INSERT OR REPLACE INTO jobs ({COLUMN_LIST}) VALUES ({placeholders})", rows)
+        return len(rows)
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, **values):
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", values.items())
+
+    def close(self):
+        """Close the database. Waits for a merge or query in progress; any
+        later use raises sqlite3.ProgrammingError."""
+        with self._lock:
+            self._db.close()
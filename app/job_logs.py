@@ -0,0 +1,43 @@
+import re
+import shlex
+from app.config import LOG_TAIL_INITIAL_LINES
+from app.utils.slurm_fields import parse_scontrol_record
+
+# Filename patterns of sbatch --output that sacct may report unexpanded
+OUTPUT_PATTERN = re.compile(r"%([%jAaux])")
+
+def expand_output_pattern(path, job_id, username, name="", raw_job_id=None):
+    """Fill in the %j, %A, %a, %u and %x patterns of an --output path.
+
+    :param raw_job_id: sacct's JobIDRaw, the job's own ID, which is what %j
+                       stands for; an array task 123_4 has one of its own,
+                       while %A is the array's 123.
+    """
+    array_job, _, task = job_id.partition("_")
+    values = {"%": "%", "j": raw_job_id or array_job, "A": array_job, "a": task, "u": username, "x": name}
+    return OUTPUT_PATTERN.sub(lambda match: values[match.group(1)], path)
+
+async def job_output_path(command_cache: object, job_id, username):
+    """Path of a job's stdout file on the cluster.
+
+    scontrol knows the jobs slurmctld still holds in memory (queued, running
+    and recently finished); older jobs come from the StdOut field of sacct.
+    """
+    job = shlex.quote(job_id)
+    result = await command_cache.run(f"scontrol show job -o {job}")
+    if result.ok:
+        path = parse_scontrol_record(result.stdout).get("StdOut")
+        if path:
+            return path
+    result = await command_cache.run(f"sacct -j {job} -X -n -P -o JobIDRaw,StdOut,JobName")
+    if result.ok and result.stdout:
+        raw_job_id, _, rest = result.stdout.splitlines()[0].partition("|")
+        # The job name is free text and may hold a '|' of its own
+        path, _, name = rest.partition("|")
+        if path:
+            return expand_output_pattern(path, job_id, username, name, raw_job_id)
+    raise Exception(f"Could not find the output file of job {job_id}.")
+
+def tail_command(path, lines=LOG_TAIL_INITIAL_LINES):
+    """Follow path by name, so a file that is rotated or not created yet is picked up."""
+    return f"tail -n {lines} -F {shlex.quote(path)}"
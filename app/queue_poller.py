@@ -0,0 +1,169 @@
+import time
+import asyncio
+import statistics
+from collections import deque
+from app.utils.parser import parse_squeue_output, squeue_command
+from app.config import QUEUE_POLL_FAST, QUEUE_POLL_SLOW, QUEUE_POLL_SLOWDOWN, QUEUE_POLL_LATENCY_FACTOR
+
+# squeue state codes of jobs that are about to change: pending, configuring
+# (starting) and completing
+CHANGING_STATES = {"PD", "CF", "CG"}
+# Round trips kept for the latency statistics
+LATENCY_SAMPLES = 100
+
+class QueuePoller:
+    """One shared squeue poll that keeps every screen's view of the queue fresh.
+
+    Screens subscribe a callback, which is called on the event loop after
+    every poll with the poller itself, so they read jobs, error and finished
+    from it. The interval adapts:
+      - QUEUE_POLL_FAST while jobs are pending, starting or completing, or
+        right after the queue changed,
+      - growing by QUEUE_POLL_SLOWDOWN per unchanged poll up to QUEUE_POLL_SLOW,
+      - never shorter than QUEUE_POLL_LATENCY_FACTOR round trips, so a slow
+        login node is polled less,
+      - doubling per consecutive error.
+    Polling pauses while nobody is subscribed and while is_active() is false
+    (the terminal is unfocused or idle), and resumes on the next activity.
+    """
+
+    def __init__(self, command_cache: object, ssh_manager: object, helper_agent: object = None, is_active=None):
+        """
+        :param command_cache: The app's CommandCache. Polls always go to the
+                              login node, and one-off queue lookups reuse
+                              their results.
+        :param ssh_manager: An instance of SSHConnectionManager, for the username.
+        :param helper_agent: An optional HelperAgentManager.
+        :param is_active: Returns False while polling should pause.
+        """
+        self.command_cache = command_cache
+        self.ssh_manager = ssh_manager
+        self.helper_agent = helper_agent
+        self.is_active = is_active or (lambda: True)
+        self._subscribers = []
+        self._wake = asyncio.Event()
+        self._snapshot = None
+        self.jobs = None
+        self.error = None
+        # squeue rows of the last poll that could not be parsed and were left out
+        self.skipped = 0
+        # JobIDs that left the queue in the last poll
+        self.finished = set()
+        self.changed = False
+        self.interval = QUEUE_POLL_FAST
+        self.last_poll = None
+        self.paused = False
+        self.polls = 0
+        self.errors = 0
+        self.changes = 0
+        self.consecutive_errors = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def subscribe(self, callback):
+        """Call callback(poller) after every poll, starting with the current
+        jobs if they are known. Polls straight away when they are stale."""
+        self._subscribers.append(callback)
+        if self.jobs is not None or self.error is not None:
+            callback(self)
+        if self.last_poll is None or time.monotonic() - self.last_poll > QUEUE_POLL_FAST:
+            self._wake.set()
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def refresh(self):
+        """Poll now."""
+        self._wake.set()
+
+    def activity(self):
+        """The user did something; resumes a paused poller."""
+        if self.paused:
+            self._wake.set()
+
+    def clear(self):
+        """Forget the queue, e.g. when the user logs out."""
+        self._snapshot = self.jobs = self.error = self.last_poll = None
+        self.finished = set()
+        self.interval = QUEUE_POLL_FAST
+
+    async def run(self):
+        """Poll until cancelled."""
+        while True:
+            if not self._subscribers or not self.is_active():
+                self.paused = True
+                await self._wake.wait()
+                self._wake.clear()
+                self.paused = False
+                continue
+            await self.poll()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def poll(self):
+        """Fetch the queue once and notify the subscribers."""
+        start = time.monotonic()
+        try:
+            username = self.ssh_manager.username
+            if self.helper_agent:
+                output = await self.command_cache.request("queue", fresh=True, user=username)
+            else:
+                result = await self.command_cache.run(squeue_command(username), fresh=True)
+                if not result.ok:
+                    raise Exception(result.output)
+                output = result.stdout
+            jobs = parse_squeue_output(output)
+        except Exception as e:
+            self.last_poll = time.monotonic()
+            self.latencies.append(self.last_poll - start)
+            self.polls += 1
+            self.errors += 1
+            self.consecutive_errors += 1
+            self.error = e
+            self.changed = False
+            self.finished = set()
+            self.interval = min(QUEUE_POLL_FAST * 2 ** self.consecutive_errors, QUEUE_POLL_SLOW)
+            self._notify()
+            return
+        self.last_poll = time.monotonic()
+        latency = self.last_poll - start
+        self.latencies.append(latency)
+        self.polls += 1
+        self.consecutive_errors = 0
+        self.error = None
+        self.skipped = jobs.skipped
+
+        snapshot = {job.job_id: (job.state, job.nodelist) for job in jobs}
+        self.changed = snapshot != self._snapshot
+        self.finished = set(self._snapshot or ()) - snapshot.keys()
+        self._snapshot = snapshot
+        self.jobs = jobs
+        if self.changed:
+            self.changes += 1
+
+        if self.changed or any(job.state in CHANGING_STATES for job in jobs):
+            interval = QUEUE_POLL_FAST
+        else:
+            interval = min(self.interval * QUEUE_POLL_SLOWDOWN, QUEUE_POLL_SLOW)
+        self.interval = max(interval, latency * QUEUE_POLL_LATENCY_FACTOR)
+        self._notify()
+
+    def _notify(self):
+        for callback in list(self._subscribers):
+            callback(self)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            "polls": self.polls,
+            "errors": self.errors,
+            "changes": self.changes,
+            "interval": self.interval,
+            "paused": self.paused,
+            "subscribers": len(self._subscribers),
+            "latency_mean": statistics.mean(latencies) if latencies else None,
+            "latency_p95": latencies[max(int(len(latencies) * 0.95) - 1, 0)] if latencies else None,
+        }
@@ -0,0 +1,181 @@
+"""Helper agent that runs on the login node.
+
+Started once over a single exec channel by HelperAgentManager. Reads one
+JSON request per line from stdin and writes one JSON response per line to
+stdout, tagged with the request id, so many requests can be in flight at
+once. Only uses the standard library and stays compatible with the
+python3 shipped on the login nodes.
+
+HelperAgentManager prepends the constants shared with the app when it
+starts the agent: SQUEUE_FORMAT, SQUEUE_FIELDS, PENDING_FORMAT,
+PENDING_FIELDS and SACCT_FIELDS from app/utils/parser.py, USAGE_FIELDS,
+ALLOC_FIELDS and GPU_QUERY from app/resource_monitor.py, READY_MARKER
+and RUN_TIMEOUT. The agent and the parsers thus always agree on the
+fields.
+"""
+import os
+import sys
+import glob
+import json
+import stat
+import time
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+_write_lock = threading.Lock()
+
+
+def _run(args, timeout=RUN_TIMEOUT):
+    try:
+        process = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 universal_newlines=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError("{} did not finish within {} seconds.".format(args[0], timeout))
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip() or process.stdout.strip())
+    return process.stdout
+
+
+def _split_row(line, fields, name_index):
+    """Split a '|' separated row, keeping any '|' inside the job name."""
+    head = line.split("|", name_index)
+    tail = head.pop().rsplit("|", len(fields) - name_index - 1)
+    return dict(zip(fields, head + tail))
+
+
+def op_queue(user):
+    output = _run(["squeue", "-u", user, "-h", "-o", SQUEUE_FORMAT])
+    return [_split_row(line, SQUEUE_FIELDS, 2) for line in output.splitlines() if line]
+
+
+def op_pending(user):
+    output = _run(["squeue", "-u", user, "-t", "PD", "--start", "-h", "-o", PENDING_FORMAT])
+    return [dict(zip(PENDING_FIELDS, line.split("|"))) for line in output.splitlines() if line]
+
+
+def op_history(user, starttime=None, endtime=None, allocations=False):
+    args = ["sacct", "-u", user, "--parsable2", "--noheader",
+            "--format=" + ",".join(SACCT_FIELDS)]
+    if starttime:
+        args.append("--starttime=" + starttime)
+    if endtime:
+        args.append("--endtime=" + endtime)
+    if allocations:
+        args.append("--allocations")
+    output = _run(args)
+    return [_split_row(line, SACCT_FIELDS, 1) for line in output.splitlines() if line]
+
+
+def op_history_window(user, starttime, endtime):
+    """One window of a history sync: the login node's time, taken before
+    sacct runs, and the allocations active between starttime and endtime."""
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+    return {"now": now, "jobs": op_history(user, starttime, endtime, allocations=True)}
+
+
+def op_list_configs(base, types):
+    paths = []
+    for config_type in types:
+        paths.extend(sorted(glob.glob(os.path.join(base, config_type, "*.slurmconfig"))))
+    return paths
+
+
+def op_cancel(job_id):
+    process = subprocess.run(["scancel", str(job_id)], stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT, universal_newlines=True)
+    return {"exit_status": process.returncode, "output": process.stdout.strip()}
+
+
+def op_stat(paths):
+    stats = {}
+    for path in paths:
+        try:
+            st = os.stat(os.path.expanduser(path))
+        except OSError:
+            stats[path] = None
+            continue
+        stats[path] = {"size": st.st_size, "mtime": st.st_mtime, "mode": st.st_mode,
+                       "is_dir": stat.S_ISDIR(st.st_mode)}
+    return stats
+
+
+def op_nodes():
+    return [line for line in _run(["scontrol", "show", "node", "-o"]).splitlines() if line]
+
+
+def _lines(args, timeout=RUN_TIMEOUT):
+    """Stdout lines of a command that may fail, e.g. sstat on a job that just ended."""
+    try:
+        process = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                 universal_newlines=True, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return []
+    return [line for line in process.stdout.splitlines() if line]
+
+
+def op_resources(usage, alloc=(), gpu=(), gpu_timeout=RUN_TIMEOUT):
+    """sstat usage of the jobs in usage, AllocTRES of those in alloc and
+    nvidia-smi on the nodes of those in gpu, in one round trip."""
+    # One thread per node, so the slowest nvidia-smi sets the time taken
+    with ThreadPoolExecutor(max_workers=max(len(gpu), 1)) as pool:
+        gpu_lines = {job_id: pool.submit(_lines, ["srun", "--overlap", "--jobid=" + job_id, "nvidia-smi",
+                                                  "--query-gpu=" + GPU_QUERY, "--format=csv,noheader,nounits"],
+                                         gpu_timeout)
+                     for job_id in gpu}
+        usage_lines = _lines(["sstat", "-a", "-n", "-P", "-o", USAGE_FIELDS, "-j", ",".join(usage)])
+        alloc_lines = _lines(["sacct", "-X", "-n", "-P", "-o", ALLOC_FIELDS, "-j", ",".join(alloc)]) if alloc else []
+        return {"usage": usage_lines, "alloc": alloc_lines,
+                "gpu": {job_id: future.result() for job_id, future in gpu_lines.items()}}
+
+
+def op_ping():
+    return "pong"
+
+
+OPS = {
+    "queue": op_queue,
+    "pending": op_pending,
+    "history": op_history,
+    "history_window": op_history_window,
+    "list_configs": op_list_configs,
+    "cancel": op_cancel,
+    "stat": op_stat,
+    "resources": op_resources,
+    "nodes": op_nodes,
+    "ping": op_ping,
+}
+
+
+def _respond(message):
+    line = json.dumps(message) + "\n"
+    with _write_lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+
+def _handle(request):
+    try:
+        result = OPS[request["op"]](**request.get("args", {}))
+        _respond({"id": request["id"], "ok": True, "result": result})
+    except Exception as e:
+        _respond({"id": request.get("id"), "ok": False, "error": str(e) or type(e).__name__})
+
+
+def main():
+    sys.stdout.write(READY_MARKER + "\n")
+    sys.stdout.flush()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                _respond({"id": None, "ok": False, "error": "Bad request: {}".format(e)})
+                continue
+            pool.submit(_handle, request)
+
+
+if __name__ == "__main__":
+    main()
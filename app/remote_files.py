@@ -0,0 +1,189 @@
+import stat
+import time
+import threading
+import posixpath
+from dataclasses import dataclass
+from app.config import REMOTE_LISTING_TTL, REMOTE_PREFETCH_DIRECTORIES
+
+@dataclass
+class RemoteEntry:
+    """One entry of a remote directory listing; mtime is the remote Unix time."""
+    name: str
+    is_dir: bool
+    size: int = 0
+    mtime: int = 0
+
+def join(directory, name):
+    return posixpath.normpath(posixpath.join(directory, name))
+
+class RemoteFiles:
+    """Directory listings of the cluster's file system over SFTP, on the
+    shared SSH session instead of a local mount.
+
+    Paths are relative to the home directory unless absolute. A listing is
+    reused for REMOTE_LISTING_TTL seconds; after that one stat of the
+    directory tells whether it changed, and it is only listed again if its
+    mtime did. Listing a directory also drops cached listings of
+    subdirectories whose mtime it shows has changed, and lists up to
+    REMOTE_PREFETCH_DIRECTORIES of its subdirectories in the background, so
+    expanding one of them, or a sibling of the directory expanded last, is
+    answered from the cache.
+    """
+
+    def __init__(self, ssh_manager: object, ttl=REMOTE_LISTING_TTL, prefetch=REMOTE_PREFETCH_DIRECTORIES):
+        """
+        :param ssh_manager: An instance of SSHConnectionManager.
+        :param ttl: Seconds a listing is used without checking the directory's mtime.
+        :param prefetch: Subdirectories of each listed directory to list ahead (0 to disable).
+        """
+        self.ssh_manager = ssh_manager
+        self.ttl = ttl
+        self.prefetch = prefetch
+        self.listed = 0
+        self.revalidated = 0
+        self._sftp = None
+        # One SFTP session serves everything, one request at a time
+        self._sftp_lock = threading.Lock()
+        # Listings by normalised path: (monotonic time checked, directory mtime, entries)
+        self._listings = {}
+        self._prefetch_queue = []
+        self._prefetch_ready = threading.Condition()
+        self._prefetch_thread = None
+
+    def list_dir(self, path):
+        """Entries of the directory at path (hidden ones included), directories
+        first, from the cache without a round trip when it is fresh. Raises
+        IOError for paths that cannot be listed and SSH errors when the
+        session is down."""
+        path = posixpath.normpath(path)
+        listing = self._listings.get(path)
+        entries = listing[2] if self._fresh(listing) else self._fetch(path)
+        self._prefetch_subdirectories(path, entries)
+        return entries
+
+    def clear(self):
+        """Forget every listing and close the SFTP session, e.g. on logout."""
+        with self._prefetch_ready:
+            self._prefetch_queue.clear()
+        with self._sftp_lock:
+            self._listings.clear()
+            self._drop_client()
+
+    def _client(self):
+        """The SFTP session, opened again if the transport it ran on was replaced."""
+        # Loaded with the session already, see SSHConnectionManager.reopen
+        import paramiko
+        transport = self.ssh_manager.get_transport()
+        if self._sftp is None or self._sftp.get_channel().get_transport() is not transport \
+                or self._sftp.get_channel().closed:
+            self._drop_client()
+            self._sftp = paramiko.SFTPClient.from_transport(transport)
+        return self._sftp
+
+    def _drop_client(self):
+        """Close and forget the SFTP session, whose channel would otherwise
+        stay open on a transport that is still up."""
+        if self._sftp is not None:
+            try:
+                self._sftp.close()
+            except Exception:
+                pass
+            self._sftp = None
+
+    def _fresh(self, listing):
+        return listing is not None and time.monotonic() - listing[0] < self.ttl
+
+    def _fetch(self, path):
+        with self._sftp_lock:
+            stale = self._listings.get(path)
+            if self._fresh(stale):
+                # Listed (by the prefetch) while this waited for the session
+                return stale[2]
+            try:
+                sftp = self._client()
+                mtime = self._listed_mtime(path) if stale is None else None
+                if mtime is None:
+                    mtime = sftp.stat(path).st_mtime
+                if stale is not None and mtime == stale[1]:
+                    self.revalidated += 1
+                    self._listings[path] = (time.monotonic(), mtime, stale[2])
+                    return stale[2]
+                entries = self._entries(sftp, path, sftp.listdir_attr(path))
+            except IOError:
+                # The directory is gone or unreadable, the session is fine
+                self._listings.pop(path, None)
+                raise
+            except Exception:
+                self._drop_client()
+                if not self.ssh_manager.is_connected():
+                    self.ssh_manager.supervisor.report_lost()
+                raise
+            self.listed += 1
+            self._listings[path] = (time.monotonic(), mtime, entries)
+        for entry in entries:
+            cached = self._listings.get(join(path, entry.name)) if entry.is_dir else None
+            if cached is not None and cached[1] != entry.mtime:
+                self._listings.pop(join(path, entry.name), None)
+        return entries
+
+    def _listed_mtime(self, path):
+        """The mtime of path in its parent's cached listing, which saves a
+        stat for directories expanded (or prefetched) from the tree."""
+        parent = posixpath.dirname(path) or "."
+        listing = self._listings.get(parent) if parent != path else None
+        name = posixpath.basename(path)
+        for entry in listing[2] if listing else ():
+            if entry.name == name:
+                return entry.mtime
+        return None
+
+    @staticmethod
+    def _entries(sftp, path, attributes):
+        entries = []
+        for attribute in attributes:
+            name = attribute.filename
+            if stat.S_ISLNK(attribute.st_mode or 0):
+                # Follow links so linked directories can be expanded
+                try:
+                    attribute = sftp.stat(join(path, name))
+                except IOError:
+                    pass
+            entries.append(RemoteEntry(name, stat.S_ISDIR(attribute.st_mode or 0),
+                                       attribute.st_size or 0, attribute.st_mtime or 0))
+        entries.sort(key=lambda entry: (not entry.is_dir, entry.name.lower()))
+        return entries
+
+    def _prefetch_subdirectories(self, path, entries):
+        """List (or revalidate) the subdirectories of the directory just shown
+        in the background, ahead of the siblings queued from earlier
+        listings. Hidden directories are left out since the file tree does
+        not show them."""
+        if not self.prefetch:
+            return
+        subdirectories = [join(path, entry.name) for entry in entries
+                          if entry.is_dir and not entry.name.startswith(".")][:self.prefetch]
+        subdirectories = [subdirectory for subdirectory in subdirectories
+                          if not self._fresh(self._listings.get(subdirectory))]
+        with self._prefetch_ready:
+            queued = [path for path in self._prefetch_queue if path not in subdirectories]
+            self._prefetch_queue[:] = subdirectories + queued
+            if not self._prefetch_queue:
+                return
+            self._prefetch_ready.notify()
+            if self._prefetch_thread is None:
+                self._prefetch_thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+                self._prefetch_thread.start()
+
+    def _prefetch_loop(self):
+        while True:
+            with self._prefetch_ready:
+                while not self._prefetch_queue:
+                    self._prefetch_ready.wait()
+                path = self._prefetch_queue.pop(0)
+            if self._fresh(self._listings.get(path)):
+                continue
+            try:
+                self._fetch(path)
+            except Exception:
+                # Not worth retrying ahead of time; it is listed again on demand
+                pass
@@ -1,61 +1,215 @@
 import os
+import time
 import platform
+import tempfile
+import threading
 import subprocess
-from dotenv import load_dotenv
-from app.config import REMOTE_MNT_HOST, REMOTE_MNT_DOMAIN
+from collections import deque
+from app.config import REMOTE_MNT_HOST, REMOTE_MNT_DOMAIN, MOUNT_TIMEOUT, MOUNT_PROBE_TIMEOUT
 
 class CIFSMountError(Exception):
     pass
 
 class RemoteMntManager:
-    def __init__(self):
-        load_dotenv()
-        self.username = os.getenv("IDUN_USERNAME")
-        self.password = os.getenv("IDUN_PASSWORD")
+    """Optional CIFS (SMB) mount of the IDUN home directory, kept up in the
+    background (IDUN_MOUNT_HOME=1).
+
+    A dead SMB server makes even a stat of the mount point hang, so nothing
+    here looks at the mount point on the calling thread. Probes run on a
+    thread of their own and are given up on after MOUNT_PROBE_TIMEOUT
+    seconds, and mount commands are killed after MOUNT_TIMEOUT seconds.
+    check() reuses a live mount (also one left by an earlier run), mounts
+    when nothing is mounted and lazily unmounts and remounts a mount that
+    is stale or hung. state is "unmounted", "mounting", "mounted" or
+    "unavailable", with the reason in error.
+    """
+
+    def __init__(self, context: object = None, enabled=None):
+        """
+        :param context: The app's SSHConnectionManager or SessionDaemonClient,
+                        whose username and password are used for the share.
+        :param enabled: Whether to mount at all, IDUN_MOUNT_HOME=1 by default.
+        """
+        self.context = context
+        self.enabled = os.getenv("IDUN_MOUNT_HOME") == "1" if enabled is None else enabled
         self.system = platform.system().lower()
-        self.mount_point = f"/tmp/smb_mnt_{self.username}"
-        self.remote_path = f"//{REMOTE_MNT_HOST}/{self.username}"
+        self.state = "unmounted"
+        self.error = None
+        self.mount_count = 0
+        self.remount_count = 0
+        self.last_mount_latency = None
+        self.last_probe_latency = None
+        self.mount_latencies = deque(maxlen=50)
+        self.probe_latencies = deque(maxlen=50)
+        # Whether something this manager mounted (or reused) may still be mounted
+        self._mounted = False
+        self._lock = threading.Lock()
+        self._probe_thread = None
+
+    @property
+    def username(self):
+        return getattr(self.context, "username", None) or os.getenv("IDUN_USERNAME")
+
+    @property
+    def password(self):
+        return getattr(self.context, "password", None) or os.getenv("IDUN_PASSWORD")
+
+    @property
+    def mount_point(self):
+        return f"/tmp/smb_mnt_{self.username}"
+
+    @property
+    def remote_path(self):
+        return f"//{REMOTE_MNT_HOST}/{self.username}"
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "mount_point": self.mount_point,
+            "error": self.error,
+            "mount_count": self.mount_count,
+            "remount_count": self.remount_count,
+            "last_mount_latency": self.last_mount_latency,
+            "last_probe_latency": self.last_probe_latency,
+            "mount_latencies": list(self.mount_latencies),
+            "probe_latencies": list(self.probe_latencies),
+        }
+
+    def check(self):
+        """Probe the mount and mount or remount it if needed; returns the
+        new state. Takes at most about MOUNT_PROBE_TIMEOUT plus twice
+        MOUNT_TIMEOUT seconds, so run it off the UI thread."""
+        with self._lock:
+            status = self.probe()
+            if status == "alive":
+                self._mounted = True
+                self.state, self.error = "mounted", None
+                return self.state
+            try:
+                if status != "absent":
+                    # Lazily, so a hung mount is detached instead of waited on
+                    self.remount_count += 1
+                    self._unmount()
+                    # A probe stuck on the detached mount says nothing about the next one
+                    self._probe_thread = None
+                self._mount()
+            except CIFSMountError as e:
+                self.state, self.error = "unavailable", str(e)
+            return self.state
+
+    def probe(self, timeout=MOUNT_PROBE_TIMEOUT):
+        """Whether the share is mounted and answers: "alive", "absent"
+        (nothing mounted), "stale" (the mount point returns errors) or
+        "hung" (no answer within timeout)."""
+        if self._probe_thread is not None and self._probe_thread.is_alive():
+            # The last probe is still stuck; do not pile up threads behind it
+            self.error = f"{self.mount_point} has not answered for over {timeout} seconds."
+            return "hung"
+        mount_point = self.mount_point
+        done = threading.Event()
+        result = {}
 
-    def mount(self):
+        def probe():
+            try:
+                os.lstat(mount_point)
+                if not os.path.ismount(mount_point):
+                    result["status"] = "absent"
+                else:
+                    # statvfs goes to the server, where a stat may be cached
+                    os.statvfs(mount_point)
+                    result["status"] = "alive"
+            except FileNotFoundError:
+                result["status"] = "absent"
+            except OSError as e:
+                result["status"] = "stale"
+                self.error = f"{mount_point} went stale: {e.strerror}"
+            done.set()
+
+        start = time.perf_counter()
+        self._probe_thread = threading.Thread(target=probe, daemon=True)
+        self._probe_thread.start()
+        done.wait(timeout)
+        self.last_probe_latency = time.perf_counter() - start
+        self.probe_latencies.append(self.last_probe_latency)
+        if "status" not in result:
+            self.error = f"{mount_point} did not answer within {timeout} seconds."
+        return result.get("status", "hung")
+
+    def unmount(self):
+        """Unmount the share if this manager mounted or reused it. Waits for
+        a check in progress, but never for the mount point itself. A failure
+        is left in error."""
+        with self._lock:
+            if not self._mounted:
+                self.state = "unmounted"
+                return
+            try:
+                self._unmount()
+            except CIFSMountError as e:
+                self.error = str(e)
+                return
+            self.state = "unmounted"
+
+    def _mount(self):
         if not self.username or not self.password:
             raise CIFSMountError("Missing SMB credentials.")
-
+        self.state = "mounting"
+        start = time.perf_counter()
         try:
-            if os.path.exists(self.mount_point):
-                if os.path.ismount(self.mount_point):
-                    return self.mount_point
-            else:
-                os.makedirs(self.mount_point, exist_ok=True)
-
-            if self.system == "linux":
-                self._mount_linux()
-            elif self.system == "darwin":
-                self._mount_macos()
-            else:
-                raise CIFSMountError(f"Unsupported platform: {self.system}")
-
-            return self.mount_point
-        except subprocess.CalledProcessError as e:
-            raise CIFSMountError(f"Failed to mount SMB share: {e}")
-        
+            os.makedirs(self.mount_point, exist_ok=True)
+        except OSError as e:
+            raise CIFSMountError(f"Could not create {self.mount_point}: {e}")
+        if self.system == "linux":
+            self._mount_linux()
+        elif self.system == "darwin":
+            self._mount_macos()
+        else:
+            raise CIFSMountError(f"Unsupported platform: {self.system}")
+        self._mounted = True
+        self.mount_count += 1
+        self.last_mount_latency = time.perf_counter() - start
+        self.mount_latencies.append(self.last_mount_latency)
+        self.state, self.error = "mounted", None
+
     def _mount_linux(self):
-        command = [
-            "sudo", "mount.cifs",
-            self.remote_path,
-            self.mount_point,
-            "-o", f"username={self.username},domain={REMOTE_MNT_DOMAIN},password={self.password},uid={os.getuid()},gid={os.getgid()}"
-        ]
-        subprocess.run(command, check=True)
+        # The password goes in a credentials file only this user can read,
+        # instead of the command line every process can see
+        with tempfile.NamedTemporaryFile("w", prefix="idun-smb-") as credentials:
+            credentials.write(f"username={self.username}\npassword={self.password}\ndomain={REMOTE_MNT_DOMAIN}\n")
+            credentials.flush()
+            self._run([
+                "sudo", "-n", "mount.cifs",
+                self.remote_path,
+                self.mount_point,
+                "-o", f"credentials={credentials.name},uid={os.getuid()},gid={os.getgid()}"
+            ])
 
     # Don't have a mac so I just yolo'd this based on the docs
     def _mount_macos(self):
         smb_path = f"smb://{REMOTE_MNT_DOMAIN};{self.username}:{self.password}@{REMOTE_MNT_HOST}/{self.username}"
-        command = ["mount_smbfs", smb_path, self.mount_point]
-        subprocess.run(command, check=True)
+        self._run(["mount_smbfs", smb_path, self.mount_point])
 
-    def unmount(self):
+    def _unmount(self):
+        # umount -l (Linux) and -f (macOS) return even when the server is gone
+        self._run(["sudo", "-n", "umount", "-f" if self.system == "darwin" else "-l", self.mount_point])
+        self._mounted = False
+
+    @staticmethod
+    def _run(command, timeout=MOUNT_TIMEOUT):
+        """Run a mount command without a terminal (sudo -n fails instead of
+        asking for a password), killing it after timeout seconds."""
+        # Only the program's name goes in messages, the arguments may hold the password
+        program = command[2] if command[0] == "sudo" else command[0]
+        try:
+            process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE, text=True)
+        except OSError as e:
+            raise CIFSMountError(f"Could not run {program}: {e}")
         try:
-            if os.path.ismount(self.mount_point):
-                subprocess.run(["sudo", "umount", self.mount_point], check=True)
-        except subprocess.CalledProcessError as e:
-            raise CIFSMountError(f"Failed to unmount SMB share: {e}")
+            _, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            raise CIFSMountError(f"{program} did not finish within {timeout} seconds.")
+        if process.returncode != 0:
+            message = stderr.strip().splitlines()[-1] if stderr.strip() else f"exit status {process.returncode}"
+            raise CIFSMountError(f"{program} failed: {message}")
@@ -0,0 +1,294 @@
+import math
+import time
+import shlex
+import asyncio
+from array import array
+from app.utils.slurm_fields import parse_duration, parse_tres
+from app.config import RESOURCE_SAMPLE_INTERVAL, RESOURCE_SAMPLES, RESOURCE_GPU_TIMEOUT, QUEUE_POLL_SLOW
+
+# sstat and sacct fields read per sample; the remote helper agent asks for the same
+USAGE_FIELDS = "JobID,TRESUsageInTot"
+ALLOC_FIELDS = "JobID,AllocTRES"
+GPU_QUERY = "utilization.gpu,memory.used,memory.total"
+
+def sample_command(usage_jobs, alloc_jobs=(), gpu_jobs=(), gpu_timeout=RESOURCE_GPU_TIMEOUT):
+    """One shell command line sampling every monitored job at once.
+
+    Each output line is tagged with the part it came from ('usage|',
+    'alloc|' or 'gpu|<job>|'), see split_sample_output. The nvidia-smi
+    steps run in parallel, so a slow node only delays its own job.
+    """
+    parts = [f"sstat -a -n -P -o {USAGE_FIELDS} -j {','.join(usage_jobs)} 2>/dev/null | sed 's/^/usage|/'"]
+    if alloc_jobs:
+        parts.append(f"sacct -X -n -P -o {ALLOC_FIELDS} -j {','.join(alloc_jobs)} 2>/dev/null | sed 's/^/alloc|/'")
+    for job_id in gpu_jobs:
+        parts.append(f"{{ timeout {gpu_timeout} srun --overlap --jobid={shlex.quote(job_id)} "
+                     f"nvidia-smi --query-gpu={GPU_QUERY} --format=csv,noheader,nounits 2>/dev/null "
+                     f"| sed 's/^/gpu|{job_id}|/' & }}")
+    if gpu_jobs:
+        parts.append("wait")
+    return "; ".join(parts)
+
+def split_sample_output(output):
+    """Lines of a sample_command output, as the helper agent's 'resources' op returns them."""
+    sections = {"usage": [], "alloc": [], "gpu": {}}
+    for line in output.splitlines():
+        tag, _, rest = line.partition("|")
+        if tag == "gpu":
+            job_id, _, rest = rest.partition("|")
+            sections["gpu"].setdefault(job_id, []).append(rest)
+        elif tag in sections:
+            sections[tag].append(rest)
+    return sections
+
+class SampleRing:
+    """The last capacity samples of one metric in a preallocated array of
+    doubles. Missing samples are NaN."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._values = array("d", [math.nan]) * capacity
+        self._next = 0
+        self._count = 0
+
+    def append(self, value):
+        self._values[self._next] = math.nan if value is None else value
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def last(self):
+        """Latest sample, or None if it is missing."""
+        if not self._count:
+            return None
+        value = self._values[self._next - 1]
+        return None if math.isnan(value) else value
+
+    def values(self, count=None):
+        """The last count samples (all by default), oldest first."""
+        count = self._count if count is None else min(count, self._count)
+        start = (self._next - count) % self.capacity
+        if start + count <= self.capacity:
+            return self._values[start:start + count]
+        return self._values[start:] + self._values[:self._next]
+
+class JobSeries:
+    """Sampled resource use of one job, as percentages of what it was allocated."""
+
+    def __init__(self, job_id, capacity=RESOURCE_SAMPLES):
+        self.job_id = job_id
+        # From AllocTRES once sacct has answered: CPUs, memory in MB and GPUs
+        self.cpus = None
+        self.memory = None
+        self.gpus = 0
+        self.cpu = SampleRing(capacity)
+        self.mem = SampleRing(capacity)
+        self.gpu = SampleRing(capacity)
+        self.gpu_mem = SampleRing(capacity)
+        # Latest absolute values: busy CPUs, memory in MB, GPU memory (used, total) in MB
+        self.cpus_busy = None
+        self.memory_used = None
+        self.gpu_memory = None
+        self.samples = 0
+        self._cpu_seconds = None
+        self._sampled_at = None
+
+    @property
+    def allocated(self):
+        return self.cpus is not None
+
+    def set_allocation(self, tres):
+        self.cpus = tres.get("cpu") if isinstance(tres.get("cpu"), int) else None
+        self.memory = tres.get("mem") if isinstance(tres.get("mem"), int) else None
+        # gres/gpu=2, or gres/gpu:a100=2 alongside it
+        gpus = tres.get("gres/gpu", 0)
+        self.gpus = gpus if isinstance(gpus, int) else 0
+
+    def add(self, now, cpu_seconds, memory, gpu_rows):
+        """Record one sample.
+
+        :param cpu_seconds: CPU time used by the job's running steps so far.
+        :param memory: Memory in use by those steps, in MB.
+        :param gpu_rows: (utilization %, memory used MB, memory total MB) per GPU.
+        """
+        cpu = None
+        if cpu_seconds is not None and self._cpu_seconds is not None and cpu_seconds >= self._cpu_seconds:
+            # A step that ended takes its CPU time with it, so a drop is skipped
+            self.cpus_busy = (cpu_seconds - self._cpu_seconds) / (now - self._sampled_at)
+            cpu = 100 * self.cpus_busy / self.cpus if self.cpus else None
+        self._cpu_seconds, self._sampled_at = cpu_seconds, now
+        self.cpu.append(cpu)
+
+        self.memory_used = memory
+        self.mem.append(100 * memory / self.memory if memory is not None and self.memory else None)
+
+        if gpu_rows:
+            used, total = sum(row[1] for row in gpu_rows), sum(row[2] for row in gpu_rows)
+            self.gpu_memory = (used, total)
+            self.gpu.append(sum(row[0] for row in gpu_rows) / len(gpu_rows))
+            self.gpu_mem.append(100 * used / total if total else None)
+        else:
+            self.gpu.append(None)
+            self.gpu_mem.append(None)
+        self.samples += 1
+
+def parse_usage(lines):
+    """{job_id: (cpu seconds, memory MB)} summed over the steps sstat reports."""
+    usage = {}
+    for line in lines:
+        step, _, tres = line.partition("|")
+        job_id = step.partition(".")[0]
+        values = parse_tres(tres)
+        cpu, mem = values.get("cpu"), values.get("mem")
+        cpu_seconds, memory = usage.get(job_id, (0, 0))
+        if isinstance(cpu, str):
+            cpu_seconds += parse_duration(cpu) or 0
+        if isinstance(mem, int):
+            memory += mem
+        usage[job_id] = (cpu_seconds, memory)
+    return usage
+
+def parse_gpu_rows(lines):
+    """(utilization %, memory used MB, memory total MB) for each line of nvidia-smi output."""
+    rows = []
+    for line in lines:
+        try:
+            rows.append(tuple(float(value) for value in line.split(",")))
+        except ValueError:
+            # "[N/A]" and friends from GPUs that do not report a value
+            continue
+    return [row for row in rows if len(row) == 3]
+
+class ResourceMonitor:
+    """Samples CPU, memory and (optionally) GPU use of the monitored jobs.
+
+    However many jobs are monitored, each sample is one command line (or
+    one helper agent request) on one schedule: a single sstat for all jobs,
+    a sacct for the allocations not known yet and, when gpu is enabled, one
+    nvidia-smi per GPU job run inside it with srun --overlap. Subscribers
+    are called on the event loop after every sample with the monitor
+    itself. Sampling pauses while no job is monitored, nobody is subscribed
+    or is_active() is false.
+    """
+
+    def __init__(self, command_cache: object, helper_agent: object = None, gpu=False, is_active=None,
+                 interval=RESOURCE_SAMPLE_INTERVAL, capacity=RESOURCE_SAMPLES):
+        """
+        :param command_cache: The app's CommandCache.
+        :param helper_agent: An optional HelperAgentManager.
+        :param gpu: Sample nvidia-smi on the nodes of jobs that have GPUs.
+        :param is_active: Returns False while sampling should pause.
+        """
+        self.command_cache = command_cache
+        self.helper_agent = helper_agent
+        self.gpu = gpu
+        self.is_active = is_active or (lambda: True)
+        self.interval = interval
+        self.capacity = capacity
+        self.series = {}
+        self.error = None
+        self.samples = 0
+        self.consecutive_errors = 0
+        self.last_latency = None
+        self._subscribers = []
+        self._wake = asyncio.Event()
+
+    def watch(self, job_id):
+        """Start monitoring a job (a no-op if it already is) and sample soon."""
+        if job_id not in self.series:
+            self.series[job_id] = JobSeries(job_id, self.capacity)
+            self._wake.set()
+        return self.series[job_id]
+
+    def forget(self, job_id):
+        self.series.pop(job_id, None)
+
+    def retain(self, job_ids):
+        """Stop monitoring every job not in job_ids, e.g. the ones no longer running."""
+        for job_id in self.series.keys() - set(job_ids):
+            del self.series[job_id]
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+        self._wake.set()
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def activity(self):
+        self._wake.set()
+
+    def clear(self):
+        self.series.clear()
+        self.error = None
+
+    async def run(self):
+        """Sample until cancelled."""
+        while True:
+            if not self.series or not self._subscribers or not self.is_active():
+                await self._wake.wait()
+                self._wake.clear()
+                continue
+            await self.sample()
+            interval = self.interval * 2 ** self.consecutive_errors
+            try:
+                # Only a newly monitored job cuts the wait short
+                await asyncio.wait_for(self._wait_for_new_job(), min(interval, QUEUE_POLL_SLOW))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _wait_for_new_job(self):
+        known = set(self.series)
+        while True:
+            self._wake.clear()
+            await self._wake.wait()
+            if self.series.keys() - known:
+                return
+
+    async def sample(self):
+        """Sample every monitored job once and notify the subscribers."""
+        jobs = list(self.series.values())
+        usage_ids = [series.job_id for series in jobs]
+        alloc_ids = [series.job_id for series in jobs if not series.allocated]
+        gpu_ids = [series.job_id for series in jobs if self.gpu and series.gpus]
+        start = time.monotonic()
+        try:
+            if self.helper_agent:
+                sections = await self.command_cache.request(
+                    "resources", usage=usage_ids, alloc=alloc_ids, gpu=gpu_ids, gpu_timeout=RESOURCE_GPU_TIMEOUT)
+            else:
+                result = await self.command_cache.run(sample_command(usage_ids, alloc_ids, gpu_ids))
+                if not result.ok:
+                    raise Exception(result.output)
+                sections = split_sample_output(result.stdout)
+        except Exception as e:
+            self.error = e
+            self.consecutive_errors += 1
+            self._notify()
+            return
+        now = time.monotonic()
+        self.last_latency = now - start
+        self.error = None
+        self.consecutive_errors = 0
+        self.samples += 1
+
+        for line in sections["alloc"]:
+            job_id, _, tres = line.partition("|")
+            if job_id in self.series:
+                self.series[job_id].set_allocation(parse_tres(tres))
+        usage = parse_usage(sections["usage"])
+        for series in jobs:
+            if self.series.get(series.job_id) is not series:
+                # Forgotten while the sample was in flight
+                continue
+            cpu_seconds, memory = usage.get(series.job_id, (None, None))
+            series.add(now, cpu_seconds, memory, parse_gpu_rows(sections["gpu"].get(series.job_id, ())))
+        self._notify()
+
+    def _notify(self):
+        for callback in list(self._subscribers):
+            callback(self)
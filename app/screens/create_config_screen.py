@@ -2,7 +2,9 @@ import os
 from textual.containers import Container, Horizontal
 from textual.widgets import Label, Input, Button, Select, Checkbox, SelectionList
 from app.screens.base_screen import BaseScreen
-from textual import on
+from textual import on, work
+from app.widgets.node_suggester import NodeListSuggester
+from app.widgets.cluster_availability import ClusterAvailability, gpu_type_options
 from app.config import SUCCESS_COLOR, ERROR_COLOR, GPU_TYPES, SLURM_CONFIG_BASE_PATH
 from app.utils.config_generator import generate_cpu_slurm_config, generate_gpu_slurm_config
 
@@ -20,7 +22,8 @@ class CreateSlurmConfigScreen(BaseScreen):
         )
         self.node_count = Input(placeholder="How many nodes?", id="node-count")
         self.node_names = Input(
-            placeholder="(Leave empty for all) Node list e.g. idun-04-[01,02]", id="node-names"
+            placeholder="(Leave empty for all) Node list e.g. idun-04-[01,02]", id="node-names",
+            suggester=NodeListSuggester(self.app.cluster_nodes)
         )
         self.cpu_cores = Input(
             placeholder="How many CPU cores?", id="cpu-cores"
@@ -34,6 +37,9 @@ class CreateSlurmConfigScreen(BaseScreen):
         self.gpu_count_label = Label("GPU Count:")
         self.gpu_type_label = Label("GPU Type:")
 
+        # What the chosen partition and GPU type have free right now
+        self.availability = ClusterAvailability(id="cluster-availability")
+
         # Send mail checkbox
         self.send_mail_checkbox = Checkbox("Send Mail", id="send-mail")
 
@@ -70,6 +76,7 @@ class CreateSlurmConfigScreen(BaseScreen):
                 # GPU-specific row
                 Horizontal(self.gpu_count_label, self.gpu_count),
                 Horizontal(self.gpu_type_label, self.gpu_type),
+                self.availability,
 
                 # Mail
                 Horizontal(self.send_mail_checkbox),
@@ -85,12 +92,35 @@ class CreateSlurmConfigScreen(BaseScreen):
         """Set initial visibility states."""
         self.update_ui_based_on_slurm_type()
         self.update_ui_based_on_mail_checkbox()
+        self.load_cluster()
+
+    @work(exclusive=True, group="cluster")
+    async def load_cluster(self):
+        """Fill in the GPU types and node names the cluster actually has."""
+        try:
+            index = await self.app.cluster_nodes.refresh()
+        except Exception as e:
+            self.update_status(f"Could not load the cluster's nodes: {e}", color=ERROR_COLOR)
+            return
+        selected = self.gpu_type.value
+        options = gpu_type_options(index)
+        self.gpu_type.set_options(options)
+        if any(value == selected for _, value in options):
+            self.gpu_type.value = selected
+        self.show_availability()
+
+    def show_availability(self):
+        if self.slurm_type.value == "gpu":
+            self.availability.show(self.app.cluster_nodes.index, "GPUQ", self.gpu_type.value)
+        else:
+            self.availability.show(self.app.cluster_nodes.index, "CPUQ")
 
     @on(Select.Changed)
     def handle_select_changed(self, event: Select.Changed):
         """Called when any Select changes (slurm-type or mail-type)."""
         if event.select.id == "slurm-type":
             self.update_ui_based_on_slurm_type()
+        self.show_availability()
 
     @on(Checkbox.Changed)
     def handle_checkbox_changed(self, event: Checkbox.Changed):
@@ -125,8 +155,9 @@ class CreateSlurmConfigScreen(BaseScreen):
         if event.button.id == "submit":
             self.save_slurm_config()
 
-    def save_slurm_config(self):
-        """Generate a Slurm script file and save locally to cpu/ or gpu/."""
+    @work(group="save-config")
+    async def save_slurm_config(self):
+        """Generate a Slurm script file and save it to cpu/ or gpu/ on the cluster."""
         name_val = self.config_name.value.strip()
         slurm_type_val = self.slurm_type.value
         node_count_val = self.node_count.value.strip()
@@ -190,9 +221,12 @@ class CreateSlurmConfigScreen(BaseScreen):
             )
 
         try:
-            self.app.context.run_command(
+            # Writing the file (touch) drops cached config listings
+            result = await self.app.command_cache.run(
                 f"mkdir -p {config_dir} && touch {config_file_path} && echo '{config_content}' > {config_file_path} && chmod +x {config_file_path}"
             )
+            if not result.ok:
+                raise Exception(result.output)
             self.update_status(
                 f"Config saved successfully to {config_file_path}", color=SUCCESS_COLOR
             )
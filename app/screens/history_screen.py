@@ -1,33 +1,47 @@
+import asyncio
 from app.screens.base_screen import BaseScreen
 from textual.containers import Container
-from textual.widgets import Static, DataTable
+from textual.widgets import Static, Input
 from textual.binding import Binding
-from rich.text import Text
-from utils.parser import parse_sacct_output
-from app.config import ERROR_COLOR, SUCCESS_COLOR, WARNING_COLOR
+from textual import on, work
+from app.utils.history_index import HistoryIndex, QUERY_HELP
+from app.widgets.job_table import VirtualJobTable
+from app.config import ERROR_COLOR, SUCCESS_COLOR, WARNING_COLOR, INFO_COLOR
 
 
 class HistoryScreen(BaseScreen):
     """History screen."""
 
+    # The table keeps the initial focus; "/" moves to the filter
+    AUTO_FOCUS = "#job-table"
+
     BINDINGS = [
         Binding("r", "refresh_history", "Refresh History",
                 tooltip="Refetches your history list", priority=False),
+        Binding("/", "focus_search", "Filter",
+                tooltip="Filter the history by name, state, node or date", priority=False),
+        Binding("l", "view_log", "View Log", tooltip="Show the output of the job under the cursor", priority=False),
     ]
 
     def __init__(self):
         super().__init__()
         self.username = self.app.context.username
-        self.job_table = DataTable(id="job-table", cursor_type="row")
+        # Only the rows on screen are built, so the whole history can be scrolled
+        self.job_table = VirtualJobTable("JOBID", "JOBNAME", "STATE", "START", "END", "ELAPSED", "NODELIST",
+                                         id="job-table")
         self.job_table_container = Container(
             self.job_table, id="job-table-container")
-        self.job_table.add_columns("JOBID", "JOBNAME", "STATE", "START", "END", "ELAPSED", "NODELIST")
+        self.search_input = Input(placeholder=f"Filter: {QUERY_HELP}", id="history-search")
+        self.history_index = HistoryIndex([])
+        # The filter the table shows; re-applying it after a sync keeps the table's position
+        self.applied_query = None
         self.selected_row_key = None
         self.selected_job_id = None
         self.selected_node = None
         self.content = Container(
             Static(f"[bold]Welcome, {self.username}![/bold]",
                    classes="welcome-message"),
+            self.search_input,
             self.job_table_container,
             id="home-container"
         )
@@ -36,37 +50,83 @@ class HistoryScreen(BaseScreen):
         yield from super().compose(self.content)
 
     def on_mount(self):
-        """Fetch initial job queue output on mount."""
+        """Show the stored history straight away, then sync it."""
+        # The app's store, which the wait estimator syncs as well
+        self.history_store = self.app.open_history_store()
+        self.load_jobs()
         self.fetch_history()
+        self.app.queue_poller.subscribe(self.on_queue_polled)
+
+    def on_unmount(self):
+        self.app.queue_poller.unsubscribe(self.on_queue_polled)
+        # The store stays open for the wait estimator; the app closes it on logout
+        self.workers.cancel_group(self, "history")
+        self.workers.cancel_group(self, "history-load")
+
+    def on_queue_polled(self, poller):
+        """Jobs that just left the queue have finished; fetch their final state."""
+        if poller.finished:
+            self.fetch_history()
 
     def action_refresh_history(self):
-        """Refresh job queue."""
+        """Fetch jobs that changed since the last sync."""
         self.fetch_history()
 
-    def fetch_history(self):
-        """Fetch and update the job queue output."""
-        self.job_table.clear()
-        self.app.call_later(self.refresh)
+    def action_focus_search(self):
+        self.search_input.focus()
+
+    def action_view_log(self):
+        job = self.job_table.cursor_item
+        if job is None:
+            self.update_status("No job selected.", color=WARNING_COLOR)
+            return
+        self.app.open_log(job.job_id)
 
+    @work(exclusive=True, group="history")
+    async def fetch_history(self):
+        """Sync the local history store with sacct and redraw the table."""
+        self.update_status("Syncing history...", color=INFO_COLOR)
         try:
-            result = self.app.context.run_command(f"sacct -u {self.username} --format=JobID,JobName%50,State,Start,End,Elapsed,NodeList")
+            # Reloaded after every window so a first backfill fills in gradually
+            await self.history_store.sync(on_progress=self.load_jobs)
         except Exception as e:
             self.update_status(str(e), color=ERROR_COLOR)
             self.refresh()
             return
+        self.load_jobs()
 
-        parsed_jobs = parse_sacct_output(result)
-        if parsed_jobs and len(parsed_jobs) > 0:
-            for job in parsed_jobs:
-                row_style = "white"
+    @work(exclusive=True, group="history-load")
+    async def load_jobs(self):
+        """Rebuild the search index from the store and re-apply the filter."""
+        # Loading and indexing a long history takes a while; keep it off the UI thread
+        self.history_index = await asyncio.to_thread(lambda: HistoryIndex(self.history_store.jobs()))
+        self.filter_jobs(self.search_input.value)
 
-                styled_row = [
-                    Text(str(job[col]),
-                         style=f"bold {row_style}", justify="right")
-                    for col in job.keys()
-                ]
+    @on(Input.Changed, "#history-search")
+    def on_search_changed(self, event):
+        self.filter_jobs(event.value)
+
+    @on(Input.Submitted, "#history-search")
+    def on_search_submitted(self):
+        self.job_table.focus()
+
+    @work(exclusive=True, group="history-filter")
+    async def filter_jobs(self, query):
+        index = self.history_index
+        try:
+            # Indexed terms answer in milliseconds, but re: patterns scan the
+            # names, so typing never waits for the search
+            view = await asyncio.to_thread(index.search, query)
+        except ValueError as e:
+            self.update_status(str(e), color=WARNING_COLOR)
+            return
+        self.job_table.set_source(view, keep_position=query == self.applied_query)
+        self.applied_query = query
 
-                self.job_table.add_row(*styled_row)
-            self.update_status("History updated.", color=SUCCESS_COLOR)
+        if not index.size:
+            self.update_status("No history found.", color=WARNING_COLOR)
+        elif self.history_store.skipped:
+            self.update_status(f"{len(view)} matching jobs ({index.size} in history); "
+                               f"{self.history_store.skipped} sacct rows could not be parsed.", color=WARNING_COLOR)
         else:
-            self.update_status("No history found.", color=WARNING_COLOR)
\ No newline at end of file
+            self.update_status(f"{len(view)} matching jobs ({index.size} in history).", color=SUCCESS_COLOR)
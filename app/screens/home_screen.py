@@ -1,11 +1,18 @@
+import os
+import asyncio
+from dataclasses import replace
 from app.screens.base_screen import BaseScreen
-from textual import on
+from textual import on, work
 from textual.containers import Container
 from textual.widgets import Static, Input, DataTable
 from textual.binding import Binding
 from rich.text import Text
-from app.utils.parser import parse_squeue_output
-from app.config import INFO_COLOR, WARNING_COLOR, PORT_COLOR, SUCCESS_COLOR, ERROR_COLOR
+from app.utils.parser import SQUEUE_COLUMNS
+from app.widgets.resource_panel import ResourcePanel
+from app.widgets.wait_estimate import describe_start
+from app.widgets.tunnel_panel import TunnelPanel, tunnel_cell
+from app.tunnel_manager import parse_forward, tunnels_to, TunnelStats, PROXY_KEY
+from app.config import INFO_COLOR, WARNING_COLOR, PORT_COLOR, SUCCESS_COLOR, ERROR_COLOR, TUNNEL_STATS_INTERVAL, SOCKS_PORT
 
 class HomeScreen(BaseScreen):
     BINDINGS = [
@@ -13,6 +20,8 @@ class HomeScreen(BaseScreen):
         Binding("c", "cancel_selected_job", "Cancel Selected Job", tooltip="Cancel the selected job"),
         Binding("t", "setup_tunnel", "Setup SSH Tunnel", tooltip="Create an SSH tunnel", priority=False),
         Binding("ctrl+t", "close_tunnel", "Close SSH Tunnel", tooltip="Close SSH tunnel for a given node", priority=False),
+        Binding("p", "toggle_proxy", "SOCKS Proxy", tooltip="Start or stop a SOCKS5 proxy to every node", priority=False),
+        Binding("l", "view_log", "View Log", tooltip="Follow the output of the selected job", priority=False),
     ]
 
     def __init__(self):
@@ -20,16 +29,35 @@ class HomeScreen(BaseScreen):
         self.username = self.app.context.username
         self.job_table = DataTable(id="job-table", cursor_type="row")
         self.job_table_container = Container(self.job_table, id="job-table-container")
-        self.job_table.add_columns("JOBID", "PARTITION", "NAME", "USER", "ST", "TIME", "NODES", "NODELIST(REASON)", "Tunnel Port")
+        # Rows are keyed by JobID and columns by their label, so a refresh can
+        # update just the cells that changed
+        self.column_keys = (*SQUEUE_COLUMNS, "Est. Start", "Tunnel Port")
+        for column in self.column_keys:
+            self.job_table.add_column(column, key=column)
+        # (value, style, justify) of every cell shown, by JobID
+        self.job_rows = {}
+        # Resource use of the selected job while it runs
+        self.resource_panel = ResourcePanel(gpu=self.app.resource_monitor.gpu, id="resource-panel")
+        self.resource_panel.display = False
+        # Traffic and health of the selected node's tunnels
+        self.tunnel_panel = TunnelPanel(id="tunnel-panel")
+        self.tunnel_panel.display = False
+        # TunnelStats by (node, remote port), updated every TUNNEL_STATS_INTERVAL
+        self.tunnel_stats = {}
         self.content = Container(
             Static(f"[bold]Welcome, {self.username}![/bold]", classes="welcome-message"),
             self.job_table_container,
+            self.resource_panel,
+            self.tunnel_panel,
             id="home-container"
         )
         self.selected_row_key = None
         self.selected_job_id = None
         self.selected_node = None
-        self.port_input = Input(placeholder="Enter local port", id="port-input")
+        # Set by a manual refresh so its result is reported even when nothing changed
+        self.refresh_requested = False
+        self.port_input = Input(placeholder="Local port[:remote port], e.g. 8888:8888 (blank for any free port to sshd)",
+                                id="port-input")
         self.port_input.display = False
 
     @on(DataTable.RowSelected)
@@ -37,8 +65,13 @@ class HomeScreen(BaseScreen):
         table = event.data_table
         row = table.get_row(event.row_key)
         self.selected_row_key = event.row_key
-        self.selected_job_id = row[0]
-        self.selected_node = row[7] if str(row[7]).startswith("idun") else None
+        # Rows are keyed by JobID
+        self.selected_job_id = event.row_key.value
+        self.selected_node = str(row[7]) if str(row[7]).startswith("idun") else None
+        if str(row[4]) == "R":
+            self.app.resource_monitor.watch(self.selected_job_id)
+        self.show_resources()
+        self.show_tunnels()
         self.update_status(f"Selected job: {self.selected_job_id} on node {self.selected_node or 'not allocated'}", color=INFO_COLOR)
 
     def compose(self):
@@ -46,10 +79,26 @@ class HomeScreen(BaseScreen):
         yield self.port_input
 
     def on_mount(self):
-        self.fetch_queue()
+        self.show_connecting()
+        self.app.queue_poller.subscribe(self.on_queue_polled)
+        self.app.resource_monitor.subscribe(self.on_resources_sampled)
+        self.app.wait_estimator.subscribe(self.on_wait_model_updated)
+        self.set_interval(TUNNEL_STATS_INTERVAL, self.update_tunnel_stats)
+
+    @work(group="connecting")
+    async def show_connecting(self):
+        # With the session daemon this asks the daemon, so keep it off the UI thread
+        if not await asyncio.to_thread(self.app.context.is_connected):
+            self.update_status("Connecting to IDUN...", color=INFO_COLOR)
+
+    def on_unmount(self):
+        self.app.queue_poller.unsubscribe(self.on_queue_polled)
+        self.app.resource_monitor.unsubscribe(self.on_resources_sampled)
+        self.app.wait_estimator.unsubscribe(self.on_wait_model_updated)
 
     def action_refresh_jobs(self):
-        self.fetch_queue()
+        self.refresh_requested = True
+        self.app.queue_poller.refresh()
 
     def action_cancel_selected_job(self):
         if self.selected_job_id:
@@ -57,6 +106,12 @@ class HomeScreen(BaseScreen):
         else:
             self.update_status("No job selected.", color=WARNING_COLOR)
 
+    def action_view_log(self):
+        if self.selected_job_id:
+            self.app.open_log(self.selected_job_id)
+        else:
+            self.update_status("No job selected.", color=WARNING_COLOR)
+
     def action_setup_tunnel(self):
         if not self.selected_node:
             self.update_status("No node selected for tunnel setup.", color=WARNING_COLOR)
@@ -64,69 +119,209 @@ class HomeScreen(BaseScreen):
         self.port_input.display = True
         self.port_input.focus()
 
-    def action_close_tunnel(self):
+    @work(group="tunnel")
+    async def action_close_tunnel(self):
         if not self.selected_node:
             self.update_status("No node selected for tunnel closure.", color=WARNING_COLOR)
             return
         self.update_status(f"Closing SSH tunnel to {self.selected_node}...", color=INFO_COLOR)
         try:
-            result = self.app.tunnel_manager.close_tunnel(str(self.selected_node))
+            # With the session daemon this is a round trip to the daemon
+            result = await asyncio.to_thread(self.app.tunnel_manager.close_tunnel, str(self.selected_node))
             self.update_status(f"{result}", color=SUCCESS_COLOR)
         except Exception as e:
             self.update_status(f"Tunnel closure failed: {e}", color=ERROR_COLOR)
-        self.fetch_queue()
+        self.redraw_jobs()
+        self.show_tunnels()
+        self.refresh()
+
+    @work(group="tunnel")
+    async def action_toggle_proxy(self):
+        tunnel_manager = self.app.tunnel_manager
+        try:
+            if PROXY_KEY in tunnel_manager.tunnels:
+                result = await asyncio.to_thread(tunnel_manager.close_proxy)
+            else:
+                port = int(os.getenv("IDUN_SOCKS_PORT", SOCKS_PORT))
+                result = await asyncio.to_thread(tunnel_manager.setup_proxy, port)
+            self.update_status(result, color=SUCCESS_COLOR)
+        except Exception as e:
+            self.update_status(f"SOCKS proxy failed: {e}", color=ERROR_COLOR)
+        self.show_tunnels()
         self.refresh()
 
     def on_input_submitted(self, event):
         if event.input.id == "port-input":
-            local_port = event.value
-            if local_port.isdigit():
-                self.create_ssh_tunnel(local_port)
+            try:
+                local_port, remote_port = parse_forward(event.value)
+            except ValueError as e:
+                self.update_status(str(e), color=ERROR_COLOR)
             else:
-                self.update_status("Invalid port number.", color=ERROR_COLOR)
+                self.create_ssh_tunnel(str(self.selected_node), local_port, remote_port)
             self.port_input.display = False
 
-    def fetch_queue(self):
-        self.job_table.clear()
+    def on_queue_polled(self, poller):
+        """Called on every poll of the shared queue poller."""
+        if poller.error is not None:
+            self.update_status(str(poller.error), color=ERROR_COLOR)
+            self.refresh()
+            return
+        self.update_job_table(poller.jobs)
+        pending = [job.job_id for job in poller.jobs if job.state == "PD"]
+        if pending:
+            self.estimate_starts(pending)
+            if self.app.wait_estimator.stale:
+                self.app.fit_wait_model()
+        # Jobs are monitored from when they are selected until they stop running
+        self.app.resource_monitor.retain(job.job_id for job in poller.jobs if job.state == "R")
+        self.show_resources()
+        self.show_tunnels()
+        if poller.changed or self.refresh_requested:
+            self.refresh_requested = False
+            if poller.skipped:
+                self.update_status(f"Job queue updated; {poller.skipped} squeue rows could not be parsed.",
+                                   color=WARNING_COLOR)
+            elif poller.jobs:
+                self.update_status("Job queue updated.", color=SUCCESS_COLOR)
+            else:
+                self.update_status("No jobs found.", color=WARNING_COLOR)
+        self.refresh()
+
+    def on_wait_model_updated(self, estimator):
+        self.redraw_jobs()
+
+    @work(exclusive=True, group="start-estimates")
+    async def estimate_starts(self, job_ids):
+        """Fetch SLURM's expected start times of the pending jobs, if they are due."""
+        estimator = self.app.wait_estimator
+        pending = estimator.pending
         try:
-            result = self.app.context.run_command(f"squeue -u {self.username}")
+            if await estimator.fetch_pending(job_ids) is not pending:
+                self.redraw_jobs()
         except Exception as e:
-            self.update_status(str(e), color=ERROR_COLOR)
-            self.refresh()
+            self.update_status(f"Could not estimate start times: {e}", color=WARNING_COLOR)
+
+    def on_resources_sampled(self, monitor):
+        """Called after every sample of the shared resource monitor."""
+        self.show_resources()
+
+    def show_resources(self):
+        monitor = self.app.resource_monitor
+        series = monitor.series.get(self.selected_job_id)
+        self.resource_panel.display = series is not None
+        self.resource_panel.show(series, monitor.error)
+
+    def show_tunnels(self):
+        """The selected node's tunnels and the SOCKS proxy, if running."""
+        tunnel_manager = self.app.tunnel_manager
+        tunnels = tunnels_to(tunnel_manager.tunnels, self.selected_node) if self.selected_node else []
+        if PROXY_KEY in tunnel_manager.tunnels:
+            tunnels.append(tunnel_manager.tunnels[PROXY_KEY])
+        self.tunnel_panel.show(tunnels, self.tunnel_stats)
+
+    @work(exclusive=True, group="tunnel-stats")
+    async def update_tunnel_stats(self):
+        if not self.app.tunnel_manager.tunnels and not self.tunnel_stats:
             return
-        parsed_jobs = parse_squeue_output(result, self.username)
-        if parsed_jobs and len(parsed_jobs) > 0:
-            for job in parsed_jobs:
-                row_style = INFO_COLOR if "CPUQ" in job["PARTITION"] else SUCCESS_COLOR if "GPUQ" in job["PARTITION"] else "white"
-                styled_row = [Text(str(job[col]), style=f"bold {row_style}", justify="right") for col in job.keys()]
-                if self.app.tunnel_manager.tunnels.get(job["NODELIST(REASON)"]):
-                    (local_port, _, _, _) = self.app.tunnel_manager.tunnels[job["NODELIST(REASON)"]]
-                    styled_row.append(Text(str(local_port), style=f"bold {PORT_COLOR}", justify="left"))
-                else:
-                    styled_row.append(Text("N/A", style=f"bold {row_style}", justify="left"))
-                self.job_table.add_row(*styled_row)
-            self.update_status("Job queue updated.", color=SUCCESS_COLOR)
+        # With the session daemon this asks the daemon for its counters
+        try:
+            self.tunnel_stats = await asyncio.to_thread(self.app.tunnel_manager.stats)
+        except Exception as e:
+            # E.g. the daemon is gone; nothing is forwarded until it is back
+            self.tunnel_stats = {key: replace(self.tunnel_stats.get(key) or TunnelStats(), health="dead", last_error=str(e))
+                                 for key in list(self.app.tunnel_manager.tunnels)}
+        self.redraw_jobs()
+        self.show_tunnels()
+
+    def redraw_jobs(self):
+        """Redraw the tunnel ports and start estimates without polling the queue again."""
+        if self.app.queue_poller.jobs is not None:
+            self.update_job_table(self.app.queue_poller.jobs)
+
+    def job_cells(self, job):
+        """(value, style, justify) of every cell in the row for job."""
+        row_style = INFO_COLOR if "CPUQ" in job.partition else SUCCESS_COLOR if "GPUQ" in job.partition else "white"
+        cells = [(value, f"bold {row_style}", "right") for value in job.row()]
+        pending = self.app.wait_estimator.pending.get(job.job_id) if job.state == "PD" else None
+        if pending is not None:
+            cells.append((describe_start(*self.app.wait_estimator.estimate_pending(pending), pending.submit),
+                          f"bold {row_style}", "right"))
         else:
-            self.update_status("No jobs found.", color=WARNING_COLOR)
-        self.refresh()
+            cells.append(("N/A", f"bold {row_style}", "right"))
+        tunnels = tunnels_to(self.app.tunnel_manager.tunnels, job.nodelist)
+        if tunnels:
+            value, health = tunnel_cell(tunnels, self.tunnel_stats)
+            color = {"ok": PORT_COLOR, "idle": WARNING_COLOR, "dead": ERROR_COLOR}[health]
+            cells.append((value, f"bold {color}", "left"))
+        else:
+            cells.append(("N/A", f"bold {row_style}", "left"))
+        return tuple(cells)
+
+    def update_job_table(self, jobs):
+        """Bring the table in line with jobs, touching only the rows and cells
+        that changed, so the cursor and selection survive a refresh."""
+        table = self.job_table
+        cursor_key = None
+        if table.row_count:
+            cursor_key = table.coordinate_to_cell_key(table.cursor_coordinate).row_key
+        rows = {job.job_id: self.job_cells(job) for job in jobs}
+
+        for job_id in self.job_rows.keys() - rows.keys():
+            table.remove_row(job_id)
+        for job_id, cells in rows.items():
+            old_cells = self.job_rows.get(job_id)
+            if old_cells is None:
+                table.add_row(*(Text(value, style=style, justify=justify) for value, style, justify in cells),
+                              key=job_id)
+                continue
+            for column, old_cell, cell in zip(self.column_keys, old_cells, cells):
+                if cell != old_cell:
+                    value, style, justify = cell
+                    table.update_cell(job_id, column, Text(value, style=style, justify=justify), update_width=True)
+        self.job_rows = rows
 
-    def cancel_job(self, job_id):
+        # Keep squeue's order; new jobs were appended at the bottom
+        order = {job_id: index for index, job_id in enumerate(rows)}
+        if [row.key.value for row in table.ordered_rows] != list(rows):
+            table.sort(SQUEUE_COLUMNS[0], key=lambda job_id: order[job_id.plain])
+
+        if cursor_key is not None and cursor_key.value in rows:
+            table.move_cursor(row=table.get_row_index(cursor_key), scroll=False)
+        if self.selected_job_id not in rows:
+            self.selected_row_key = self.selected_job_id = self.selected_node = None
+        else:
+            # A pending job that started now has a node to tunnel to
+            node = rows[self.selected_job_id][7][0]
+            self.selected_node = node if node.startswith("idun") else None
+
+    @work(group="cancel")
+    async def cancel_job(self, job_id):
         self.update_status(f"Canceling job {job_id}...", color=INFO_COLOR)
         try:
-            self.app.context.run_command(f"scancel {job_id}")
+            if self.app.helper_agent:
+                result = await self.app.command_cache.request("cancel", job_id=job_id)
+                exit_status, output = result["exit_status"], result["output"]
+            else:
+                result = await self.app.command_cache.run(f"scancel {job_id}")
+                exit_status, output = result.exit_status, result.output
+            if exit_status != 0:
+                raise Exception(output)
             self.update_status(f"Job {job_id} canceled!", color=SUCCESS_COLOR)
-            self.fetch_queue()
+            self.app.queue_poller.refresh()
         except Exception as e:
             self.update_status(f"Error canceling job: {e}", color=ERROR_COLOR)
         self.refresh()
 
-    def create_ssh_tunnel(self, local_port):
-        self.update_status(f"Setting up SSH tunnel on port {local_port}...", color=INFO_COLOR)
+    @work(group="tunnel")
+    async def create_ssh_tunnel(self, node, local_port, remote_port):
+        self.update_status(f"Setting up SSH tunnel to {node}:{remote_port}...", color=INFO_COLOR)
         try:
-            result = self.app.tunnel_manager.setup_tunnel(str(self.selected_node), local_port)
-            self.fetch_queue()
+            # Probing the forwarded port takes a round trip to the login node
+            result = await asyncio.to_thread(self.app.tunnel_manager.setup_tunnel, node, local_port, remote_port)
+            self.redraw_jobs()
+            self.show_tunnels()
             self.update_status(f"{result}", color=SUCCESS_COLOR)
         except Exception as e:
-            self.update_status(f"Tunnel setup failed: {e} {local_port}", color=ERROR_COLOR)
+            self.update_status(f"Tunnel setup failed: {e}", color=ERROR_COLOR)
         self.refresh()
 
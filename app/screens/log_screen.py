@@ -0,0 +1,115 @@
+from app.screens.base_screen import BaseScreen
+from textual.containers import Container
+from textual.widgets import Static, Input
+from textual.binding import Binding
+from textual import on, work
+from app.job_logs import job_output_path, tail_command
+from app.widgets.log_view import LogView
+from app.config import ERROR_COLOR, SUCCESS_COLOR, WARNING_COLOR, INFO_COLOR
+
+class LogScreen(BaseScreen):
+    """Follows the output file of one job, opened on top of the job tables."""
+
+    AUTO_FOCUS = "#log-view"
+
+    BINDINGS = [
+        Binding("escape", "close_log", "Back", tooltip="Close the log and go back"),
+        Binding("p", "toggle_pause", "Pause/Resume", tooltip="Freeze the log while it keeps streaming"),
+        Binding("/", "focus_search", "Search", tooltip="Search the log (pauses it)"),
+        Binding("n", "next_match", "Next Match", tooltip="Jump to the next search match"),
+        Binding("N", "previous_match", "Previous Match", tooltip="Jump to the previous search match"),
+        Binding("G", "jump_to_end", "Jump to End", tooltip="Resume and follow the end of the log"),
+    ]
+
+    def __init__(self, job_id):
+        super().__init__()
+        self.job_id = job_id
+        self.path = None
+        # True while tail is running, which is when the status shows progress
+        self.streaming = False
+        self.log_view = LogView(id="log-view")
+        self.search_input = Input(placeholder="Search the log, Enter for the next match", id="log-search")
+        self.content = Container(
+            Static(f"[bold]Output of job {job_id}[/bold]", classes="welcome-message"),
+            self.search_input,
+            self.log_view,
+            id="log-container"
+        )
+
+    def compose(self):
+        yield from super().compose(self.content)
+
+    def on_mount(self):
+        self.follow_log()
+        # The status line counts what arrives while paused
+        self.set_interval(0.5, self.show_progress)
+
+    @work(exclusive=True, group="log-tail")
+    async def follow_log(self):
+        """Stream the job's output file into the log view until the screen closes."""
+        self.update_status(f"Looking up the output file of job {self.job_id}...", color=INFO_COLOR)
+        try:
+            self.path = await job_output_path(self.app.command_cache, self.job_id, self.app.context.username)
+            self.streaming = True
+            self.show_progress()
+            # tail -F can be quiet for hours, so there is no output timeout
+            async with self.app.context.stream_command(tail_command(self.path), timeout=None) as stream:
+                async for line in stream:
+                    self.log_view.write(line)
+        except Exception as e:
+            self.streaming = False
+            self.update_status(str(e), color=ERROR_COLOR)
+            return
+        self.streaming = False
+        if not stream.ok:
+            self.update_status(stream.stderr or f"tail exited with status {stream.exit_status}", color=ERROR_COLOR)
+
+    def show_progress(self):
+        if not self.streaming:
+            return
+        view = self.log_view
+        if view.paused:
+            waiting = view.ring.total - view.frozen_total
+            self.update_status(f"Paused: {self.path} ({waiting} new lines, G to resume)", color=WARNING_COLOR)
+        else:
+            self.update_status(f"Following {self.path} ({view.ring.total} lines)", color=SUCCESS_COLOR)
+
+    def action_close_log(self):
+        if self.search_input.has_focus:
+            self.log_view.focus()
+            return
+        self.app.pop_screen()
+
+    def action_toggle_pause(self):
+        if self.log_view.paused:
+            self.log_view.resume()
+        else:
+            self.log_view.pause()
+        self.show_progress()
+
+    def action_focus_search(self):
+        self.search_input.focus()
+
+    def action_jump_to_end(self):
+        self.log_view.jump_to_end()
+        self.show_progress()
+
+    @on(Input.Submitted, "#log-search")
+    def on_search_submitted(self, event):
+        # Back to the log, where n and N step through the matches
+        self.log_view.focus()
+        self.find(event.value)
+
+    def action_next_match(self):
+        self.find(self.search_input.value)
+
+    def action_previous_match(self):
+        self.find(self.search_input.value, backwards=True)
+
+    def find(self, text, backwards=False):
+        if not text:
+            return
+        line = self.log_view.find(text, backwards=backwards)
+        self.show_progress()
+        if line is None:
+            self.notify(f"No {'earlier' if backwards else 'later'} match for {text!r}.", severity="warning")
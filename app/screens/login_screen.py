@@ -1,7 +1,8 @@
+from textual import work
 from app.screens.base_screen import BaseScreen
 from textual.widgets import Input, Button
 from textual.containers import Container, Vertical
-from app.config import ERROR_COLOR, SUCCESS_COLOR
+from app.config import ERROR_COLOR, SUCCESS_COLOR, INFO_COLOR
 
 class LoginScreen(BaseScreen):
     def __init__(self):
@@ -20,15 +21,18 @@ class LoginScreen(BaseScreen):
         if event.button.id == "login":
             self.start_login()
 
-    def start_login(self):
+    @work(exclusive=True, group="login")
+    async def start_login(self):
         username = self.query_one("#username", Input).value
         password = self.query_one("#password", Input).value
 
         self.app.context.username = username
         self.app.context.password = password
 
+        self.update_status("Connecting...", color=INFO_COLOR)
         try:
-            self.app.context.connect()
+            await self.app.context.connect_async()
+            self.app.watch_mount()
             self.app.action_switch_to_home()
             self.update_status("Logged in successfully.", color=SUCCESS_COLOR)
         except Exception as e:
@@ -1,7 +1,12 @@
 from app.screens.base_screen import BaseScreen
 from textual.containers import Container, Horizontal
 from textual.widgets import Label, Input, Button, Select
-from app.config import ERROR_COLOR, SUCCESS_COLOR, INFO_COLOR, GPU_TYPES
+from textual import work
+from app.widgets.cluster_availability import ClusterAvailability, ClusterCapacityTable, gpu_type_options
+from app.widgets.wait_estimate import WaitEstimateLine
+from app.utils.node_index import UNTYPED_GPU
+from app.utils.wait_model import NO_GRES
+from app.config import ERROR_COLOR, SUCCESS_COLOR, INFO_COLOR, GPU_TYPES, COMMAND_CACHE_TTLS
 
 
 class NodeRequestScreen(BaseScreen):
@@ -29,6 +34,12 @@ class NodeRequestScreen(BaseScreen):
 
         self.submit_button = Button("Request Node", id="submit")
 
+        # Live view of the cluster, from the shared node index
+        self.availability = ClusterAvailability(id="cluster-availability")
+        # How long jobs like this one waited before, from the user's history
+        self.wait_estimate = WaitEstimateLine(id="wait-estimate")
+        self.capacity_table = ClusterCapacityTable(id="cluster-capacity", cursor_type="none")
+
     def compose(self):
         """Construct UI layout."""
         yield from super().compose(Container(
@@ -39,17 +50,76 @@ class NodeRequestScreen(BaseScreen):
             Horizontal(Label("CPU Cores:"), self.cpu_cores_input),
             Horizontal(self.gpu_count_label, self.gpu_count_input),
             Horizontal(self.gpu_type_label, self.gpu_type_input),
+            self.availability,
+            self.wait_estimate,
             Horizontal(self.submit_button),
+            self.capacity_table,
             id="node-request-container"
         ))
 
     def on_mount(self):
         """Ensure GPU fields are hidden initially."""
         self.update_ui_based_on_selection()
+        self.load_cluster()
+        # Snapshots are reused for their cache TTL, so this picks up each new one
+        self.set_interval(COMMAND_CACHE_TTLS["scontrol"], self.load_cluster)
+        self.app.wait_estimator.subscribe(self.on_wait_model_updated)
+        self.app.fit_wait_model()
+
+    def on_unmount(self):
+        self.app.wait_estimator.unsubscribe(self.on_wait_model_updated)
+
+    def on_wait_model_updated(self, estimator):
+        self.show_capacity()
+
+    @work(exclusive=True, group="cluster")
+    async def load_cluster(self):
+        try:
+            await self.app.cluster_nodes.refresh()
+        except Exception as e:
+            self.update_status(f"Could not load the cluster's nodes: {e}", color=ERROR_COLOR)
+            return
+        self.show_cluster()
+
+    def show_cluster(self):
+        index = self.app.cluster_nodes.index
+        selected = self.gpu_type_input.value
+        options = gpu_type_options(index)
+        self.gpu_type_input.set_options(options)
+        if any(value == selected for _, value in options):
+            self.gpu_type_input.value = selected
+        self.show_capacity()
+
+    def show_capacity(self):
+        self.capacity_table.show(self.app.cluster_nodes.index, self.app.wait_estimator, self.requested_time())
+        self.show_availability()
+
+    def requested_time(self):
+        """Seconds in the Hours field, or None while it is not a number."""
+        hours = self.time_input.value.strip()
+        return int(hours) * 3600 if hours.isdigit() else None
+
+    def show_availability(self):
+        estimator = self.app.wait_estimator
+        if self.request_type.value == "gpu":
+            gpu_type = self.gpu_type_input.value
+            self.availability.show(self.app.cluster_nodes.index, "GPUQ", gpu_type)
+            # GRES requested as gpu:any:N count as untyped GPUs
+            gres = gpu_type if isinstance(gpu_type, str) and gpu_type != "any" else UNTYPED_GPU
+            self.wait_estimate.show(estimator, "GPUQ", gres, self.requested_time())
+        else:
+            self.availability.show(self.app.cluster_nodes.index, "CPUQ")
+            self.wait_estimate.show(estimator, "CPUQ", NO_GRES, self.requested_time())
 
     def on_select_changed(self, event):
         """Show GPU-specific fields only when 'GPU' is selected."""
         self.update_ui_based_on_selection()
+        self.show_availability()
+
+    def on_input_changed(self, event):
+        """The estimates depend on the requested time."""
+        if event.input.id == "time":
+            self.show_capacity()
 
     def update_ui_based_on_selection(self):
         """Toggle visibility of CPU vs. GPU-specific fields."""
@@ -106,6 +176,8 @@ class NodeRequestScreen(BaseScreen):
 
         try:
             self.app.context.run_async_command(command)
+            self.app.command_cache.invalidate("squeue")
+            self.app.command_cache.invalidate("scontrol")
         except Exception as e:
             self.update_status(
                 f"Error requesting node: {e}", color=ERROR_COLOR)
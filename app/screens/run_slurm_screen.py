@@ -2,11 +2,12 @@ import os
 from textual.containers import Container, Horizontal, Vertical
 from textual.widgets import Label, Input, Button, Select, DirectoryTree
 from app.screens.base_screen import BaseScreen
-from textual import on
+from app.widgets.remote_directory_tree import RemoteDirectoryTree, HOME
+from textual import on, work
 from app.config import SUCCESS_COLOR, ERROR_COLOR, SLURM_CONFIG_BASE_PATH, SLURM_OUTPUT_BASE_PATH
 
-class FilteredDirectoryTree(DirectoryTree):
-	"""Custom DirectoryTree that filters out dotfiles and dot-directories."""
+class FilteredDirectoryTree(RemoteDirectoryTree):
+	"""RemoteDirectoryTree that filters out dotfiles and dot-directories."""
 
 	def filter_paths(self, paths):
 		"""Exclude files and directories that start with '.'"""
@@ -39,10 +40,10 @@ class RunSlurmJobScreen(BaseScreen):
 			placeholder="Job name", id="job-name"
 		)
 
-		self.remote_home = self.app.remote_mnt_manager.mount()
-
+		# Listed over SFTP as directories are expanded, so nothing is
+		# mounted and the screen opens without waiting for the cluster
 		self.remote_directory_tree = FilteredDirectoryTree(
-			self.remote_home, id="remote-directory-tree"
+			self.app.remote_files, id="remote-directory-tree"
 		)
 
 		self.run_button = Button("Run Job", id="submit")
@@ -83,10 +84,11 @@ class RunSlurmJobScreen(BaseScreen):
 	@on(DirectoryTree.FileSelected)
 	def handle_file_selected(self, event: DirectoryTree.FileSelected):
 		"""Handle file selection event and store the selected path."""
-		self.selected_file_path = event.path.relative_to(self.remote_home)
+		self.selected_file_path = event.path.relative_to(HOME)
 		self.update_status(f"Selected file: {self.selected_file_path}")
 
-	def load_slurm_configs(self):
+	@work(exclusive=True, group="configs")
+	async def load_slurm_configs(self):
 		"""Fetch available Slurm configuration files from the remote system."""
 		config_type = self.config_type.value
 		command = f"ls {SLURM_CONFIG_BASE_PATH}/{config_type}/*.slurmconfig"
@@ -94,8 +96,12 @@ class RunSlurmJobScreen(BaseScreen):
 			command = f"ls {SLURM_CONFIG_BASE_PATH}/cpu/*.slurmconfig {SLURM_CONFIG_BASE_PATH}/gpu/*.slurmconfig"
 
 		try:
-			output = self.app.context.run_command(command)
-			output = output.split("\n")
+			if self.app.helper_agent:
+				types = ["cpu", "gpu"] if config_type == "all" else [config_type]
+				output = await self.app.command_cache.request("list_configs", base=SLURM_CONFIG_BASE_PATH, types=types)
+			else:
+				result = await self.app.command_cache.run(command)
+				output = result.output.split("\n")
 			config_files_vals = [os.path.basename(f) for f in output if f.strip()]
 			config_files_types = [f.split("/")[2] for f in output if f.strip()]
 			self.config_file.set_options([(f"{t.upper()}: {f}", f) for (t, f) in zip(config_files_types, config_files_vals)])
@@ -108,7 +114,8 @@ class RunSlurmJobScreen(BaseScreen):
 		if event.button.id == "submit":
 			self.run_slurm_job()
 
-	def run_slurm_job(self):
+	@work(group="submit")
+	async def run_slurm_job(self):
 		"""Run a Slurm job using the selected configuration."""
 		config_file = self.config_file.value
 		time_val = self.time_input.value.strip()
@@ -133,7 +140,9 @@ class RunSlurmJobScreen(BaseScreen):
 		command = f"mkdir -p {SLURM_OUTPUT_BASE_PATH} && ./{remote_script_path} {script_file} {SLURM_OUTPUT_BASE_PATH}/{output_file_val} {job_time} {memory_val} {job_name_val} {email}"
 
 		try:
-			output = self.app.context.run_command(command)
-			self.update_status(f"Job submitted: {output}", color=SUCCESS_COLOR)
+			result = await self.app.command_cache.run(command)
+			if not result.ok:
+				raise Exception(result.output)
+			self.update_status(f"Job submitted: {result.output}", color=SUCCESS_COLOR)
 		except Exception as e:
 			self.update_status(f"Error submitting job: {e}", color=ERROR_COLOR)
@@ -0,0 +1,247 @@
+"""Background session daemon, in the spirit of OpenSSH's ControlMaster.
+
+Owns one authenticated SSHConnectionManager, its TunnelManager, the cached
+remote file listings and (optionally) the remote helper agent, and serves
+any number of TUI instances over a Unix domain socket. Relaunching the TUI then only costs a
+socket connect instead of a full SSH handshake, and tunnels keep running
+after the TUI is closed.
+
+The daemon is started by SessionDaemonClient, which passes the credentials
+as one JSON line on stdin. It prints "ready" (or "error: ...") on stdout
+once the SSH session is up and the socket is listening, and exits after
+SESSION_DAEMON_PERSIST seconds without attached clients or tunnels, or on a
+"shutdown" request.
+"""
+import os
+import sys
+import json
+import time
+import stat
+import asyncio
+import tempfile
+from dataclasses import asdict
+from app.ssh_connection import SSHConnectionManager
+from app.tunnel_manager import TunnelManager, SSH_PORT
+from app.helper_agent_manager import HelperAgentManager
+from app.remote_files import RemoteFiles
+from app.config import SESSION_DAEMON_PERSIST
+
+# Longest JSON line accepted on the socket; whole command outputs travel in one
+MESSAGE_LIMIT = 64 * 1024 * 1024
+
+def session_socket_path(username, host):
+    """Per-user socket path; the directory is only accessible to its owner."""
+    directory = os.path.join(tempfile.gettempdir(), f"idun-tui-{os.getuid()}")
+    return os.path.join(directory, f"{username}@{host}.sock")
+
+def prepare_socket_directory(path):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.stat(directory)
+    if st.st_uid != os.getuid() or stat.S_IMODE(st.st_mode) & 0o077:
+        raise PermissionError(f"Refusing to use {directory}: it must be private to the current user.")
+
+async def write_message(writer, message):
+    writer.write((json.dumps(message) + "\n").encode())
+    await writer.drain()
+
+class SessionDaemon:
+    def __init__(self, ssh_manager: object, socket_path, persist=SESSION_DAEMON_PERSIST):
+        """
+        :param ssh_manager: A connected SSHConnectionManager.
+        :param socket_path: Unix socket to listen on.
+        :param persist: Seconds to linger without attached clients or tunnels.
+        """
+        self.ssh_manager = ssh_manager
+        self.tunnel_manager = TunnelManager(ssh_manager)
+        self.helper_agent = HelperAgentManager(ssh_manager) if os.getenv("IDUN_REMOTE_HELPER") == "1" else None
+        # Shared by every attached app, so listings are cached across launches
+        self.remote_files = RemoteFiles(ssh_manager)
+        self.socket_path = socket_path
+        self.persist = persist
+        self.attached = 0
+        self.last_detach = time.monotonic()
+        self._server = None
+        self._stopped = None
+        self.ops = {
+            "attach": self.op_attach,
+            "status": self.op_status,
+            "run": self.op_run,
+            "shell": self.op_shell,
+            "helper": self.op_helper,
+            "setup_tunnel": self.op_setup_tunnel,
+            "close_tunnel": self.op_close_tunnel,
+            "setup_proxy": self.op_setup_proxy,
+            "close_proxy": self.op_close_proxy,
+            "tunnels": self.op_tunnels,
+            "list_dir": self.op_list_dir,
+            "shutdown": self.op_shutdown,
+        }
+
+    async def serve(self, on_ready=None):
+        self._stopped = asyncio.Event()
+        prepare_socket_directory(self.socket_path)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path,
+                                                       limit=MESSAGE_LIMIT)
+        os.chmod(self.socket_path, 0o600)
+        if on_ready:
+            on_ready()
+        idle_task = asyncio.create_task(self._exit_when_idle())
+        try:
+            await self._stopped.wait()
+        finally:
+            idle_task.cancel()
+            self._server.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            if self.helper_agent:
+                self.helper_agent.close()
+            self.tunnel_manager.close_all_tunnels()
+            self.ssh_manager.close()
+
+    async def _exit_when_idle(self):
+        while True:
+            await asyncio.sleep(min(self.persist, 30))
+            idle = self.attached == 0 and not self.tunnel_manager.tunnels
+            if idle and time.monotonic() - self.last_detach > self.persist:
+                self._stopped.set()
+                return
+
+    async def _handle_client(self, reader, writer):
+        write_lock = asyncio.Lock()
+        tasks = set()
+        state = {"attached": False}
+        try:
+            while line := await reader.readline():
+                request = json.loads(line)
+                # Requests on one connection are handled concurrently, so a
+                # client may pipeline them and match answers by id.
+                task = asyncio.create_task(self._answer(request, writer, write_lock, state))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            if state["attached"]:
+                self.attached -= 1
+                self.last_detach = time.monotonic()
+            writer.close()
+
+    async def _answer(self, request, writer, write_lock, state):
+        async def send(message):
+            async with write_lock:
+                await write_message(writer, message)
+
+        try:
+            if request["op"] == "stream":
+                result = await self.stream(request, send)
+            else:
+                result = await self.ops[request["op"]](state=state, **request.get("args", {}))
+            response = {"id": request.get("id"), "ok": True, "result": result}
+        except Exception as e:
+            response = {"id": request.get("id"), "ok": False, "error": str(e), "type": type(e).__name__}
+        async with write_lock:
+            try:
+                await write_message(writer, response)
+            except ConnectionError:
+                pass
+
+    async def stream(self, request, send):
+        """Relay a CommandStream as {"id", "line"} messages ahead of the final answer.
+
+        Waiting for each write to drain keeps a slow client's backpressure
+        flowing back to the SSH channel.
+        """
+        args = request["args"]
+        kwargs = {"timeout": args["timeout"]} if args.get("timeout") is not None else {}
+        async with self.ssh_manager.stream_command(args["command"], **kwargs) as stream:
+            async for line in stream:
+                await send({"id": request.get("id"), "line": line})
+        return {"exit_status": stream.exit_status, "stderr": stream.stderr}
+
+    async def op_attach(self, state):
+        """Keep the daemon alive for as long as this connection stays open."""
+        if not state["attached"]:
+            state["attached"] = True
+            self.attached += 1
+        return await self.op_status(state)
+
+    async def op_status(self, state):
+        return {
+            "username": self.ssh_manager.username,
+            "connected": self.ssh_manager.is_connected(),
+            "attached": self.attached,
+            "tunnels": await self.op_tunnels(state),
+            "supervisor": self.ssh_manager.supervisor.stats(),
+            "helper_agent": self.helper_agent is not None,
+        }
+
+    async def op_run(self, state, command, timeout=None, idempotent=False):
+        kwargs = {"idempotent": idempotent}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        return asdict(await self.ssh_manager.run_command_async(command, **kwargs))
+
+    async def op_shell(self, state, command):
+        self.ssh_manager.run_async_command(command)
+
+    async def op_helper(self, state, op, args):
+        if not self.helper_agent:
+            raise RuntimeError("The session daemon was started without the helper agent.")
+        return await self.helper_agent.request(op, **args)
+
+    async def op_setup_tunnel(self, state, node, local_port=None, remote_port=SSH_PORT):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.tunnel_manager.setup_tunnel, node, local_port, remote_port)
+
+    async def op_close_tunnel(self, state, node, remote_port=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.tunnel_manager.close_tunnel, node, remote_port)
+
+    async def op_setup_proxy(self, state, local_port=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.tunnel_manager.setup_proxy, local_port)
+
+    async def op_close_proxy(self, state):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.tunnel_manager.close_proxy)
+
+    async def op_tunnels(self, state):
+        stats = self.tunnel_manager.stats()
+        return [[tunnel.node, tunnel.local_port, tunnel.remote_port, asdict(stats[key])]
+                for key, tunnel in self.tunnel_manager.tunnels.items()]
+
+    async def op_list_dir(self, state, path):
+        loop = asyncio.get_running_loop()
+        return [asdict(entry) for entry in await loop.run_in_executor(None, self.remote_files.list_dir, path)]
+
+    async def op_shutdown(self, state):
+        self._stopped.set()
+
+def main():
+    credentials = json.loads(sys.stdin.readline())
+    ssh_manager = SSHConnectionManager()
+    ssh_manager.username = credentials["username"]
+    ssh_manager.password = credentials["password"]
+    try:
+        ssh_manager.connect()
+        daemon = SessionDaemon(ssh_manager, session_socket_path(ssh_manager.username, ssh_manager.host))
+    except Exception as e:
+        print(f"error: {e}", flush=True)
+        return 1
+
+    def on_ready():
+        print("ready", flush=True)
+        # Nobody reads stdout after start-up; make sure late prints cannot
+        # fail on a closed pipe.
+        sys.stdout = open(os.devnull, "w")
+
+    asyncio.run(daemon.serve(on_ready))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
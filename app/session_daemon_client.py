@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import socket
+import select
+import asyncio
+import itertools
+import subprocess
+from app.ssh_connection import (SSHConnectionError, CommandTimeoutError, SSHConnectionLostError,
+                                CommandResult, CommandStream)
+from app.helper_agent_manager import HelperAgentError
+from app.tunnel_manager import Tunnel, TunnelStats, SSH_PORT, PROXY_KEY
+from app.remote_files import RemoteEntry
+from app.session_daemon import session_socket_path, prepare_socket_directory, MESSAGE_LIMIT
+from app.config import SSH_BASE_HOST, COMMAND_TIMEOUT, SESSION_DAEMON_START_TIMEOUT, SOCKS_PORT
+
+# Errors raised in the daemon are re-raised locally as the same class
+REMOTE_ERRORS = {cls.__name__: cls for cls in
+                 (SSHConnectionError, CommandTimeoutError, SSHConnectionLostError, HelperAgentError)}
+
+def _raise_for(response):
+    if not response["ok"]:
+        raise REMOTE_ERRORS.get(response.get("type"), SSHConnectionError)(response["error"])
+    return response["result"]
+
+class SessionDaemonClient:
+    """Stand-in for SSHConnectionManager that talks to the session daemon.
+
+    The first launch starts the daemon (which authenticates once); later
+    launches find its socket and attach without any SSH handshake. Closing
+    the client only detaches, so tunnels owned by the daemon keep running
+    until shutdown() or the daemon's idle timeout.
+    """
+
+    def __init__(self):
+        self.username = os.getenv("IDUN_USERNAME")
+        self.password = os.getenv("IDUN_PASSWORD")
+        self.host = os.getenv("IDUN_SSH_HOST", SSH_BASE_HOST)
+        self.port = int(os.getenv("IDUN_SSH_PORT", "22"))
+        self._attachment = None
+        self._connecting = None
+        self._ids = itertools.count()
+
+    @property
+    def socket_path(self):
+        return session_socket_path(self.username, self.host)
+
+    def has_credentials(self):
+        """A running daemon for this user is as good as a stored password."""
+        return bool(self.username and (self.password or self.daemon_running()))
+
+    def daemon_running(self):
+        try:
+            self._call_sync("status")
+        except (OSError, SSHConnectionError):
+            return False
+        return True
+
+    def connect(self):
+        if not self.daemon_running():
+            self._start_daemon()
+        attachment = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            attachment.connect(self.socket_path)
+            self._send(attachment, "attach")
+            _raise_for(self._receive(attachment))
+        except OSError as e:
+            attachment.close()
+            raise SSHConnectionError(f"Could not attach to session daemon: {e}")
+        self._attachment = attachment
+
+    async def connect_async(self):
+        """Attach (starting the daemon if needed) without blocking the UI.
+
+        Concurrent callers share the same attempt.
+        """
+        if self._connecting is None or self._connecting.done():
+            self._connecting = asyncio.get_running_loop().run_in_executor(None, self.connect)
+        await asyncio.shield(self._connecting)
+
+    async def ready(self):
+        """Wait for an attach that is still in progress, if any."""
+        if self._connecting is not None and not self._connecting.done():
+            await asyncio.shield(self._connecting)
+
+    def _start_daemon(self):
+        if not self.username or not self.password:
+            raise SSHConnectionError("Missing SSH credentials.")
+        prepare_socket_directory(self.socket_path)
+        log_path = os.path.splitext(self.socket_path)[0] + ".log"
+        with open(log_path, "ab") as log:
+            daemon = subprocess.Popen(
+                [sys.executable, "-m", "app.session_daemon"],
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                env=dict(os.environ, IDUN_USERNAME=self.username, IDUN_SSH_HOST=self.host,
+                         IDUN_SSH_PORT=str(self.port)),
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=log,
+                # Own session so the daemon outlives the terminal and the TUI
+                start_new_session=True, text=True)
+        # The password goes over a pipe rather than argv, where ps would show it
+        daemon.stdin.write(json.dumps({"username": self.username, "password": self.password}) + "\n")
+        daemon.stdin.close()
+        status = self._read_status(daemon)
+        if status != "ready":
+            raise SSHConnectionError(status.removeprefix("error: ") or "Session daemon exited during start-up.")
+
+    @staticmethod
+    def _read_status(daemon):
+        """The daemon's "ready" / "error: ..." line, bounded by SESSION_DAEMON_START_TIMEOUT."""
+        readable, _, _ = select.select([daemon.stdout], [], [], SESSION_DAEMON_START_TIMEOUT)
+        if not readable:
+            daemon.kill()
+            raise SSHConnectionError("Session daemon did not start in time.")
+        return daemon.stdout.readline().strip()
+
+    def is_connected(self):
+        if not self._attachment:
+            return False
+        try:
+            return self._call_sync("status")["connected"]
+        except (OSError, SSHConnectionError):
+            return False
+
+    def run_command(self, command):
+        result = CommandResult(**self._call_sync("run", command=command))
+        return result.output
+
+    async def run_command_async(self, command, timeout=COMMAND_TIMEOUT, idempotent=False):
+        """SSHConnectionManager.run_command_async, executed by the daemon."""
+        result = await self._call("run", command=command, timeout=timeout, idempotent=idempotent)
+        return CommandResult(**result)
+
+    async def run_commands(self, *commands, timeout=COMMAND_TIMEOUT, idempotent=False):
+        return await asyncio.gather(
+            *(self.run_command_async(command, timeout=timeout, idempotent=idempotent)
+              for command in commands))
+
+    def stream_command(self, command, timeout=COMMAND_TIMEOUT):
+        """SSHConnectionManager.stream_command, executed by the daemon."""
+        return CommandStream(command, lambda stream: self._stream(stream, timeout))
+
+    async def _stream(self, stream, timeout):
+        await self.ready()
+        try:
+            reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=MESSAGE_LIMIT)
+        except OSError as e:
+            raise SSHConnectionError(f"Session daemon is not running: {e}")
+        try:
+            message = {"id": next(self._ids), "op": "stream", "args": {"command": stream.command, "timeout": timeout}}
+            writer.write((json.dumps(message) + "\n").encode())
+            await writer.drain()
+            while line := await reader.readline():
+                response = json.loads(line)
+                if "line" in response:
+                    yield response["line"]
+                    continue
+                result = _raise_for(response)
+                stream.exit_status, stream.stderr = result["exit_status"], result["stderr"]
+                return
+            raise SSHConnectionLostError("Session daemon closed the connection.")
+        finally:
+            writer.close()
+
+    def run_async_command(self, command):
+        self._call_sync("shell", command=command)
+
+    def close(self):
+        """Detach from the daemon; its session and tunnels stay up."""
+        if self._attachment:
+            self._attachment.close()
+            self._attachment = None
+
+    def shutdown(self):
+        """Stop the daemon, closing its SSH session and all tunnels."""
+        try:
+            self._call_sync("shutdown")
+        except (OSError, SSHConnectionError):
+            pass
+        self.close()
+
+    async def _call(self, op, **args):
+        await self.ready()
+        try:
+            reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=MESSAGE_LIMIT)
+        except OSError as e:
+            raise SSHConnectionError(f"Session daemon is not running: {e}")
+        try:
+            writer.write((json.dumps({"id": next(self._ids), "op": op, "args": args}) + "\n").encode())
+            await writer.drain()
+            line = await reader.readline()
+        finally:
+            writer.close()
+        if not line:
+            raise SSHConnectionLostError("Session daemon closed the connection.")
+        return _raise_for(json.loads(line))
+
+    def _call_sync(self, op, **args):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(self.socket_path)
+            self._send(connection, op, **args)
+            return _raise_for(self._receive(connection))
+
+    def _send(self, connection, op, **args):
+        connection.sendall((json.dumps({"id": next(self._ids), "op": op, "args": args}) + "\n").encode())
+
+    @staticmethod
+    def _receive(connection):
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = connection.recv(65536)
+            if not chunk:
+                raise SSHConnectionLostError("Session daemon closed the connection.")
+            data += chunk
+        return json.loads(data)
+
+class DaemonTunnelManager:
+    """TunnelManager interface for tunnels owned by the session daemon."""
+
+    def __init__(self, client: SessionDaemonClient):
+        self.client = client
+        # Mirrors TunnelManager.tunnels, without the daemon's listeners
+        self.tunnels = {}
+
+    def refresh(self):
+        tunnels = (Tunnel(node, local_port, remote_port, stats=TunnelStats(**stats))
+                   for node, local_port, remote_port, stats in self.client._call_sync("tunnels"))
+        self.tunnels = {tunnel.key: tunnel for tunnel in tunnels}
+
+    def stats(self):
+        """TunnelStats of every tunnel as the daemon sees them now."""
+        self.refresh()
+        return {key: tunnel.snapshot for key, tunnel in self.tunnels.items()}
+
+    def setup_tunnel(self, node, local_port=None, remote_port=SSH_PORT):
+        result = self.client._call_sync("setup_tunnel", node=node, local_port=local_port, remote_port=remote_port)
+        self.refresh()
+        return result
+
+    def close_tunnel(self, node, remote_port=None):
+        result = self.client._call_sync("close_tunnel", node=node, remote_port=remote_port)
+        self.refresh()
+        return result
+
+    def setup_proxy(self, local_port=SOCKS_PORT):
+        result = self.client._call_sync("setup_proxy", local_port=local_port)
+        self.refresh()
+        return result
+
+    def close_proxy(self):
+        result = self.client._call_sync("close_proxy")
+        self.refresh()
+        return result
+
+    def close_all_tunnels(self):
+        for node, remote_port in list(self.tunnels):
+            if (node, remote_port) == PROXY_KEY:
+                self.close_proxy()
+            else:
+                self.close_tunnel(node, remote_port)
+
+class DaemonHelperAgent:
+    """HelperAgentManager interface for the helper agent run by the session daemon."""
+
+    def __init__(self, client: SessionDaemonClient):
+        self.client = client
+
+    async def request(self, op, **args):
+        return await self.client._call("helper", op=op, args=args)
+
+    def close(self):
+        pass
+
+class DaemonRemoteFiles:
+    """RemoteFiles interface for listings made (and cached) by the session daemon."""
+
+    def __init__(self, client: SessionDaemonClient):
+        self.client = client
+
+    def list_dir(self, path):
+        return [RemoteEntry(**entry) for entry in self.client._call_sync("list_dir", path=path)]
+
+    def clear(self):
+        pass
@@ -0,0 +1,137 @@
+import time
+import threading
+from collections import deque
+from app.config import (KEEPALIVE_TIMEOUT, SUPERVISOR_CHECK_INTERVAL,
+                    RECONNECT_BACKOFF_INITIAL, RECONNECT_BACKOFF_MAX)
+
+class SessionSupervisor:
+    """Watches the SSH transport and reconnects when it dies.
+
+    Runs in a daemon thread. Every check_interval seconds the
+    transport is probed with an OpenSSH keepalive request; if it is inactive
+    or the probe does not answer within KEEPALIVE_TIMEOUT the session is
+    reopened with exponential backoff and listeners are told about it.
+    """
+
+    def __init__(self, ssh_manager: object, check_interval=SUPERVISOR_CHECK_INTERVAL):
+        """
+        :param ssh_manager: An instance of SSHConnectionManager.
+        :param check_interval: Seconds between liveness probes.
+        """
+        self.ssh_manager = ssh_manager
+        self.check_interval = check_interval
+        self.state = "stopped"
+        self.reconnect_count = 0
+        self.last_reconnect_latency = None
+        self.reconnect_latencies = deque(maxlen=50)
+        # The last exception raised by a reconnect listener, as a string
+        self.listener_error = None
+        self.connected = threading.Event()
+        self._listeners = []
+        self._error_listeners = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add_listener(self, callback):
+        """Register callback(latency) to run after every successful reconnect."""
+        self._listeners.append(callback)
+
+    def add_error_listener(self, callback):
+        """Register callback(error) to run when a reconnect listener raises,
+        e.g. to show the error. Runs on the supervisor thread as well."""
+        self._error_listeners.append(callback)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self.state = "connected"
+        self.connected.set()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self.state = "stopped"
+        self.connected.clear()
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def report_lost(self):
+        """Called by users of the session that saw the transport die."""
+        if self.state == "connected":
+            self.connected.clear()
+            self._wake.set()
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "reconnect_count": self.reconnect_count,
+            "last_reconnect_latency": self.last_reconnect_latency,
+            "reconnect_latencies": list(self.reconnect_latencies),
+            "listener_error": self.listener_error,
+        }
+
+    def is_alive(self):
+        """Probe the transport, giving up after KEEPALIVE_TIMEOUT seconds."""
+        if not self.ssh_manager.is_connected():
+            return False
+        transport = self.ssh_manager.ssh_client.get_transport()
+        done = threading.Event()
+        result = {}
+
+        def probe():
+            # OpenSSH answers unknown global requests with a failure, which
+            # still proves the other side is there.
+            transport.global_request("keepalive@openssh.com", wait=True)
+            result["alive"] = transport.is_active()
+            done.set()
+
+        threading.Thread(target=probe, daemon=True).start()
+        done.wait(KEEPALIVE_TIMEOUT)
+        return result.get("alive", False)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.check_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            if self.connected.is_set() and self.is_alive():
+                continue
+            self._reconnect()
+
+    def _reconnect(self):
+        self.state = "reconnecting"
+        self.connected.clear()
+        start = time.perf_counter()
+        delay = RECONNECT_BACKOFF_INITIAL
+        while not self._stop.is_set():
+            try:
+                self.ssh_manager.reopen()
+                break
+            except Exception:
+                self._stop.wait(delay)
+                delay = min(delay * 2, RECONNECT_BACKOFF_MAX)
+        if self._stop.is_set():
+            return
+        latency = time.perf_counter() - start
+        self.last_reconnect_latency = latency
+        self.reconnect_latencies.append(latency)
+        self.reconnect_count += 1
+        self.state = "connected"
+        self.connected.set()
+        for callback in self._listeners:
+            try:
+                callback(latency)
+            except Exception as e:
+                # Nothing here may write to the terminal the UI is drawn on
+                self.listener_error = str(e)
+                for error_callback in self._error_listeners:
+                    try:
+                        error_callback(e)
+                    except Exception:
+                        pass
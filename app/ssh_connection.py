@@ -1,31 +1,151 @@
 import os
-import paramiko
-from dotenv import load_dotenv
-from config import SSH_BASE_HOST
+import time
+import codecs
+import asyncio
+import threading
+from dataclasses import dataclass
+from app.config import (SSH_BASE_HOST, COMMAND_TIMEOUT, MAX_CONCURRENT_CHANNELS,
+                    KEEPALIVE_INTERVAL, COMMAND_RETRIES, RECONNECT_WAIT_TIMEOUT)
+from app.session_supervisor import SessionSupervisor
+
+CHANNEL_READ_SIZE = 32768
+# Longest line a stream buffers before handing it out unsplit
+STREAM_MAX_LINE = 1024 * 1024
+# Stderr kept from a streamed command (the tail, in bytes)
+STREAM_STDERR_LIMIT = 64 * 1024
 
 class SSHConnectionError(Exception):
     pass
 
+class CommandTimeoutError(SSHConnectionError):
+    pass
+
+class SSHConnectionLostError(SSHConnectionError):
+    pass
+
+@dataclass
+class CommandResult:
+    """Result of a command executed on its own exec channel."""
+    command: str
+    exit_status: int
+    stdout: str
+    stderr: str
+    duration: float
+
+    @property
+    def ok(self):
+        return self.exit_status == 0
+
+    @property
+    def output(self):
+        """Stdout if there is any, otherwise stderr (same as run_command)."""
+        return self.stdout if self.stdout else self.stderr
+
+class CommandStream:
+    """Output of a command, handed out line by line as it arrives.
+
+    Use as ``async with manager.stream_command(cmd) as stream`` and iterate
+    with ``async for line in stream``. Nothing is read from the channel while
+    the consumer is busy with a line, so the SSH window throttles the remote
+    side and memory stays bounded however long the output is.
+    exit_status and stderr are set once every line has been read.
+    """
+
+    def __init__(self, command, produce):
+        """
+        :param command: The command being run.
+        :param produce: Async generator function taking this stream and
+                        yielding its lines.
+        """
+        self.command = command
+        self.exit_status = None
+        self.stderr = ""
+        self._lines = produce(self)
+
+    @property
+    def ok(self):
+        return self.exit_status == 0
+
+    def __aiter__(self):
+        return self._lines
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # Closes the channel if the consumer stopped early
+        await self._lines.aclose()
+
 class SSHConnectionManager:
     def __init__(self):
-        load_dotenv()
         self.username = os.getenv("IDUN_USERNAME")
         self.password = os.getenv("IDUN_PASSWORD")
+        self.host = os.getenv("IDUN_SSH_HOST", SSH_BASE_HOST)
+        self.port = int(os.getenv("IDUN_SSH_PORT", "22"))
         self.ssh_client = None
         self.shell = None
+        self.supervisor = SessionSupervisor(self)
+        self._lock = threading.Lock()
+        self._channel_slots = asyncio.Semaphore(MAX_CONCURRENT_CHANNELS)
+        self._connecting = None
+
+    def has_credentials(self):
+        return bool(self.username and self.password)
 
     def connect(self):
+        self.reopen()
+        self.supervisor.start()
+
+    async def connect_async(self):
+        """Connect in a worker thread so the UI keeps drawing during the handshake.
+
+        Concurrent callers share the same attempt.
+        """
+        if self._connecting is None or self._connecting.done():
+            self._connecting = asyncio.get_running_loop().run_in_executor(None, self.connect)
+        await asyncio.shield(self._connecting)
+
+    async def ready(self):
+        """Wait for a background connect that is still in progress, if any."""
+        if self._connecting is not None and not self._connecting.done():
+            await asyncio.shield(self._connecting)
+
+    def reopen(self):
+        """Open a fresh session, replacing (and closing) any previous one."""
         if not self.username or not self.password:
             raise SSHConnectionError("Missing SSH credentials.")
+        # Imported here since paramiko and its crypto backends are the
+        # slowest part of starting the app.
+        import paramiko
         try:
-            self.ssh_client = paramiko.SSHClient()
-            self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            self.ssh_client.connect(SSH_BASE_HOST,
-                                    username=self.username,
-                                    password=self.password)
-            self.shell = self.ssh_client.invoke_shell()
+            ssh_client = paramiko.SSHClient()
+            ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            ssh_client.connect(self.host,
+                               port=self.port,
+                               username=self.username,
+                               password=self.password)
+            ssh_client.get_transport().set_keepalive(KEEPALIVE_INTERVAL)
+            shell = ssh_client.invoke_shell()
         except Exception as e:
             raise SSHConnectionError(f"Error connecting via SSH: {e}")
+        with self._lock:
+            old_client = self.ssh_client
+            self.ssh_client = ssh_client
+            self.shell = shell
+        if old_client:
+            old_client.close()
+
+    def get_transport(self):
+        if not self.ssh_client:
+            raise SSHConnectionError("SSH connection is not established.")
+        transport = self.ssh_client.get_transport()
+        if not transport or not transport.is_active():
+            raise SSHConnectionError("SSH transport is not available.")
+        return transport
+
+    def is_connected(self):
+        transport = self.ssh_client and self.ssh_client.get_transport()
+        return bool(transport and transport.is_active())
 
     def run_command(self, command):
         if not self.ssh_client:
@@ -35,6 +155,162 @@ class SSHConnectionManager:
         error = stderr.read().decode().strip()
         return output if output else error
 
+    async def run_command_async(self, command, timeout=COMMAND_TIMEOUT, idempotent=False):
+        """Run a command on its own exec channel without blocking the event loop.
+
+        Any number of these can be awaited at once; they share the existing
+        transport and at most MAX_CONCURRENT_CHANNELS channels are open at a
+        time. The channel is closed if the command times out or the awaiting
+        task is cancelled. Idempotent commands that lose their connection are
+        re-run once the supervisor has reconnected.
+        """
+        attempts = COMMAND_RETRIES + 1 if idempotent else 1
+        for attempt in range(attempts):
+            try:
+                return await self._run_once(command, timeout)
+            except SSHConnectionLostError:
+                self.supervisor.report_lost()
+                if attempt == attempts - 1:
+                    raise
+            await self.wait_until_connected()
+
+    async def run_commands(self, *commands, timeout=COMMAND_TIMEOUT, idempotent=False):
+        """Run several commands concurrently, returning results in order."""
+        return await asyncio.gather(
+            *(self.run_command_async(command, timeout=timeout, idempotent=idempotent)
+              for command in commands))
+
+    async def wait_until_connected(self, timeout=RECONNECT_WAIT_TIMEOUT):
+        """Wait for the supervisor to bring the session back up."""
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, self.supervisor.connected.wait, timeout):
+            raise SSHConnectionError("SSH connection was lost and could not be re-established.")
+
+    def stream_command(self, command, timeout=COMMAND_TIMEOUT):
+        """Run a command on its own exec channel and stream its stdout lines.
+
+        timeout bounds the wait for each chunk of output rather than the
+        whole command. Streams are not retried after a reconnect, since lines
+        already handed out cannot be taken back.
+        """
+        return CommandStream(command, lambda stream: self._stream(stream, timeout))
+
+    async def _live_transport(self):
+        await self.ready()
+        try:
+            return self.get_transport()
+        except SSHConnectionError as e:
+            if self.supervisor.state == "stopped":
+                raise
+            raise SSHConnectionLostError(str(e))
+
+    async def _run_once(self, command, timeout):
+        transport = await self._live_transport()
+        async with self._channel_slots:
+            try:
+                return await asyncio.wait_for(self._exec(transport, command), timeout)
+            except asyncio.TimeoutError:
+                raise CommandTimeoutError(f"Command timed out after {timeout}s: {command}")
+
+    async def _exec(self, transport, command):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        channel = await loop.run_in_executor(None, self._open_exec_channel, transport, command)
+        stdout, stderr = bytearray(), bytearray()
+        readable = asyncio.Event()
+        # The channel's fileno is a pipe paramiko sets whenever either buffer
+        # has data or the remote side sends EOF, so the loop only wakes when
+        # there is something to read.
+        fd = channel.fileno()
+        loop.add_reader(fd, readable.set)
+        try:
+            while True:
+                await readable.wait()
+                readable.clear()
+                # Check for EOF before draining so data that arrived just
+                # ahead of it is never left behind in the buffers.
+                finished = channel.eof_received or channel.closed
+                while channel.recv_ready():
+                    stdout += channel.recv(CHANNEL_READ_SIZE)
+                while channel.recv_stderr_ready():
+                    stderr += channel.recv_stderr(CHANNEL_READ_SIZE)
+                if finished:
+                    break
+            loop.remove_reader(fd)
+            exit_status = await loop.run_in_executor(None, channel.recv_exit_status)
+            if exit_status == -1 and not transport.is_active():
+                raise SSHConnectionLostError(f"Connection lost while running: {command}")
+        finally:
+            loop.remove_reader(fd)
+            channel.close()
+        return CommandResult(
+            command=command,
+            exit_status=exit_status,
+            stdout=stdout.decode(errors="replace").strip(),
+            stderr=stderr.decode(errors="replace").strip(),
+            duration=time.perf_counter() - start,
+        )
+
+    async def _stream(self, stream, timeout):
+        transport = await self._live_transport()
+        loop = asyncio.get_running_loop()
+        async with self._channel_slots:
+            channel = await loop.run_in_executor(None, self._open_exec_channel, transport, stream.command)
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            pending = ""
+            stderr = bytearray()
+            readable = asyncio.Event()
+            fd = channel.fileno()
+            loop.add_reader(fd, readable.set)
+            try:
+                while True:
+                    try:
+                        await asyncio.wait_for(readable.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        raise CommandTimeoutError(f"No output for {timeout}s: {stream.command}")
+                    readable.clear()
+                    finished = channel.eof_received or channel.closed
+                    while channel.recv_stderr_ready():
+                        stderr += channel.recv_stderr(CHANNEL_READ_SIZE)
+                        del stderr[:-STREAM_STDERR_LIMIT]
+                    while channel.recv_ready():
+                        pending += decoder.decode(channel.recv(CHANNEL_READ_SIZE))
+                        *lines, pending = pending.split("\n")
+                        if len(pending) > STREAM_MAX_LINE:
+                            lines.append(pending)
+                            pending = ""
+                        # The channel's pipe stays readable while data is
+                        # buffered, so stop watching it while the consumer
+                        # works through the lines.
+                        loop.remove_reader(fd)
+                        for line in lines:
+                            yield line.rstrip("\r")
+                        loop.add_reader(fd, readable.set)
+                    if finished:
+                        break
+                pending += decoder.decode(b"", final=True)
+                if pending:
+                    yield pending.rstrip("\r")
+                loop.remove_reader(fd)
+                stream.exit_status = await loop.run_in_executor(None, channel.recv_exit_status)
+                if stream.exit_status == -1 and not transport.is_active():
+                    raise SSHConnectionLostError(f"Connection lost while running: {stream.command}")
+                stream.stderr = stderr.decode(errors="replace").strip()
+            finally:
+                loop.remove_reader(fd)
+                channel.close()
+
+    @staticmethod
+    def _open_exec_channel(transport, command):
+        try:
+            channel = transport.open_session()
+            channel.exec_command(command)
+        except Exception as e:
+            if not transport.is_active():
+                raise SSHConnectionLostError(f"Connection lost while running: {command}")
+            raise SSHConnectionError(f"Error running command: {e}")
+        return channel
+
     def run_async_command(self, command):
         if not self.ssh_client:
             raise SSHConnectionError("SSH connection is not established.")
@@ -44,8 +320,9 @@ class SSHConnectionManager:
             self.shell.send(command + "\n")
         except Exception as e:
             raise SSHConnectionError(f"Error running command: {e}")
-    
+
     def close(self):
+        self.supervisor.stop()
         if self.ssh_client:
             self.shell.close()
             self.ssh_client.close()
@@ -0,0 +1,507 @@
+"""Forwarding engine shared by every tunnel.
+
+One thread waits on a selector for all listening sockets, client sockets
+and SSH channels (paramiko channels have a file descriptor that becomes
+readable when data arrives), so the number of threads stays the same
+however many tunnels and clients there are. Opening a channel takes a
+round trip to the login node, so that happens on a small fixed pool of
+threads and the new connection is handed back to the selector thread.
+Everything that touches the selector runs on its thread; other threads
+queue calls and wake it through a socket pair.
+
+A DynamicListener is a SOCKS5 proxy (ssh -D). Its clients first say which
+host and port they want, read on the selector thread like all other
+traffic, and are answered once the channel there has opened or failed.
+
+Each direction of a connection has a fixed buffer, read into with
+recv_into and written from with non-blocking sends, keeping whatever part
+a short write left for the next one. A full buffer stops reading from its
+source, so a slow client holds back the SSH channel (whose window then
+holds back the node) and a full channel window holds back the client.
+Channels have no writable notification, so while one waits for its window
+the selector wakes every TUNNEL_WINDOW_POLL seconds to retry it.
+"""
+import time
+import queue
+import socket
+import selectors
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from app.utils import socks5
+from app.config import TUNNEL_OPEN_WORKERS, TUNNEL_BUFFER_SIZE, TUNNEL_WINDOW_POLL
+
+READ = selectors.EVENT_READ
+WRITE = selectors.EVENT_WRITE
+# Buffers kept for reuse after their connection closed
+SPARE_BUFFERS = 64
+
+class Listener:
+    """A listening socket whose clients are each forwarded over a channel
+    from open_channel(), a blocking call run on the engine's pool."""
+    socks = False
+
+    def __init__(self, sock, open_channel):
+        self.sock = sock
+        self.open_channel = open_channel
+        self.connections = set()
+        # SOCKS clients that have not yet said where to connect
+        self.handshakes = set()
+        # The last error opening a channel, e.g. while the session reconnects,
+        # or of the listening socket itself
+        self.error = None
+        # Set once the engine has closed the socket and all connections
+        self.closed = threading.Event()
+        # Traffic counters, only written by the engine thread: bytes from
+        # clients to the node and back, channels opened and failed to open,
+        # and the time.monotonic() of the last of any of those
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.opened = 0
+        self.open_errors = 0
+        self.last_activity = time.monotonic()
+
+class DynamicListener(Listener):
+    """A SOCKS5 proxy, like ssh -D: each client names a host and port and
+    is forwarded over a channel from open_channel(host, port)."""
+    socks = True
+
+class Handshake:
+    """A SOCKS client's greeting and request as they arrive."""
+    __slots__ = ("listener", "client", "data", "greeted")
+
+    def __init__(self, listener, client):
+        self.listener = listener
+        self.client = client
+        self.data = bytearray()
+        self.greeted = False
+
+class Flow:
+    """Bytes on their way from one end of a connection to the other:
+    buffer[start:end] is read and not yet written."""
+    __slots__ = ("buffer", "view", "start", "end", "eof", "done")
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.start = self.end = 0
+        # The source has no more data; done once that was passed on as well
+        self.eof = False
+        self.done = False
+
+    @property
+    def pending(self):
+        return self.end - self.start
+
+    def space(self):
+        """Writable tail of the buffer, after moving pending bytes to the front."""
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif self.end == len(self.buffer) and self.start:
+            pending = self.end - self.start
+            self.view[:pending] = self.view[self.start:self.end]
+            self.start, self.end = 0, pending
+        return self.view[self.end:]
+
+class Connection:
+    """One client of a Listener and the channel it is forwarded over."""
+    __slots__ = ("listener", "client", "channel", "upstream", "downstream", "client_events", "channel_events")
+
+    def __init__(self, listener, client, channel, upstream, downstream):
+        self.listener = listener
+        self.client = client
+        self.channel = channel
+        # Client to channel, and channel to client
+        self.upstream = upstream
+        self.downstream = downstream
+        # Events each end is registered for, 0 while it is not
+        self.client_events = 0
+        self.channel_events = 0
+
+class TunnelEngine:
+    def __init__(self, open_workers=TUNNEL_OPEN_WORKERS, buffer_size=TUNNEL_BUFFER_SIZE):
+        """
+        :param open_workers: Threads opening channels, i.e. how many new
+                             clients can wait for the login node at once.
+        :param buffer_size: Bytes buffered per direction of each connection.
+        """
+        self.open_workers = open_workers
+        self.buffer_size = buffer_size
+        self._selector = None
+        self._thread = None
+        self._opener = None
+        self._calls = queue.SimpleQueue()
+        self._start_lock = threading.Lock()
+        # Connections with data waiting for their channel's window to open
+        self._window_blocked = set()
+        self._spare_buffers = []
+
+    def listen(self, listener):
+        """Start accepting and forwarding the clients of listener."""
+        self._start()
+        listener.sock.setblocking(False)
+        self._call(self._register_listener, listener)
+
+    def close(self, listener, timeout=1):
+        """Stop listening and close every connection of listener, waiting
+        up to timeout seconds for the engine to do it."""
+        self._call(self._close_listener, listener)
+        listener.closed.wait(timeout)
+
+    def drop_inactive(self, listener):
+        """Close the connections whose channel died with an old transport."""
+        self._call(self._drop_inactive, listener)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._selector = selectors.DefaultSelector()
+            self._wake_reader, self._wake_writer = socket.socketpair()
+            self._wake_reader.setblocking(False)
+            self._wake_writer.setblocking(False)
+            self._selector.register(self._wake_reader, READ, self._run_calls)
+            self._opener = ThreadPoolExecutor(max_workers=self.open_workers, thread_name_prefix="tunnel-open")
+            self._thread = threading.Thread(target=self._run, name="tunnel-engine", daemon=True)
+            self._thread.start()
+
+    def _call(self, function, *args):
+        """Run function(*args) on the engine thread."""
+        if self._thread is None:
+            return
+        self._calls.put((function, args))
+        try:
+            self._wake_writer.send(b"\0")
+        except BlockingIOError:
+            # Already woken and not yet drained
+            pass
+
+    def _run(self):
+        while True:
+            timeout = TUNNEL_WINDOW_POLL if self._window_blocked else None
+            for key, events in self._selector.select(timeout):
+                self._guarded(key.data, events)
+            for connection in list(self._window_blocked):
+                self._guarded(self._retry_window, connection)
+
+    def _retry_window(self, connection):
+        self._write_channel(connection)
+        self._update(connection)
+
+    def _guarded(self, handler, *args, close_listener=True):
+        """Run handler(*args) so that an error in it only takes down the
+        connection, handshake or listener it was for (the first argument
+        handler was bound to or is called with), not the engine thread."""
+        try:
+            handler(*args)
+        except Exception as e:
+            owner = handler.args[0] if isinstance(handler, partial) and handler.args else args[0] if args else None
+            self._fail(owner, e, close_listener)
+
+    def _fail(self, owner, error, close_listener=True):
+        """Record error on the listener of owner and close owner. A listener
+        itself is only closed if close_listener is set."""
+        if isinstance(owner, Connection):
+            listener, close = owner.listener, partial(self._close_connection, owner)
+        elif isinstance(owner, Handshake):
+            listener, close = owner.listener, partial(self._end_handshake, owner)
+        elif isinstance(owner, Listener):
+            listener, close = owner, partial(self._close_listener, owner) if close_listener else None
+        else:
+            return
+        listener.error = error
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                # Half closed is still better than a dead engine
+                pass
+
+    def _run_calls(self, _events):
+        try:
+            while self._wake_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            try:
+                function, args = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            # A failed call for one client (e.g. _connected) leaves its tunnel listening
+            self._guarded(function, *args, close_listener=False)
+
+    def _register_listener(self, listener):
+        if listener.closed.is_set():
+            return
+        self._selector.register(listener.sock, READ, partial(self._accept, listener))
+
+    def _accept(self, listener, _events):
+        while True:
+            try:
+                client, _ = listener.sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                listener.error = e
+                self._close_listener(listener)
+                return
+            if listener.socks:
+                self._start_handshake(listener, client)
+            else:
+                self._open(listener, client)
+
+    def _open(self, listener, client, *address, handshake=None):
+        future = self._opener.submit(listener.open_channel, *address)
+        future.add_done_callback(lambda future: self._call(self._connected, listener, client, future, handshake))
+
+    def _start_handshake(self, listener, client):
+        client.setblocking(False)
+        handshake = Handshake(listener, client)
+        listener.handshakes.add(handshake)
+        self._selector.register(client, READ, partial(self._on_handshake, handshake))
+
+    def _on_handshake(self, handshake, _events):
+        client = handshake.client
+        try:
+            data = client.recv(socks5.MAX_HANDSHAKE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._end_handshake(handshake)
+            return
+        handshake.data += data
+        try:
+            if not handshake.greeted:
+                length = socks5.parse_greeting(handshake.data)
+                if length is None:
+                    return
+                client.send(socks5.method_reply())
+                handshake.greeted = True
+                del handshake.data[:length]
+            request = socks5.parse_request(handshake.data)
+        except socks5.Socks5Error as e:
+            if e.code is not None:
+                self._send_reply(client, socks5.reply(e.code) if handshake.greeted else socks5.method_reply(e.code))
+            self._end_handshake(handshake)
+            return
+        except OSError:
+            self._end_handshake(handshake)
+            return
+        if request is None:
+            return
+        host, port, length = request
+        # Anything sent after the request goes to the channel once it is open
+        del handshake.data[:length]
+        self._end_handshake(handshake, close=False)
+        self._open(handshake.listener, client, host, port, handshake=handshake)
+
+    def _end_handshake(self, handshake, close=True):
+        handshake.listener.handshakes.discard(handshake)
+        self._selector.unregister(handshake.client)
+        if close:
+            handshake.client.close()
+
+    @staticmethod
+    def _send_reply(client, reply):
+        """Send a SOCKS reply, which fits in any socket buffer; False if it failed."""
+        try:
+            return client.send(reply) == len(reply)
+        except OSError:
+            return False
+
+    def _connected(self, listener, client, future, handshake=None):
+        """A channel was opened (or failed to) for a client that connected."""
+        try:
+            channel = future.result()
+        except Exception as e:
+            if handshake is None:
+                listener.error = e
+            else:
+                code = socks5.reply_code(e)
+                # A proxy client asking for a port nothing listens on says
+                # nothing about the proxy itself
+                if code == socks5.GENERAL_FAILURE:
+                    listener.error = e
+                self._send_reply(client, socks5.reply(code))
+            listener.open_errors += 1
+            client.close()
+            return
+        if listener.closed.is_set() or (handshake and not self._send_reply(client, socks5.reply(socks5.SUCCEEDED))):
+            client.close()
+            channel.close()
+            return
+        listener.error = None
+        listener.opened += 1
+        listener.last_activity = time.monotonic()
+        client.setblocking(False)
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Sends take what the window allows and recvs what has arrived, without waiting
+        channel.settimeout(0.0)
+        connection = Connection(listener, client, channel, Flow(self._take_buffer()), Flow(self._take_buffer()))
+        listener.connections.add(connection)
+        if handshake and handshake.data:
+            upstream = connection.upstream
+            upstream.end = len(handshake.data)
+            upstream.buffer[:upstream.end] = handshake.data
+            listener.bytes_in += upstream.end
+            self._write_channel(connection)
+        self._update(connection)
+
+    def _take_buffer(self):
+        return self._spare_buffers.pop() if self._spare_buffers else bytearray(self.buffer_size)
+
+    def _on_client(self, connection, events):
+        if events & READ:
+            self._read_client(connection)
+        if events & WRITE:
+            self._write_client(connection)
+        self._update(connection)
+
+    def _on_channel(self, connection, _events):
+        self._read_channel(connection)
+        self._update(connection)
+
+    def _read_client(self, connection):
+        flow = connection.upstream
+        try:
+            count = connection.client.recv_into(flow.space())
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._close_connection(connection)
+            return
+        if count:
+            flow.end += count
+            connection.listener.bytes_in += count
+            connection.listener.last_activity = time.monotonic()
+        else:
+            flow.eof = True
+        self._write_channel(connection)
+
+    def _write_channel(self, connection):
+        flow = connection.upstream
+        channel = connection.channel
+        while flow.pending:
+            try:
+                sent = channel.send(flow.view[flow.start:flow.end])
+            except socket.timeout:
+                # The window is full; retried until the node acknowledges data
+                self._window_blocked.add(connection)
+                return
+            except OSError:
+                self._close_connection(connection)
+                return
+            if not sent:
+                self._close_connection(connection)
+                return
+            flow.start += sent
+        self._window_blocked.discard(connection)
+        if flow.eof and not flow.done:
+            flow.done = True
+            channel.shutdown_write()
+
+    def _read_channel(self, connection):
+        flow = connection.downstream
+        space = flow.space()
+        try:
+            data = connection.channel.recv(len(space))
+        except socket.timeout:
+            return
+        except OSError:
+            self._close_connection(connection)
+            return
+        if data:
+            # paramiko hands out bytes rather than reading into a buffer
+            space[:len(data)] = data
+            flow.end += len(data)
+            connection.listener.bytes_out += len(data)
+            connection.listener.last_activity = time.monotonic()
+        else:
+            flow.eof = True
+        self._write_client(connection)
+
+    def _write_client(self, connection):
+        flow = connection.downstream
+        while flow.pending:
+            try:
+                flow.start += connection.client.send(flow.view[flow.start:flow.end])
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                self._close_connection(connection)
+                return
+        if flow.eof and not flow.done:
+            flow.done = True
+            try:
+                connection.client.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    def _update(self, connection):
+        """Register each end for the events its buffers can take, or close
+        the connection once both directions are done."""
+        if connection not in connection.listener.connections:
+            return
+        upstream, downstream = connection.upstream, connection.downstream
+        if upstream.done and downstream.done:
+            self._close_connection(connection)
+            return
+        client_events = 0
+        if not upstream.eof and upstream.pending < len(upstream.buffer):
+            client_events |= READ
+        if downstream.pending:
+            client_events |= WRITE
+        channel_events = READ if not downstream.eof and downstream.pending < len(downstream.buffer) else 0
+        connection.client_events = self._interest(connection.client, connection.client_events, client_events,
+                                                  partial(self._on_client, connection))
+        connection.channel_events = self._interest(connection.channel, connection.channel_events, channel_events,
+                                                   partial(self._on_channel, connection))
+
+    def _interest(self, endpoint, current, events, handler):
+        if events == current:
+            return events
+        if not events:
+            self._selector.unregister(endpoint)
+        elif not current:
+            self._selector.register(endpoint, events, handler)
+        else:
+            self._selector.modify(endpoint, events, handler)
+        return events
+
+    def _close_connection(self, connection):
+        if connection not in connection.listener.connections:
+            return
+        connection.listener.connections.discard(connection)
+        self._window_blocked.discard(connection)
+        for endpoint, events in ((connection.client, connection.client_events),
+                                 (connection.channel, connection.channel_events)):
+            if events:
+                self._selector.unregister(endpoint)
+            endpoint.close()
+        connection.client_events = connection.channel_events = 0
+        for flow in (connection.upstream, connection.downstream):
+            if len(self._spare_buffers) < SPARE_BUFFERS:
+                self._spare_buffers.append(flow.buffer)
+
+    def _drop_inactive(self, listener):
+        for connection in list(listener.connections):
+            transport = connection.channel.get_transport()
+            if connection.channel.closed or transport is None or not transport.is_active():
+                self._close_connection(connection)
+
+    def _close_listener(self, listener):
+        if listener.closed.is_set():
+            return
+        try:
+            self._selector.unregister(listener.sock)
+        except (KeyError, ValueError):
+            pass
+        listener.sock.close()
+        for handshake in list(listener.handshakes):
+            self._end_handshake(handshake)
+        for connection in list(listener.connections):
+            self._close_connection(connection)
+        listener.closed.set()
@@ -1,111 +1,252 @@
-import socket
-import select
-import threading
 import time
+import socket
+from dataclasses import dataclass
+from app.tunnel_engine import TunnelEngine, Listener, DynamicListener
+from app.config import TUNNEL_WINDOW_SIZE, TUNNEL_READY_TIMEOUT, TUNNEL_STATS_INTERVAL, TUNNEL_IDLE_AFTER, SOCKS_PORT
+
+SSH_PORT = 22
+# Key of the SOCKS proxy in TunnelManager.tunnels, which has no node or remote port
+PROXY_KEY = (None, None)
+
+def parse_forward(spec):
+    """Parse what the user typed for a tunnel: "LOCAL", "LOCAL:REMOTE" or
+    ":REMOTE", where a blank local port means any free one and a missing
+    remote port means the node's sshd. Returns (local_port or None, remote_port)
+    or raises ValueError."""
+    local, _, remote = spec.strip().partition(":")
+    ports = []
+    for value, default in ((local.strip(), None), (remote.strip(), SSH_PORT)):
+        if not value:
+            ports.append(default)
+        elif value.isdigit() and 0 < int(value) < 65536:
+            ports.append(int(value))
+        else:
+            raise ValueError(f"Invalid port number: {value}")
+    return tuple(ports)
+
+@dataclass
+class TunnelStats:
+    """Traffic and health of one tunnel. In is from local clients to the
+    node, out is back; rates are bytes per second."""
+    bytes_in: int = 0
+    bytes_out: int = 0
+    rate_in: float = 0.0
+    rate_out: float = 0.0
+    channels: int = 0
+    opened: int = 0
+    open_errors: int = 0
+    last_error: str = None
+    idle_seconds: float = 0.0
+    # "ok", "idle" (no clients and no traffic for TUNNEL_IDLE_AFTER) or
+    # "dead" (it cannot forward: the session is down, the last channel
+    # failed to open or the local socket failed)
+    health: str = "ok"
+
+class Tunnel:
+    """A local port forwarded to a port on a compute node."""
+
+    def __init__(self, node, local_port, remote_port=SSH_PORT, listener=None, stats=None):
+        self.node = node
+        self.local_port = local_port
+        self.remote_port = remote_port
+        # None for tunnels owned by the session daemon, which come with a
+        # snapshot of their stats instead
+        self.listener = listener
+        self.snapshot = stats or TunnelStats()
+        # (time, bytes in, bytes out) the rates are measured from
+        self._rate_start = (time.monotonic(), 0, 0)
+
+    @property
+    def key(self):
+        return self.node, self.remote_port
+
+    @property
+    def label(self):
+        """The local port, and the remote one as LOCAL:REMOTE unless it is sshd's."""
+        if self.key == PROXY_KEY:
+            return f"SOCKS {self.local_port}"
+        if self.remote_port == SSH_PORT:
+            return str(self.local_port)
+        return f"{self.local_port}:{self.remote_port}"
+
+    @property
+    def connections(self):
+        return len(self.listener.connections) if self.listener else 0
+
+    def stats(self, connected=True):
+        """Current TunnelStats. The rates are averaged over at least
+        TUNNEL_STATS_INTERVAL seconds, however often this is called.
+
+        :param connected: Whether the SSH session is up.
+        """
+        listener = self.listener
+        if listener is None:
+            return self.snapshot
+        now = time.monotonic()
+        stats = self.snapshot
+        start, bytes_in, bytes_out = self._rate_start
+        if now - start >= TUNNEL_STATS_INTERVAL:
+            stats.rate_in = (listener.bytes_in - bytes_in) / (now - start)
+            stats.rate_out = (listener.bytes_out - bytes_out) / (now - start)
+            self._rate_start = (now, listener.bytes_in, listener.bytes_out)
+        stats.bytes_in, stats.bytes_out = listener.bytes_in, listener.bytes_out
+        stats.channels = len(listener.connections)
+        stats.opened, stats.open_errors = listener.opened, listener.open_errors
+        stats.last_error = str(listener.error) if listener.error is not None else None
+        stats.idle_seconds = now - listener.last_activity
+        if not connected or listener.error is not None or listener.closed.is_set():
+            stats.health = "dead"
+        elif not stats.channels and stats.idle_seconds >= TUNNEL_IDLE_AFTER:
+            stats.health = "idle"
+        else:
+            stats.health = "ok"
+        return stats
+
+def tunnels_to(tunnels, node):
+    """The tunnels to node, in the order they were set up."""
+    return [tunnel for (tunnel_node, _), tunnel in tunnels.items() if tunnel_node == node]
 
 class TunnelManager:
-    def __init__(self, ssh_manager: object):
+    def __init__(self, ssh_manager: object, engine: TunnelEngine = None):
         """
         :param ssh_manager: An instance of SSHConnectionManager.
+        :param engine: The TunnelEngine forwarding the connections, one of its own by default.
         """
         self.ssh_manager = ssh_manager
-        # Store active tunnels as a dict: node -> (local_port, local_socket, tunnel_thread, channels)
+        self.engine = engine or TunnelEngine()
+        # Active tunnels by (node, remote port)
         self.tunnels = {}
+        self.ssh_manager.supervisor.add_listener(self.reattach_tunnels)
 
-    def forward_socket(self, client_socket, remote_channel):
-        """Bidirectionally forward data between the local socket and the remote SSH channel."""
+    def open_channel(self, node, remote_port, local_port):
+        """Open a direct-tcpip channel to node:remote_port on the current
+        transport. Runs on the engine's pool for every client that connects."""
         try:
-            while True:
-                r, _, _ = select.select([client_socket, remote_channel], [], [])
-                if client_socket in r:
-                    data = client_socket.recv(1024)
-                    if not data:
-                        break
-                    remote_channel.send(data)
-                if remote_channel in r:
-                    data = remote_channel.recv(1024)
-                    if not data:
-                        break
-                    client_socket.send(data)
-        finally:
-            client_socket.close()
-            remote_channel.close()
-
-    def setup_tunnel(self, node, local_port):
-        """Create an SSH tunnel to a remote node using port forwarding.
-           Returns a success message or raises an Exception.
+            # Looked up per client, so tunnels keep working after a reconnect
+            transport = self.ssh_manager.get_transport()
+            return transport.open_channel("direct-tcpip", (node, remote_port), ("127.0.0.1", local_port),
+                                          window_size=TUNNEL_WINDOW_SIZE)
+        except Exception:
+            # The session may be reconnecting; the engine drops this client
+            # and keeps listening for the next one
+            if not self.ssh_manager.is_connected():
+                self.ssh_manager.supervisor.report_lost()
+            raise
+
+    def setup_tunnel(self, node, local_port=None, remote_port=SSH_PORT, timeout=TUNNEL_READY_TIMEOUT):
+        """Create an SSH tunnel from local_port (any free port if None) to
+           remote_port on a compute node, once a probe shows something is
+           listening there. Returns a success message or raises an Exception.
         """
-        if node in self.tunnels:
-            return f"Tunnel to {node} already exists."
+        remote_port = int(remote_port)
+        if (node, remote_port) in self.tunnels:
+            tunnel = self.tunnels[(node, remote_port)]
+            return f"Tunnel to {node}:{remote_port} already exists on localhost:{tunnel.local_port}."
 
-        transport = self.ssh_manager.ssh_client.get_transport()
-        if not transport:
-            raise Exception("SSH transport is not available.")
+        # Fail early if there is no session
+        self.ssh_manager.get_transport()
 
-        local_port = int(local_port)
         local_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         local_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        local_socket.bind(("127.0.0.1", local_port))
-        local_socket.listen(1)
-        channels = []  # to store active remote channels
-
-        def tunnel_forward():
-            while True:
-                try:
-                    client_socket, _ = local_socket.accept()
-                    remote_channel = transport.open_channel(
-                        "direct-tcpip",
-                        (node, 22),
-                        ("127.0.0.1", local_port)
-                    )
-                    if remote_channel is None:
-                        break
-                    channels.append(remote_channel)
-                    self.forward_socket(client_socket, remote_channel)
-                except Exception as e:
-                    print(f"Tunnel error: {e}")
-                    break
-
-        tunnel_thread = threading.Thread(target=tunnel_forward, daemon=True)
-        tunnel_thread.start()
-        self.tunnels[node] = (local_port, local_socket, tunnel_thread, channels)
-        # Optionally, wait a short time and check that the port is open:
-        time.sleep(3)
-        return f"Tunnel established to {node} on localhost:{local_port}."
-
-    def close_tunnel(self, node):
-        """Properly close an SSH tunnel to the given node.
-           Returns a message indicating success or failure.
+        try:
+            local_socket.bind(("127.0.0.1", int(local_port or 0)))
+            local_socket.listen(socket.SOMAXCONN)
+            local_port = local_socket.getsockname()[1]
+            self.probe(node, remote_port, timeout)
+        except Exception:
+            local_socket.close()
+            raise
+        listener = Listener(local_socket, lambda: self.open_channel(node, remote_port, local_port))
+        self.engine.listen(listener)
+        self.tunnels[(node, remote_port)] = Tunnel(node, local_port, remote_port, listener)
+        return f"Tunnel established to {node}:{remote_port} on localhost:{local_port}."
+
+    def setup_proxy(self, local_port=SOCKS_PORT):
+        """Start a SOCKS5 proxy on local_port (any free port if None), like
+           ssh -D: every client connection becomes a channel to the host and
+           port it asks for. Returns a success message or raises an Exception.
         """
-        if node not in self.tunnels:
-            raise Exception(f"No active tunnel to {node}.")
+        if PROXY_KEY in self.tunnels:
+            return f"SOCKS proxy already running on localhost:{self.tunnels[PROXY_KEY].local_port}."
+        self.ssh_manager.get_transport()
 
-        _, local_socket, tunnel_thread, channels = self.tunnels[node]
+        local_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        local_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            local_socket.bind(("127.0.0.1", int(local_port or 0)))
+            local_socket.listen(socket.SOMAXCONN)
+        except OSError:
+            local_socket.close()
+            raise
+        local_port = local_socket.getsockname()[1]
+        listener = DynamicListener(local_socket, lambda host, port: self.open_channel(host, port, local_port))
+        self.engine.listen(listener)
+        self.tunnels[PROXY_KEY] = Tunnel(None, local_port, None, listener)
+        return f"SOCKS proxy running on localhost:{local_port}."
 
-        # Close all active remote channels associated with the tunnel
-        for ch in channels:
-            try:
-                if ch.active:
-                    ch.close()
-            except Exception as e:
-                print(f"Error closing channel: {e}")
+    def close_proxy(self):
+        if PROXY_KEY not in self.tunnels:
+            raise Exception("No SOCKS proxy is running.")
+        self.engine.close(self.tunnels.pop(PROXY_KEY).listener)
+        return "SOCKS proxy stopped."
 
-        # Close the local listening socket
+    def probe(self, node, remote_port, timeout=TUNNEL_READY_TIMEOUT):
+        """Check that something accepts connections on node:remote_port by
+        opening (and closing) a channel to it, which takes one round trip
+        when it does. Raises an Exception when it does not within timeout."""
+        # Loaded with the session already, see SSHConnectionManager.reopen
+        import paramiko
+        transport = self.ssh_manager.get_transport()
         try:
-            local_socket.close()
-        except Exception as e:
-            print(f"Error closing local socket: {e}")
+            channel = transport.open_channel("direct-tcpip", (node, remote_port), ("127.0.0.1", 0),
+                                             timeout=timeout)
+        except paramiko.ChannelException as e:
+            raise Exception(f"Nothing is listening on {node}:{remote_port}.") from e
+        except paramiko.SSHException as e:
+            if not transport.is_active():
+                raise
+            raise Exception(f"{node}:{remote_port} did not answer within {timeout} seconds.") from e
+        channel.close()
+
+    def stats(self):
+        """TunnelStats of every tunnel, by (node, remote port)."""
+        connected = self.ssh_manager.is_connected()
+        # A snapshot, since tunnels are set up and closed on other threads
+        return {key: tunnel.stats(connected) for key, tunnel in list(self.tunnels.items())}
+
+    def reattach_tunnels(self, _latency=None):
+        """Drop channels that died with the old transport.
+
+        The listening sockets stay open across a reconnect, so clients only
+        have to reconnect to the same local port to get a channel on the new
+        transport.
+        """
+        for tunnel in self.tunnels.values():
+            self.engine.drop_inactive(tunnel.listener)
 
-        # Wait briefly for the thread to finish
-        if tunnel_thread.is_alive():
-            tunnel_thread.join(timeout=1)
+    def close_tunnel(self, node, remote_port=None):
+        """Properly close the SSH tunnel to remote_port on the given node, or
+           every tunnel to the node if remote_port is None.
+           Returns a message indicating success or failure.
+        """
+        if remote_port is None:
+            tunnels = tunnels_to(self.tunnels, node)
+        else:
+            tunnel = self.tunnels.get((node, int(remote_port)))
+            tunnels = [tunnel] if tunnel else []
+        if not tunnels:
+            raise Exception(f"No active tunnel to {node}.")
 
-        del self.tunnels[node]
-        return f"Tunnel to {node} closed."
+        for tunnel in tunnels:
+            # Stops listening and closes every client and channel of the tunnel
+            self.engine.close(self.tunnels.pop(tunnel.key).listener)
+        if remote_port is None and len(tunnels) > 1:
+            return f"{len(tunnels)} tunnels to {node} closed."
+        return f"Tunnel to {node}:{tunnels[0].remote_port} closed."
 
     def close_all_tunnels(self):
-        for node in list(self.tunnels.keys()):
-            try:
-                self.close_tunnel(node)
-            except Exception as e:
-                print(f"Error closing tunnel for {node}: {e}")
+        for node, remote_port in list(self.tunnels.keys()):
+            if (node, remote_port) == PROXY_KEY:
+                self.close_proxy()
+            else:
+                self.close_tunnel(node, remote_port)
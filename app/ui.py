@@ -1,14 +1,41 @@
+import os
+import time
+import asyncio
+import importlib
+import threading
+from dotenv import load_dotenv
+from textual import events, work
 from textual.app import App
 from app.tunnel_manager import TunnelManager
 from app.ssh_connection import SSHConnectionManager
 from app.remote_mnt_manager import RemoteMntManager
-from app.screens.history_screen import HistoryScreen
-from app.screens.home_screen import HomeScreen
-from app.screens.login_screen import LoginScreen
-from app.screens.request_node_screen import NodeRequestScreen
-from app.screens.create_config_screen import CreateSlurmConfigScreen
-from app.screens.run_slurm_screen import RunSlurmJobScreen
-from app.config import UIBindings
+from app.remote_files import RemoteFiles
+from app.helper_agent_manager import HelperAgentManager
+from app.command_cache import CommandCache
+from app.queue_poller import QueuePoller
+from app.resource_monitor import ResourceMonitor
+from app.cluster_nodes import ClusterNodes
+from app.wait_estimator import WaitEstimator
+from app.history_store import HistoryStore
+from app.session_daemon_client import SessionDaemonClient, DaemonTunnelManager, DaemonHelperAgent, DaemonRemoteFiles
+from app.config import UIBindings, QUEUE_POLL_IDLE_AFTER, MOUNT_CHECK_INTERVAL
+
+# Screens are imported the first time they are shown, so start-up only pays
+# for the one that is actually displayed.
+SCREENS = {
+    "home": ("app.screens.home_screen", "HomeScreen"),
+    "history": ("app.screens.history_screen", "HistoryScreen"),
+    "login": ("app.screens.login_screen", "LoginScreen"),
+    "node_request": ("app.screens.request_node_screen", "NodeRequestScreen"),
+    "slurm_config": ("app.screens.create_config_screen", "CreateSlurmConfigScreen"),
+    "run_slurm": ("app.screens.run_slurm_screen", "RunSlurmJobScreen"),
+    "log": ("app.screens.log_screen", "LogScreen"),
+}
+
+def load_screen(name):
+    """Import and return the screen class registered under name."""
+    module_name, class_name = SCREENS[name]
+    return getattr(importlib.import_module(module_name), class_name)
 
 class IDUNTUI(App):
 
@@ -17,57 +44,214 @@ class IDUNTUI(App):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.context = SSHConnectionManager()
-        self.tunnel_manager = TunnelManager(self.context)
-        self.remote_mnt_manager = RemoteMntManager()
-
-    def on_mount(self):
-        """Start on login screen."""
-        if (self.context.username and self.context.password):
-            self.context.connect()
-            self.push_screen(HomeScreen())
+        load_dotenv()
+        use_helper = os.getenv("IDUN_REMOTE_HELPER") == "1"
+        # Optional background daemon that keeps the SSH session and tunnels
+        # alive between launches (IDUN_SESSION_DAEMON=1)
+        self.session_daemon = os.getenv("IDUN_SESSION_DAEMON") == "1"
+        if self.session_daemon:
+            self.context = SessionDaemonClient()
+            self.tunnel_manager = DaemonTunnelManager(self.context)
+            self.helper_agent = DaemonHelperAgent(self.context) if use_helper else None
+            self.remote_files = DaemonRemoteFiles(self.context)
+        else:
+            self.context = SSHConnectionManager()
+            self.tunnel_manager = TunnelManager(self.context)
+            # Optional long-lived agent on the login node (IDUN_REMOTE_HELPER=1)
+            self.helper_agent = HelperAgentManager(self.context) if use_helper else None
+            self.remote_files = RemoteFiles(self.context)
+            self.context.supervisor.add_listener(self.on_session_reconnected)
+            self.context.supervisor.add_error_listener(self.on_reconnect_listener_failed)
+        # Optional CIFS mount of the home directory (IDUN_MOUNT_HOME=1)
+        self.remote_mnt_manager = RemoteMntManager(self.context)
+        self.command_cache = CommandCache(self.context, self.helper_agent)
+        self.last_input = time.monotonic()
+        self.queue_poller = QueuePoller(self.command_cache, self.context, self.helper_agent,
+                                        is_active=self.is_user_active)
+        # nvidia-smi samples start a step inside the job, so they are opt-in (IDUN_MONITOR_GPU=1)
+        self.resource_monitor = ResourceMonitor(self.command_cache, self.helper_agent,
+                                                gpu=os.getenv("IDUN_MONITOR_GPU") == "1",
+                                                is_active=self.is_user_active)
+        self.cluster_nodes = ClusterNodes(self.command_cache, self.helper_agent)
+        # The user's job history, shared by the history screen and the wait
+        # estimator; opened on first use since it is per user and host
+        self.history_store = None
+        self.wait_estimator = WaitEstimator(self.context, self.command_cache, self.open_history_store,
+                                            self.helper_agent)
+
+    def is_user_active(self):
+        """False while the terminal is unfocused or has had no input for a while."""
+        return self.app_focus and time.monotonic() - self.last_input < QUEUE_POLL_IDLE_AFTER
+
+    async def on_event(self, event):
+        if isinstance(event, (events.InputEvent, events.AppFocus)):
+            self.last_input = time.monotonic()
+            self.queue_poller.activity()
+            self.resource_monitor.activity()
+        await super().on_event(event)
+
+    def on_session_reconnected(self, latency):
+        """Called from the supervisor thread after the SSH session came back."""
+        self.call_from_thread(self.notify, f"Reconnected to IDUN in {latency:.1f}s.")
+
+    def on_reconnect_listener_failed(self, error):
+        """Called from the supervisor thread when reattaching to the new session failed."""
+        self.call_from_thread(self.notify, str(error), title="Reconnected with errors", severity="error")
+
+    async def on_mount(self):
+        """Show the home screen straight away and connect in the background,
+        or start on the login screen when there are no stored credentials."""
+        self.poll_queue()
+        self.monitor_resources()
+        # With the session daemon this asks whether it is running
+        if await asyncio.to_thread(self.context.has_credentials):
+            self.push_screen(load_screen("home")())
+            self.connect_in_background()
         else:
-            self.push_screen(LoginScreen())
+            self.push_screen(load_screen("login")())
+
+    @work(exclusive=True, group="connect")
+    async def connect_in_background(self):
+        try:
+            await self.context.connect_async()
+            if self.session_daemon:
+                self.tunnel_manager.refresh()
+            self.watch_mount()
+        except Exception as e:
+            self.notify(str(e), title="Could not connect", severity="error")
+            self.switch_to("login")
+
+    @work(exclusive=True, group="mount")
+    async def watch_mount(self):
+        """Keep the home directory mounted while logged in, if enabled: mount
+        it in the background, probe it every MOUNT_CHECK_INTERVAL seconds and
+        remount it when it goes stale. Changes are reported as notifications
+        and the mount's state is kept in the header."""
+        manager = self.remote_mnt_manager
+        if not manager.enabled:
+            return
+        while True:
+            state, mounts = manager.state, manager.mount_count
+            await asyncio.to_thread(manager.check)
+            self.show_mount_status()
+            mounted = manager.mount_count != mounts
+            if manager.state == "mounted" and (state != "mounted" or mounted):
+                verb = "remounted" if state == "mounted" else "mounted"
+                how = f"in {manager.last_mount_latency:.1f}s" if mounted else "(already mounted)"
+                self.notify(f"Home directory {verb} on {manager.mount_point} {how}.")
+            elif manager.state == "unavailable" and state != "unavailable":
+                self.notify(manager.error, title="Home directory mount unavailable", severity="warning")
+            await asyncio.sleep(MOUNT_CHECK_INTERVAL)
+
+    def show_mount_status(self):
+        """Show the mount's state, probe latency and remounts as the header's subtitle."""
+        stats = self.remote_mnt_manager.stats()
+        if stats["state"] != "mounted":
+            self.sub_title = f"Home {stats['state']}"
+            return
+        remounts = f", {stats['remount_count']} remounts" if stats["remount_count"] else ""
+        self.sub_title = (f"Home on {stats['mount_point']} "
+                          f"(probe {stats['last_probe_latency'] * 1000:.0f} ms{remounts})")
+
+    def unmount_home(self):
+        """Stop watching the mount and unmount it on a thread of its own. It
+        is not a daemon thread, so quitting waits for the (time-bounded)
+        unmount instead of leaving the mount behind."""
+        self.workers.cancel_group(self, "mount")
+        self.sub_title = ""
+        threading.Thread(target=self.remote_mnt_manager.unmount).start()
+
+    @work(group="queue-poller")
+    async def poll_queue(self):
+        """Run the shared queue poll for as long as the app runs."""
+        await self.queue_poller.run()
+
+    @work(group="resource-monitor")
+    async def monitor_resources(self):
+        """Sample the monitored jobs for as long as the app runs."""
+        await self.resource_monitor.run()
+
+    @work(group="wait-model")
+    async def fit_wait_model(self):
+        """Sync the history and update the wait model if it is due."""
+        await self.wait_estimator.refresh()
+
+    def open_history_store(self):
+        """The logged in user's HistoryStore, opened on first use."""
+        if self.history_store is None:
+            self.history_store = HistoryStore(self.context, self.context.username, command_cache=self.command_cache)
+        return self.history_store
+
+    def close_history_store(self):
+        """Stop the syncs using the history store and close it, e.g. on
+        logout. A merge or query already running on a thread finishes first."""
+        for worker in self.workers:
+            # The wait model's, and the history screen's if it is open
+            if worker.group in ("wait-model", "history", "history-load"):
+                worker.cancel()
+        self.wait_estimator.clear()
+        if self.history_store is not None:
+            self.history_store.close()
+            self.history_store = None
+
+    def switch_to(self, name):
+        """Replace the current screen with a new instance of the named screen."""
+        # Screens opened on top of it, such as a job log, are closed as well
+        while len(self.screen_stack) > 2:
+            self.pop_screen()
+        self.pop_screen()
+        self.push_screen(load_screen(name)())
+
+    def open_log(self, job_id):
+        """Show the output of a job on top of the current screen."""
+        self.push_screen(load_screen("log")(job_id))
 
     def action_switch_to_home(self):
         """Navigate to the home screen."""
-        self.pop_screen()
-        self.push_screen(HomeScreen())
+        self.switch_to("home")
 
     def action_switch_to_history(self):
         """Navigate to the history screen."""
-        self.pop_screen()
-        self.push_screen(HistoryScreen())
+        self.switch_to("history")
 
     def action_switch_to_slurm_config(self):
         """Navigate to the SLURM configuration screen."""
-        self.pop_screen()
-        self.push_screen(CreateSlurmConfigScreen())
+        self.switch_to("slurm_config")
 
     def action_switch_to_run_slurm(self):
         """Navigate to the SLURM job submission screen."""
-        self.pop_screen()
-        self.push_screen(RunSlurmJobScreen())
+        self.switch_to("run_slurm")
 
     def action_switch_to_node_request(self):
         """Navigate to the node request screen."""
-        self.pop_screen()
-        self.push_screen(NodeRequestScreen())
+        self.switch_to("node_request")
 
     def action_logout(self):
         """Logout user and return to login screen."""
+        if self.helper_agent:
+            self.helper_agent.close()
         self.tunnel_manager.close_all_tunnels()
-        self.context.close()
-        self.remote_mnt_manager.unmount()
+        if self.session_daemon:
+            self.context.shutdown()
+        else:
+            self.context.close()
+        self.unmount_home()
+        self.queue_poller.clear()
+        self.resource_monitor.clear()
+        self.cluster_nodes.clear()
+        self.close_history_store()
+        self.remote_files.clear()
         self.context.password = None
-        self.pop_screen()
-        self.push_screen(LoginScreen())
+        self.switch_to("login")
 
     def action_quit(self):
-        """Quit the app."""
-        self.tunnel_manager.close_all_tunnels()
+        """Quit the app. With the session daemon, its tunnels keep running."""
+        if self.helper_agent:
+            self.helper_agent.close()
+        if not self.session_daemon:
+            self.tunnel_manager.close_all_tunnels()
         self.context.close()
-        self.remote_mnt_manager.unmount()
+        self.unmount_home()
         self.exit()
 
 
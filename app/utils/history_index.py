@@ -0,0 +1,224 @@
+"""In-memory indexes for filtering large job histories as the user types.
+
+Sets of jobs are bitsets stored in Python ints: bit i is the i-th job in
+start-time order, so intersecting two filters is a single '&' regardless of
+how many jobs match, and counting matches is int.bit_count().
+"""
+import re
+import bisect
+import datetime
+from array import array
+from functools import lru_cache
+from itertools import compress, repeat
+from collections import defaultdict, deque
+from app.utils.slurm_fields import expand_hostlist
+
+TOKEN = re.compile(r"[a-z0-9]+")
+SORT_KEYS = ("start", "elapsed")
+QUERY_HELP = "words, state:failed, node:idun-01, after:2025-01-01, before:2025-02-01, re:pattern, sort:-elapsed"
+
+# Conversions go through a "bytemap" with one 0/1 byte per job, which map(),
+# compress() and int(..., 2) handle in C instead of a Python loop per job.
+TO_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+FROM_DIGITS = bytes.maketrans(b"01", b"\x00\x01")
+
+def positions_to_bitset(positions, size):
+    bytemap = bytearray(size)
+    deque(map(bytemap.__setitem__, positions, repeat(1)), maxlen=0)
+    return int(bytemap.translate(TO_DIGITS)[::-1], 2) if size else 0
+
+def bitset_to_bytemap(bits, size):
+    return format(bits, f"0{size}b")[::-1].encode().translate(FROM_DIGITS) if size else b""
+
+def bitset_positions(bits, size, reverse=False):
+    """Positions of the set bits, ascending (or descending with reverse=True)."""
+    bytemap = bitset_to_bytemap(bits, size)
+    if reverse:
+        return compress(range(size - 1, -1, -1), bytemap[::-1])
+    return compress(range(size), bytemap)
+
+# Tokens on more than 1/DENSE_FRACTION of the jobs keep a ready-made bitset
+# (size/8 bytes); the others keep their positions (4 bytes each)
+DENSE_FRACTION = 256
+
+class TokenIndex:
+    """Inverted index from tokens to the jobs containing them, with prefix lookup.
+
+    Common tokens have a ready-made bitset. The positions of all other tokens
+    are stored back to back in vocabulary order, so for any prefix they form
+    one contiguous slice.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._postings = defaultdict(list)
+        self.vocabulary = []
+        self.offsets = array("I")
+        self.positions = array("I")
+        self.dense_vocabulary = []
+        self.dense = []
+        self.prefix = lru_cache(maxsize=256)(self._prefix)
+
+    def add(self, token, position):
+        postings = self._postings[token]
+        # Rows are added in order, so a token repeated within one row shows up last
+        if not postings or postings[-1] != position:
+            postings.append(position)
+
+    def freeze(self):
+        """Finish building: lay the postings out in vocabulary order."""
+        threshold = self.size // DENSE_FRACTION
+        for token in sorted(self._postings):
+            postings = self._postings[token]
+            if len(postings) > threshold:
+                self.dense_vocabulary.append(token)
+                self.dense.append(positions_to_bitset(postings, self.size))
+            else:
+                self.vocabulary.append(token)
+                self.offsets.append(len(self.positions))
+                self.positions.extend(postings)
+        self.offsets.append(len(self.positions))
+        self._postings = None
+
+    def _prefix(self, prefix):
+        """Bitset of the jobs with a token starting with prefix."""
+        end = prefix + "\uffff"
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        stop = bisect.bisect_left(self.vocabulary, end, start)
+        rare = self.positions[self.offsets[start]:self.offsets[stop]]
+        bits = positions_to_bitset(rare, self.size) if rare else 0
+        start = bisect.bisect_left(self.dense_vocabulary, prefix)
+        for dense in self.dense[start:bisect.bisect_left(self.dense_vocabulary, end, start)]:
+            bits |= dense
+        return bits
+
+class HistoryIndex:
+    """Indexes over a list of SacctJobs, built once, answering filter queries.
+
+    A query is a space separated list of terms, all of which must match:
+      word            a token of the job name starts with word (case-insensitive)
+      state:a,b       the job state starts with a or b (e.g. state:cancel)
+      node:prefix     the job ran on a node whose name starts with prefix
+      after:date      started at or after date (ISO date or date and time)
+      before:date     started before date
+      re:pattern      the job name matches the regular expression
+      sort:key        order by start or elapsed; prefix '-' for descending
+    Without a sort term the most recently started jobs come first.
+    """
+
+    def __init__(self, jobs):
+        # Jobs that have not started come first, then by start time, so any
+        # date range is one contiguous run of positions.
+        self.jobs = sorted(jobs, key=lambda job: (job.start is not None, job.start or datetime.datetime.min))
+        size = self.size = len(self.jobs)
+        self.all = (1 << size) - 1
+        self.unstarted = sum(1 for job in self.jobs if job.start is None)
+        self.starts = [job.start for job in self.jobs[self.unstarted:]]
+        self.job_names = [job.name for job in self.jobs]
+        self.names = TokenIndex(size)
+        self.nodes = TokenIndex(size)
+        states = defaultdict(list)
+        hosts = lru_cache(maxsize=4096)(lambda nodelist: tuple(expand_hostlist(nodelist)) if nodelist else ())
+        for position, job in enumerate(self.jobs):
+            for token in TOKEN.findall(job.name.lower()):
+                self.names.add(token, position)
+            for host in hosts(job.nodelist):
+                self.nodes.add(host.lower(), position)
+            # "CANCELLED by 123" is filed under CANCELLED
+            states[job.state.split(" ", 1)[0].lower()].append(position)
+        self.names.freeze()
+        self.nodes.freeze()
+        self.states = {state: positions_to_bitset(positions, size) for state, positions in states.items()}
+        self.by_elapsed = sorted(range(size), key=lambda position: self.jobs[position].elapsed or -1)
+
+    def search(self, query):
+        """HistoryView of the jobs matching query; raises ValueError for invalid terms."""
+        bits = self.all
+        patterns = []
+        order = "-start"
+        for term in query.split():
+            key, _, value = term.partition(":")
+            if not value:
+                key, value = "", term
+            key = key.lower()
+            if key == "state":
+                states = 0
+                for prefix in value.lower().split(","):
+                    for state, state_bits in self.states.items():
+                        if state.startswith(prefix):
+                            states |= state_bits
+                bits &= states
+            elif key == "node":
+                bits &= self.nodes.prefix(value.lower())
+            elif key in ("after", "before"):
+                bits &= self._date_bits(key, value)
+            elif key == "re":
+                try:
+                    patterns.append(re.compile(value, re.IGNORECASE))
+                except re.error as e:
+                    raise ValueError(f"Invalid pattern {value!r}: {e}")
+            elif key == "sort":
+                if value.lstrip("-") not in SORT_KEYS:
+                    raise ValueError(f"Can only sort by {' or '.join(SORT_KEYS)}")
+                order = value
+            else:
+                # Plain words and unknown keys both search the name
+                for token in TOKEN.findall(term.lower()):
+                    bits &= self.names.prefix(token)
+            if not bits:
+                break
+        if bits and patterns:
+            # Regular expressions cannot be indexed; scan the names left over
+            positions = range(self.size) if bits == self.all else list(bitset_positions(bits, self.size))
+            for pattern in patterns:
+                names = map(self.job_names.__getitem__, positions)
+                positions = list(compress(positions, map(pattern.search, names)))
+            bits = positions_to_bitset(positions, self.size)
+        return HistoryView(self, bits, order)
+
+    def _date_bits(self, key, value):
+        try:
+            when = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"Invalid date {value!r}, use e.g. 2025-01-31 or 2025-01-31T12:00")
+        cut = self.unstarted + bisect.bisect_left(self.starts, when)
+        if key == "after":
+            return self.all ^ ((1 << cut) - 1)
+        return ((1 << cut) - 1) ^ ((1 << self.unstarted) - 1)
+
+class HistoryView:
+    """Jobs matching one query, in the requested order, materialized lazily.
+
+    len() is immediate; indexing only walks the bitset as far as needed, so
+    showing the first page of a huge result is cheap.
+    """
+
+    def __init__(self, index, bits, order):
+        self.index = index
+        self.bits = bits
+        self.order = order
+        self._count = bits.bit_count()
+        # 4 bytes per job walked past, even when scrolled to the end of a long history
+        self._positions = array("I")
+        self._walk = self._ordered_positions()
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, item):
+        stop = item.stop if isinstance(item, slice) else item + 1
+        if stop is None or stop < 0:
+            stop = self._count
+        while len(self._positions) < min(stop, self._count):
+            self._positions.append(next(self._walk))
+        if isinstance(item, slice):
+            return [self.index.jobs[position] for position in self._positions[item]]
+        return self.index.jobs[self._positions[item]]
+
+    def _ordered_positions(self):
+        descending = self.order.startswith("-")
+        if self.order.lstrip("-") == "start":
+            return bitset_positions(self.bits, self.index.size, reverse=descending)
+        bytemap = bitset_to_bytemap(self.bits, self.index.size)
+        by_elapsed = self.index.by_elapsed[::-1] if descending else self.index.by_elapsed
+        return compress(by_elapsed, map(bytemap.__getitem__, by_elapsed))
@@ -0,0 +1,198 @@
+"""Indexed table of the cluster's nodes, built from 'scontrol show node -o'.
+
+Each node is one line of the snapshot. A refresh compares the lines with
+the previous snapshot and only re-parses and re-indexes the nodes whose
+line changed, so keeping the table current costs little more than reading
+it. Queries intersect the per-partition, per-GPU-type and availability
+sets instead of scanning every node.
+"""
+import bisect
+from collections import defaultdict
+from app.utils.slurm_fields import parse_scontrol_record
+
+# Node states that accept new jobs; flags such as DRAIN or a trailing '*'
+# (not responding) rule a node out whatever its base state
+USABLE_STATES = {"IDLE", "MIXED", "ALLOCATED", "COMPLETING"}
+UNUSABLE_FLAGS = {"DRAIN", "DRAINING", "DRAINED", "MAINT", "RESERVED", "RESERVATION", "NOT_RESPONDING",
+                  "POWERED_DOWN", "POWERING_DOWN", "FAIL", "REBOOT_REQUESTED", "REBOOT_ISSUED"}
+# GPU type of GRES without one, e.g. 'gpu:2'
+UNTYPED_GPU = "gpu"
+
+def parse_gres(value):
+    """{gpu type: count} in a Gres or GresUsed field, e.g. 'gpu:a100:4(S:0-1)' -> {'a100': 4}."""
+    gpus = {}
+    for entry in value.split(","):
+        entry = entry.partition("(")[0]
+        parts = entry.split(":")
+        if parts[0] != "gpu" or len(parts) < 2 or not parts[-1].isdigit():
+            continue
+        gpu_type = parts[1].lower() if len(parts) > 2 else UNTYPED_GPU
+        gpus[gpu_type] = gpus.get(gpu_type, 0) + int(parts[-1])
+    return gpus
+
+class Node:
+    """One node of the cluster, with typed fields."""
+    __slots__ = ("name", "partitions", "state", "cpus", "cpus_alloc", "memory", "memory_alloc",
+                 "gpus", "gpus_used", "usable")
+
+    def __init__(self, name, partitions, state, cpus, cpus_alloc, memory, memory_alloc, gpus, gpus_used):
+        self.name = name
+        self.partitions = partitions
+        self.state = state
+        self.cpus = cpus
+        self.cpus_alloc = cpus_alloc
+        # In MB, as scontrol reports it
+        self.memory = memory
+        self.memory_alloc = memory_alloc
+        # {gpu type: count}
+        self.gpus = gpus
+        self.gpus_used = gpus_used
+        base, *flags = state.rstrip("*~#!%$@^-").split("+")
+        self.usable = base in USABLE_STATES and not state.endswith("*") and not UNUSABLE_FLAGS.intersection(flags)
+
+    @property
+    def free_cpus(self):
+        return max(self.cpus - self.cpus_alloc, 0) if self.usable else 0
+
+    @property
+    def free_memory(self):
+        return max(self.memory - self.memory_alloc, 0) if self.usable else 0
+
+    def free_gpus(self, gpu_type=None):
+        if not self.usable:
+            return 0
+        types = [gpu_type] if gpu_type else self.gpus
+        return sum(max(self.gpus.get(name, 0) - self.gpus_used.get(name, 0), 0) for name in types)
+
+def parse_node(line):
+    """Node for one line of 'scontrol show node -o'."""
+    fields = parse_scontrol_record(line)
+    def number(name):
+        value = fields.get(name, "")
+        return int(value) if value.isdigit() else 0
+    partitions = tuple(partition for partition in fields.get("Partitions", "").split(",") if partition)
+    return Node(fields["NodeName"], partitions, fields.get("State", "UNKNOWN"),
+                number("CPUTot"), number("CPUAlloc"), number("RealMemory"), number("AllocMem"),
+                parse_gres(fields.get("Gres", "")), parse_gres(fields.get("GresUsed", "")))
+
+class Availability:
+    """What a set of nodes has free right now."""
+    __slots__ = ("nodes", "usable_nodes", "idle_nodes", "free_cpus", "free_memory", "free_gpus", "gpus")
+
+    def __init__(self):
+        self.nodes = self.usable_nodes = self.idle_nodes = 0
+        self.free_cpus = self.free_memory = self.free_gpus = self.gpus = 0
+
+class NodeIndex:
+    """The cluster's nodes by name, with sets of node names by partition,
+    GPU type and usability, and the names in sorted order for completion."""
+
+    def __init__(self):
+        self.nodes = {}
+        self.by_partition = defaultdict(set)
+        self.by_gpu_type = defaultdict(set)
+        self.usable = set()
+        self.names = []
+        self._lines = {}
+        # availability() results, until the next change
+        self._availability = {}
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def update(self, lines):
+        """Bring the index in line with a snapshot; returns the number of
+        nodes that were added, changed or removed."""
+        changed = 0
+        seen = set()
+        for line in lines:
+            if not line.startswith("NodeName="):
+                continue
+            name = line[len("NodeName="):].partition(" ")[0]
+            seen.add(name)
+            if self._lines.get(name) == line:
+                continue
+            self._lines[name] = line
+            self._remove(name)
+            self._add(parse_node(line))
+            changed += 1
+        removed = self.nodes.keys() - seen
+        for name in removed:
+            del self._lines[name]
+            self._remove(name)
+        if removed or len(self.names) != len(self.nodes):
+            self.names = sorted(self.nodes)
+        if changed or removed:
+            self._availability.clear()
+        return changed + len(removed)
+
+    def _add(self, node):
+        self.nodes[node.name] = node
+        for partition in node.partitions:
+            self.by_partition[partition].add(node.name)
+        for gpu_type in node.gpus:
+            self.by_gpu_type[gpu_type].add(node.name)
+        if node.usable:
+            self.usable.add(node.name)
+
+    def _remove(self, name):
+        node = self.nodes.pop(name, None)
+        if node is None:
+            return
+        for partition in node.partitions:
+            self.by_partition[partition].discard(name)
+        for gpu_type in node.gpus:
+            self.by_gpu_type[gpu_type].discard(name)
+        self.usable.discard(name)
+
+    @property
+    def partitions(self):
+        return sorted(partition for partition, names in self.by_partition.items() if names)
+
+    @property
+    def gpu_types(self):
+        return sorted(gpu_type for gpu_type, names in self.by_gpu_type.items() if names)
+
+    def select(self, partition=None, gpu_type=None, usable_only=False):
+        """Names of the nodes in partition with GPUs of gpu_type (any filter may be None)."""
+        sets = []
+        if partition:
+            sets.append(self.by_partition.get(partition, set()))
+        if gpu_type:
+            sets.append(self.by_gpu_type.get(gpu_type, set()))
+        if usable_only:
+            sets.append(self.usable)
+        if not sets:
+            return set(self.nodes)
+        smallest, *others = sorted(sets, key=len)
+        return smallest.intersection(*others)
+
+    def availability(self, partition=None, gpu_type=None):
+        """Availability of the nodes select(partition, gpu_type) picks,
+        e.g. availability(gpu_type="a100").free_gpus for the free A100s."""
+        key = (partition, gpu_type)
+        if key not in self._availability:
+            self._availability[key] = self._count(partition, gpu_type)
+        return self._availability[key]
+
+    def _count(self, partition, gpu_type):
+        result = Availability()
+        for name in self.select(partition, gpu_type):
+            node = self.nodes[name]
+            result.nodes += 1
+            result.gpus += node.gpus.get(gpu_type, 0) if gpu_type else sum(node.gpus.values())
+            if not node.usable:
+                continue
+            result.usable_nodes += 1
+            if node.cpus_alloc == 0:
+                result.idle_nodes += 1
+            result.free_cpus += node.free_cpus
+            result.free_memory += node.free_memory
+            result.free_gpus += node.free_gpus(gpu_type)
+        return result
+
+    def complete(self, prefix, limit=None):
+        """Node names starting with prefix, in order."""
+        start = bisect.bisect_left(self.names, prefix)
+        end = bisect.bisect_left(self.names, prefix + "\uffff", start)
+        return self.names[start:end if limit is None else min(end, start + limit)]
@@ -1,75 +1,177 @@
-import re
-
-sacct_states = [
-    'BOOT_FAIL',
-    'CANCELLED',
-    'COMPLETED',
-    'DEADLINE',
-    'FAILED',
-    'NODE_FAIL',
-    'OUT_OF_MEMORY',
-    'PENDING',
-    'PREEMPTED',
-    'RUNNING',
-    'SUSPENDED',
-    'TIMEOUT'
-]
-
-def parse_squeue_output(output: str, username: str) -> list:
-    """Parse raw sacct output into structured data."""
-    lines = output.strip().split("\n")
-    if len(lines) < 2:
-        return []
-    header = re.split(r'\s+', lines[0].strip())
-    jobs = []
-    for line in lines[1:]:
-        row = re.split(r'\s+', line.strip())
-
-        job_name = ""
-        i = 2
-        while (row[i] != username):
-            job_name += row[i] + " "
-            i += 1
-
-        output_row = row[:2] + [job_name.strip()[:30]] + row[i:]
-
-        print(row)
-        print(output_row)
-        print(len(output_row))
-        print(len(header))
-        
-        if len(output_row) == len(header):
-            job_entry = dict(zip(header, output_row))
-            jobs.append(job_entry)
+from sys import intern
+from app.utils.slurm_fields import (parse_duration, format_duration, parse_time, format_time,
+                                   expand_hostlist, parse_tres)
+
+# squeue/sacct are asked for '|' separated fields in this order. The remote
+# helper agent is started with these formats (see AGENT_CONSTANTS) and
+# returns rows keyed by these names.
+SQUEUE_COLUMNS = ("JOBID", "PARTITION", "NAME", "USER", "ST", "TIME", "NODES", "NODELIST(REASON)")
+SQUEUE_FORMAT = "%i|%P|%j|%u|%t|%M|%D|%R"
+# Pending jobs with SLURM's own start estimate (squeue --start)
+PENDING_COLUMNS = ("JOBID", "PARTITION", "SUBMIT_TIME", "START_TIME", "TIME_LIMIT", "TRES_PER_NODE")
+PENDING_FORMAT = "%i|%P|%V|%S|%l|%b"
+SACCT_COLUMNS = ("JobID", "JobName", "State", "Start", "End", "Elapsed", "NodeList", "AllocTRES",
+                 "Partition", "Submit", "Timelimit")
+
+# Characters of the job name shown in the tables
+NAME_DISPLAY_WIDTH = 30
+
+def squeue_command(username):
+    return f"squeue -u {username} -h -o '{SQUEUE_FORMAT}'"
+
+def pending_command(username):
+    return f"squeue -u {username} -t PD --start -h -o '{PENDING_FORMAT}'"
+
+def sacct_command(username, starttime=None, endtime=None, allocations_only=False):
+    command = f"sacct -u {username} --parsable2 --noheader --format={','.join(SACCT_COLUMNS)}"
+    if starttime:
+        command += f" --starttime={starttime}"
+    if endtime:
+        command += f" --endtime={endtime}"
+    if allocations_only:
+        # One row per job, without its .batch/.extern/... steps
+        command += " --allocations"
+    return command
+
+class SqueueJob:
+    """One job from squeue, with typed fields."""
+    __slots__ = ("job_id", "partition", "name", "user", "state", "time", "nodes", "nodelist")
+
+    def __init__(self, job_id, partition, name, user, state, time, nodes, nodelist):
+        self.job_id = job_id
+        # Few distinct values, so share one string per value
+        self.partition = intern(partition)
+        self.name = name
+        self.user = intern(user)
+        # Compact state code, e.g. R or PD
+        self.state = intern(state)
+        # Seconds the job has been running
+        self.time = parse_duration(time)
+        self.nodes = int(nodes) if nodes.isdigit() else None
+        # Node list of a running job, or the "(Reason)" a pending job waits for
+        self.nodelist = nodelist
+
+    @property
+    def hosts(self):
+        return [] if self.nodelist.startswith("(") else expand_hostlist(self.nodelist)
+
+    @property
+    def reason(self):
+        return self.nodelist[1:-1] if self.nodelist.startswith("(") else None
+
+    def row(self):
+        """Display values in SQUEUE_COLUMNS order."""
+        return (self.job_id, self.partition, self.name[:NAME_DISPLAY_WIDTH], self.user, self.state,
+                format_duration(self.time), "" if self.nodes is None else str(self.nodes), self.nodelist)
+
+class PendingJob:
+    """One pending job from pending_command, with typed fields."""
+    __slots__ = ("job_id", "partition", "submit", "start", "timelimit", "gres")
+
+    def __init__(self, job_id, partition, submit, start, timelimit, gres):
+        self.job_id = job_id
+        self.partition = intern(partition)
+        self.submit = parse_time(submit)
+        # SLURM's expected start time, None while it has no estimate
+        self.start = parse_time(start)
+        self.timelimit = parse_duration(timelimit)
+        # Requested GRES per node, e.g. 'gres/gpu:a100:1'
+        self.gres = "" if gres == "N/A" else gres
+
+class SacctJob:
+    """One job (or job step) from sacct, with typed fields."""
+    __slots__ = ("job_id", "name", "state", "start", "end", "elapsed", "nodelist", "alloc_tres",
+                 "partition", "submit", "timelimit")
+
+    def __init__(self, job_id, name, state, start, end, elapsed, nodelist, alloc_tres,
+                 partition="", submit="", timelimit=""):
+        self.job_id = job_id
+        self.name = name
+        # Full state, e.g. "CANCELLED by 123"
+        self.state = intern(state)
+        self.start = parse_time(start)
+        self.end = parse_time(end)
+        self.elapsed = parse_duration(elapsed)
+        self.nodelist = intern(nodelist)
+        # Shared read-only mapping, see parse_tres
+        self.alloc_tres = parse_tres(alloc_tres)
+        # Stores written before these columns existed have None for them
+        self.partition = intern(partition or "")
+        self.submit = parse_time(submit or "")
+        # Requested time limit in seconds
+        self.timelimit = parse_duration(timelimit or "")
+
+    @property
+    def hosts(self):
+        return [] if self.nodelist in ("", "None assigned") else expand_hostlist(self.nodelist)
+
+    @property
+    def wait(self):
+        """Seconds from submission to start, or None if it has not started."""
+        if self.submit is None or self.start is None:
+            return None
+        return (self.start - self.submit).total_seconds()
+
+    def row(self):
+        """Display values for the history table (everything but AllocTRES)."""
+        return (self.job_id, self.name[:NAME_DISPLAY_WIDTH], self.state, format_time(self.start),
+                format_time(self.end), format_duration(self.elapsed), self.nodelist)
+
+def split_row(line, field_count, name_index):
+    """Split a '|' separated row, keeping any '|' inside the free text job name."""
+    head = line.split("|", name_index)
+    tail = head.pop().rsplit("|", field_count - name_index - 1)
+    if len(tail) != field_count - name_index:
+        raise ValueError(f"Expected {field_count} '|' separated fields, got: {line!r}")
+    return head + tail
+
+class ParsedJobs(list):
+    """Jobs parsed from command output. Rows that cannot be parsed, such as
+    a truncated line, are left out and counted in skipped instead of
+    failing the whole parse."""
+    skipped = 0
+
+def parse_rows(rows, parse_row) -> ParsedJobs:
+    jobs = ParsedJobs()
+    for row in rows:
+        try:
+            jobs.append(parse_row(row))
+        except (ValueError, TypeError, KeyError):
+            jobs.skipped += 1
     return jobs
 
-def parse_sacct_output(output: str) -> list:
-    """Parse raw sacct output into structured data."""
-    lines = output.strip().split("\n")
-    if len(lines) < 2:
-        return []
-    header = re.split(r'\s+', lines[0].strip())
-    jobs = []
-    for line in lines[1:]:
-        if set(line.strip()) <= {'-', ' '}:
-            continue
-
-        print(line)
-        row = re.split(r'\s+', line.strip())
-
-        job_name = ""
-        i = 1
-        while i < len(row) and not any(state in row[i] for state in sacct_states):
-            job_name += row[i] + " "
-            i += 1
-
-        output_row = row[:1] + [job_name.strip()[:30]] + row[i:]
-
-        print(output_row)
-        print(len(output_row))
-        print(len(header))
-        
-        if len(output_row) == len(header):
-            job_entry = dict(zip(header, output_row))
-            jobs.append(job_entry)
-    return jobs
\ No newline at end of file
+def parse_squeue_line(line):
+    """SqueueJob for one line of squeue_command output."""
+    return SqueueJob(*split_row(line, len(SQUEUE_COLUMNS), 2))
+
+def parse_sacct_line(line):
+    """SacctJob for one line of sacct_command output."""
+    return SacctJob(*split_row(line, len(SACCT_COLUMNS), 1))
+
+def parse_squeue_output(output) -> list:
+    """Parse squeue_command output, or the helper agent's rows, into SqueueJobs."""
+    if isinstance(output, list):
+        return parse_rows(output, lambda row: SqueueJob(*(row[column] for column in SQUEUE_COLUMNS)))
+    return parse_rows(filter(None, output.splitlines()), parse_squeue_line)
+
+def parse_pending_output(output) -> list:
+    """Parse pending_command output, or the helper agent's rows, into PendingJobs."""
+    if isinstance(output, list):
+        return parse_rows(output, lambda row: PendingJob(*(row[column] for column in PENDING_COLUMNS)))
+    return parse_rows(filter(None, output.splitlines()), lambda line: PendingJob(*line.split("|")))
+
+def parse_sacct_output(output) -> list:
+    """Parse sacct_command output, or the helper agent's rows, into SacctJobs."""
+    if isinstance(output, list):
+        return parse_rows(output, lambda row: SacctJob(*(row[column] for column in SACCT_COLUMNS)))
+    return parse_rows(filter(None, output.splitlines()), parse_sacct_line)
+
+async def parse_stream(lines, parse_line):
+    """Parse a CommandStream (or any async iterable of lines), yielding each
+    job as soon as its line has arrived.
+
+    :param parse_line: parse_squeue_line or parse_sacct_line.
+    """
+    async for line in lines:
+        if line:
+            yield parse_line(line)
@@ -0,0 +1,113 @@
+"""Conversions between SLURM's text fields and Python values."""
+import re
+import datetime
+from types import MappingProxyType
+from functools import lru_cache
+
+# Values SLURM prints for durations it cannot or does not want to express
+NO_DURATION = {"", "UNLIMITED", "INVALID", "NOT_SET", "Partition_Limit"}
+NO_TIME = {"", "Unknown", "None", "N/A"}
+MEMORY_UNITS = {"K": 1 / 1024, "M": 1, "G": 1024, "T": 1024 * 1024, "P": 1024 ** 3}
+
+_RANGE = re.compile(r"^(.*?)\[([^\]]+)\](.*)$")
+# Fields of scontrol's one line records, e.g. "JobId=123 ... StdOut=/path"
+# (values with spaces are cut short, which none of the fields read here have)
+_SCONTROL_FIELD = re.compile(r"(\w+)=(\S*)")
+
+@lru_cache(maxsize=65536)
+def parse_duration(value):
+    """Seconds in a '[D-]HH:MM:SS', 'MM:SS' or 'MM:SS.mmm' duration, or None.
+
+    Cached, since queues repeat the same few durations (0:00 for every
+    pending job, identical time limits) many times over.
+    """
+    if value in NO_DURATION:
+        return None
+    days, _, clock = value.rpartition("-")
+    # Fractions of a second (TotalCPU and friends) are dropped
+    clock = clock.partition(".")[0]
+    parts = clock.split(":")
+    if len(parts) == 3:
+        seconds = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
+    elif len(parts) == 2:
+        seconds = int(parts[0]) * 60 + int(parts[1])
+    else:
+        seconds = int(parts[0])
+    return seconds + int(days) * 86400 if days else seconds
+
+def format_duration(seconds):
+    """Inverse of parse_duration in SLURM's own style, e.g. '1-02:03:04', '2:03:04', '3:04'."""
+    if seconds is None:
+        return "N/A"
+    days, rest = divmod(seconds, 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes, secs = divmod(rest, 60)
+    if days:
+        return f"{days}-{hours:02d}:{minutes:02d}:{secs:02d}"
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+def parse_time(value):
+    """datetime for a SLURM timestamp ('2025-01-01T08:00:00'), or None if unset."""
+    if value in NO_TIME:
+        return None
+    return datetime.datetime.fromisoformat(value)
+
+def format_time(value):
+    return value.isoformat() if value else "Unknown"
+
+def expand_hostlist(hostlist):
+    """Hostnames in a compressed host list, e.g. 'idun-01-[01-03,07]' -> idun-01-01, -02, -03, -07."""
+    hosts = []
+    for entry in _split_top_level(hostlist):
+        match = _RANGE.match(entry)
+        if not match:
+            hosts.append(entry)
+            continue
+        prefix, ranges, suffix = match.groups()
+        suffix_hosts = expand_hostlist(suffix) if "[" in suffix else [suffix]
+        for item in ranges.split(","):
+            start, _, end = item.partition("-")
+            numbers = [start] if not end else [f"{n:0{len(start)}d}" for n in range(int(start), int(end) + 1)]
+            hosts.extend(prefix + number + suffix_host for number in numbers for suffix_host in suffix_hosts)
+    return hosts
+
+def _split_top_level(hostlist):
+    """Split on the commas that are not inside brackets."""
+    entries, depth, start = [], 0, 0
+    for i, char in enumerate(hostlist):
+        if char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+        elif char == "," and depth == 0:
+            entries.append(hostlist[start:i])
+            start = i + 1
+    entries.append(hostlist[start:])
+    return [entry for entry in entries if entry]
+
+def parse_scontrol_record(line):
+    """Fields of one record of 'scontrol show <entity> -o' as a dict of strings."""
+    return dict(_SCONTROL_FIELD.findall(line))
+
+@lru_cache(maxsize=4096)
+def parse_tres(value):
+    """Read-only mapping of a TRES string such as 'cpu=8,mem=64G,gres/gpu=1'.
+
+    Counts become ints and memory becomes megabytes; anything else stays a
+    string. Jobs mostly repeat a handful of TRES strings, so the mappings are
+    cached and shared between records.
+    """
+    tres = {}
+    for item in value.split(","):
+        name, _, amount = item.partition("=")
+        if not name:
+            continue
+        if amount.isdigit():
+            tres[name] = int(amount)
+        elif name == "mem" and amount[:-1].replace(".", "", 1).isdigit() and amount[-1] in MEMORY_UNITS:
+            tres[name] = int(float(amount[:-1]) * MEMORY_UNITS[amount[-1]])
+        else:
+            tres[name] = amount
+    return MappingProxyType(tres)
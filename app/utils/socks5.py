@@ -0,0 +1,95 @@
+import socket
+import struct
+
+# The subset of SOCKS5 (RFC 1928) a dynamic forward needs: no
+# authentication and the CONNECT command, to IPv4, IPv6 or domain names
+VERSION = 5
+NO_AUTHENTICATION = 0
+NO_ACCEPTABLE_METHODS = 0xFF
+CONNECT = 1
+ADDRESS_IPV4 = 1
+ADDRESS_DOMAIN = 3
+ADDRESS_IPV6 = 4
+
+# Reply codes
+SUCCEEDED = 0
+GENERAL_FAILURE = 1
+NOT_ALLOWED = 2
+HOST_UNREACHABLE = 4
+CONNECTION_REFUSED = 5
+COMMAND_NOT_SUPPORTED = 7
+ADDRESS_NOT_SUPPORTED = 8
+
+# The longest greeting or request a client can send
+MAX_HANDSHAKE = 262
+
+class Socks5Error(Exception):
+    """A handshake that cannot go on; code is the reply to send, or None
+    when the client is not speaking SOCKS5 and gets no reply."""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+def parse_greeting(data):
+    """Length of the client's greeting at the start of data, or None if it
+    has not all arrived. Raises Socks5Error if it does not offer to go on
+    without authentication."""
+    if len(data) < 2:
+        return None
+    if data[0] != VERSION:
+        raise Socks5Error(f"Not a SOCKS5 client (version {data[0]})")
+    length = 2 + data[1]
+    if len(data) < length:
+        return None
+    if NO_AUTHENTICATION not in data[2:length]:
+        raise Socks5Error("Client requires authentication", NO_ACCEPTABLE_METHODS)
+    return length
+
+def parse_request(data):
+    """(host, port, length) of the CONNECT request at the start of data, or
+    None if it has not all arrived. Raises Socks5Error for anything else."""
+    if len(data) < 5:
+        return None
+    version, command, _, address_type = data[:4]
+    if version != VERSION:
+        raise Socks5Error(f"Not a SOCKS5 request (version {version})")
+    if address_type == ADDRESS_IPV4:
+        end = 4 + 4
+    elif address_type == ADDRESS_IPV6:
+        end = 4 + 16
+    elif address_type == ADDRESS_DOMAIN:
+        end = 5 + data[4]
+    else:
+        raise Socks5Error(f"Unknown address type {address_type}", ADDRESS_NOT_SUPPORTED)
+    if len(data) < end + 2:
+        return None
+    if command != CONNECT:
+        raise Socks5Error(f"Unsupported command {command}", COMMAND_NOT_SUPPORTED)
+    if address_type == ADDRESS_IPV4:
+        host = socket.inet_ntop(socket.AF_INET, bytes(data[4:end]))
+    elif address_type == ADDRESS_IPV6:
+        host = socket.inet_ntop(socket.AF_INET6, bytes(data[4:end]))
+    else:
+        try:
+            host = bytes(data[5:end]).decode("idna")
+        except UnicodeError:
+            raise Socks5Error("Domain name is not valid IDNA", ADDRESS_NOT_SUPPORTED)
+    return host, struct.unpack("!H", data[end:end + 2])[0], end + 2
+
+def method_reply(method=NO_AUTHENTICATION):
+    return bytes((VERSION, method))
+
+def reply(code):
+    """Reply to a request. The bound address is left as 0.0.0.0:0; the
+    channel's far end has no address the client could use anyway."""
+    return bytes((VERSION, code, 0, ADDRESS_IPV4, 0, 0, 0, 0, 0, 0))
+
+def reply_code(error):
+    """Reply code for an exception raised opening the channel."""
+    # Loaded with the session already, see SSHConnectionManager.reopen
+    import paramiko
+    if isinstance(error, paramiko.ChannelException):
+        # SSH open failure reasons: 1 prohibited, 2 connect failed
+        return {1: NOT_ALLOWED, 2: CONNECTION_REFUSED}.get(error.code, HOST_UNREACHABLE)
+    return GENERAL_FAILURE
@@ -0,0 +1,163 @@
+"""Queue wait times learned from the user's own job history.
+
+A job's wait (submission to start) is grouped by partition, GRES, requested
+time limit and the time of day it was submitted. The log of the wait is
+taken to be normally distributed within each group, so a group only keeps
+a count, mean and sum of squares (Welford's running update): adding a job
+costs the same however long the history is, and nothing is ever refitted.
+An estimate uses the most specific group that has seen MIN_SAMPLES jobs,
+backing off to coarser ones (down to all jobs) when it has not.
+"""
+import math
+import json
+from app.utils.node_index import UNTYPED_GPU, parse_gres
+
+# Jobs a group needs before its estimate is used
+MIN_SAMPLES = 5
+# Standard normal quantile of the 75th percentile, for the interquartile range
+QUARTILE_Z = 0.6745
+# Time limits at or below each bound share a bucket
+TIMELIMIT_BUCKETS = ((3600, "<=1h"), (6 * 3600, "<=6h"), (86400, "<=1d"), (3 * 86400, "<=3d"))
+# Submission hour (login node time) // 6
+HOUR_BUCKETS = ("night", "morning", "afternoon", "evening")
+# Groups from most to least specific, as indices into the feature tuple
+# (partition, gres, time limit, submission hour)
+LEVELS = ((0, 1, 2, 3), (0, 1, 2), (0, 1), (0, 2), (0,), ())
+NO_GRES = "none"
+
+def gres_of_tres(tres):
+    """GRES feature of a job's AllocTRES mapping: its GPU type, 'gpu' for
+    untyped GPUs, or 'none'."""
+    gres = NO_GRES
+    for name in tres:
+        if name.startswith("gres/gpu:"):
+            return name[len("gres/gpu:"):].lower()
+        if name == "gres/gpu":
+            gres = UNTYPED_GPU
+    return gres
+
+def gres_of_request(value):
+    """GRES feature of a request such as squeue's TRES_PER_NODE
+    ('gres/gpu:a100:1', 'gpu:2') or salloc's --gres."""
+    entries = (entry.removeprefix("gres/").removeprefix("gres:") for entry in (value or "").split(","))
+    gpus = parse_gres(",".join(entries))
+    return next(iter(gpus), NO_GRES)
+
+def timelimit_bucket(seconds):
+    if seconds is None:
+        return "none"
+    for bound, name in TIMELIMIT_BUCKETS:
+        if seconds <= bound:
+            return name
+    return ">3d"
+
+def hour_bucket(when):
+    return HOUR_BUCKETS[when.hour // 6]
+
+def features(partition, gres, timelimit, submitted):
+    return (partition, gres, timelimit_bucket(timelimit), hour_bucket(submitted))
+
+class WaitStats:
+    """Running count, mean and sum of squared deviations of log1p(wait minutes)."""
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+class WaitEstimate:
+    """Typical wait in seconds, with the interquartile range and the group it came from."""
+    __slots__ = ("median", "low", "high", "samples", "group")
+
+    def __init__(self, median, low, high, samples, group):
+        self.median = median
+        self.low = low
+        self.high = high
+        self.samples = samples
+        # Feature values the estimate is based on, e.g. ('GPUQ', 'a100')
+        self.group = group
+
+class WaitModel:
+    """Wait statistics of every group, updated one job at a time.
+
+    Remembers the span of start times it has been fitted on, so the caller
+    only hands it jobs that started outside that span: newer ones from an
+    incremental sync and older ones from a backfill.
+    """
+
+    def __init__(self):
+        self.groups = {}
+        self.jobs = 0
+        # ISO start times of the earliest and latest fitted job
+        self.first_start = None
+        self.last_start = None
+
+    def add(self, job):
+        """Fit one SacctJob; returns False for jobs without a wait to learn from."""
+        wait = job.wait
+        if wait is None or not job.partition:
+            return False
+        value = math.log1p(max(wait, 0) / 60)
+        key = features(job.partition, gres_of_tres(job.alloc_tres), job.timelimit, job.submit)
+        for level in LEVELS:
+            group = tuple(key[i] for i in level)
+            stats = self.groups.get(group)
+            if stats is None:
+                stats = self.groups[group] = WaitStats()
+            stats.add(value)
+        self.jobs += 1
+        start = job.start.isoformat()
+        if self.first_start is None or start < self.first_start:
+            self.first_start = start
+        if self.last_start is None or start > self.last_start:
+            self.last_start = start
+        return True
+
+    def update(self, jobs):
+        """Fit jobs; returns how many had a wait."""
+        return sum(self.add(job) for job in jobs)
+
+    def estimate(self, partition, gres, timelimit, submitted):
+        """WaitEstimate for a job with these features, or None if the history
+        has too few jobs even for the coarsest group. A gres or timelimit of
+        None stands for any, so only groups that ignore it are used."""
+        key = (partition, gres, None if timelimit is None else timelimit_bucket(timelimit), hour_bucket(submitted))
+        for level in LEVELS:
+            if any(key[i] is None for i in level):
+                continue
+            group = tuple(key[i] for i in level)
+            stats = self.groups.get(group)
+            if stats is not None and stats.count >= MIN_SAMPLES:
+                spread = QUARTILE_Z * stats.std
+                return WaitEstimate(math.expm1(stats.mean) * 60, math.expm1(max(stats.mean - spread, 0)) * 60,
+                                    math.expm1(stats.mean + spread) * 60, stats.count, group)
+        return None
+
+    def to_json(self):
+        return json.dumps({
+            "jobs": self.jobs,
+            "first_start": self.first_start,
+            "last_start": self.last_start,
+            "groups": [[list(group), stats.count, stats.mean, stats.m2] for group, stats in self.groups.items()],
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        model = cls()
+        model.jobs = data["jobs"]
+        model.first_start = data["first_start"]
+        model.last_start = data["last_start"]
+        model.groups = {tuple(group): WaitStats(count, mean, m2) for group, count, mean, m2 in data["groups"]}
+        return model
@@ -0,0 +1,129 @@
+import time
+import asyncio
+import datetime
+from app.utils.parser import pending_command, parse_pending_output
+from app.utils.wait_model import WaitModel, gres_of_request
+from app.config import WAIT_MODEL_REFRESH, WAIT_ESTIMATE_INTERVAL
+
+# Meta key the fitted model is saved under in the history store
+MODEL_META_KEY = "wait_model"
+
+class WaitEstimator:
+    """Start estimates for pending jobs and for jobs about to be requested.
+
+    Combines SLURM's own expected start times (squeue --start), which it only
+    has for the jobs its backfill scheduler has planned, with a WaitModel
+    fitted on the user's history. The history store is synced at most every
+    WAIT_MODEL_REFRESH seconds and only the jobs that started outside the
+    span the model has seen are fitted; the model is saved in the store, so
+    a new session starts from where the last one stopped. Subscribers are
+    called on the event loop with the estimator whenever the model changed
+    or a sync failed.
+    """
+
+    def __init__(self, ssh_manager: object, command_cache: object, open_store, helper_agent: object = None):
+        """
+        :param ssh_manager: An instance of SSHConnectionManager, for the username.
+        :param command_cache: The app's CommandCache.
+        :param open_store: Returns the user's HistoryStore, which the caller owns and closes.
+        :param helper_agent: An optional HelperAgentManager.
+        """
+        self.ssh_manager = ssh_manager
+        self.command_cache = command_cache
+        self.open_store = open_store
+        self.helper_agent = helper_agent
+        self.model = WaitModel()
+        self.store = None
+        self.error = None
+        self.synced_at = None
+        # Pending jobs by JobID from the last squeue --start
+        self.pending = {}
+        self._pending_ids = None
+        self._pending_at = None
+        self._subscribers = []
+        self._lock = asyncio.Lock()
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    @property
+    def stale(self):
+        return self.synced_at is None or time.monotonic() - self.synced_at > WAIT_MODEL_REFRESH
+
+    async def refresh(self, force=False):
+        """Sync the history and fit what is new, unless that happened less
+        than WAIT_MODEL_REFRESH seconds ago or is already under way."""
+        if self._lock.locked() or not (force or self.stale):
+            return
+        async with self._lock:
+            try:
+                if self.store is None:
+                    self.store = self.open_store()
+                    saved = self.store.get_meta(MODEL_META_KEY)
+                    if saved:
+                        self.model = WaitModel.from_json(saved)
+                    # Whatever the store already has answers straight away
+                    await self._fit()
+                await self.store.sync()
+                await self._fit()
+                self.error = None
+            except Exception as e:
+                self.error = e
+                self._notify()
+            self.synced_at = time.monotonic()
+
+    async def _fit(self):
+        store, model = self.store, self.model
+        def fit():
+            fitted = model.update(store.jobs_started_outside(model.first_start, model.last_start))
+            if fitted:
+                store.set_meta(**{MODEL_META_KEY: model.to_json()})
+            return fitted
+        if await asyncio.to_thread(fit):
+            self._notify()
+
+    def _notify(self):
+        for callback in list(self._subscribers):
+            callback(self)
+
+    async def fetch_pending(self, job_ids):
+        """SLURM's view of the pending jobs, asked again when they are not the
+        job_ids of the last call or WAIT_ESTIMATE_INTERVAL has passed."""
+        job_ids = set(job_ids)
+        if job_ids == self._pending_ids and time.monotonic() - self._pending_at < WAIT_ESTIMATE_INTERVAL:
+            return self.pending
+        username = self.ssh_manager.username
+        if self.helper_agent:
+            output = await self.command_cache.request("pending", fresh=True, user=username)
+        else:
+            result = await self.command_cache.run(pending_command(username), fresh=True)
+            if not result.ok:
+                raise Exception(result.output)
+            output = result.stdout
+        self.pending = {job.job_id: job for job in parse_pending_output(output)}
+        self._pending_ids = job_ids
+        self._pending_at = time.monotonic()
+        return self.pending
+
+    def estimate(self, partition, gres=None, timelimit=None, submitted=None):
+        """The model's WaitEstimate for a job submitted now (or at submitted)."""
+        return self.model.estimate(partition, gres, timelimit, submitted or datetime.datetime.now())
+
+    def estimate_pending(self, job):
+        """(SLURM's expected start, the model's WaitEstimate) of a PendingJob."""
+        estimate = None
+        if job.submit is not None:
+            estimate = self.estimate(job.partition, gres_of_request(job.gres), job.timelimit, job.submit)
+        return job.start, estimate
+
+    def clear(self):
+        """Forget the user's history, e.g. when they log out. The store itself
+        is closed by its owner."""
+        self.model = WaitModel()
+        self.store = self.error = self.synced_at = None
+        self.pending = {}
+        self._pending_ids = self._pending_at = None
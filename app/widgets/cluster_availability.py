@@ -0,0 +1,79 @@
+from textual.widgets import DataTable, Static
+from app.utils.node_index import UNTYPED_GPU
+from app.widgets.wait_estimate import format_wait
+from app.config import GPU_TYPES, SUCCESS_COLOR, WARNING_COLOR
+
+def gpu_type_options(index):
+    """Options for a GPU type Select: the types the cluster has, with how
+    many are free, or the GPU_TYPES fallback until the index is loaded."""
+    if not len(index):
+        return GPU_TYPES
+    options = [GPU_TYPES[0]]
+    for gpu_type in index.gpu_types:
+        if gpu_type == UNTYPED_GPU:
+            continue
+        available = index.availability(gpu_type=gpu_type)
+        options.append((f"{gpu_type.upper()} ({available.free_gpus}/{available.gpus} free)", gpu_type))
+    return options
+
+def format_memory(megabytes):
+    for unit in ("M", "G", "T"):
+        if megabytes < 1024 or unit == "T":
+            return f"{megabytes:.0f}{unit}" if unit == "M" else f"{megabytes:.1f}{unit}"
+        megabytes /= 1024
+
+class ClusterAvailability(Static):
+    """One line on what a partition (and GPU type) has free right now."""
+
+    def show(self, index, partition, gpu_type=None):
+        if not len(index):
+            self.update("")
+            return
+        # "any", or nothing selected (Select.BLANK)
+        gpu_type = gpu_type if isinstance(gpu_type, str) and gpu_type != "any" else None
+        available = index.availability(partition, gpu_type)
+        scope = f"{partition} {gpu_type.upper()}" if gpu_type else partition
+        text = (f"{scope} now: {available.idle_nodes} of {available.nodes} nodes idle, "
+                f"{available.free_cpus} CPUs and {format_memory(available.free_memory)} memory free")
+        if gpu_type or available.gpus:
+            text += f", {available.free_gpus} of {available.gpus} GPUs free"
+        free = available.free_gpus if gpu_type or available.gpus else available.free_cpus
+        color = SUCCESS_COLOR if free else WARNING_COLOR
+        self.update(f"[{color}]{text}[/{color}]")
+
+class ClusterCapacityTable(DataTable):
+    """Free and total capacity of each partition and GPU type, with how long
+    your jobs typically wait for it."""
+
+    COLUMNS = ("Partition", "GPU", "Usable Nodes", "Idle Nodes", "Free CPUs", "Free Memory", "Free GPUs",
+               "Typical Wait")
+
+    def on_mount(self):
+        self.add_columns(*self.COLUMNS)
+
+    def show(self, index, estimator=None, timelimit=None):
+        """
+        :param estimator: The app's WaitEstimator, for the Typical Wait column.
+        :param timelimit: Requested seconds the estimates are for, None for any.
+        """
+        self.clear()
+        for partition in index.partitions:
+            self._add(index, partition, None, estimator, timelimit)
+            for gpu_type in index.gpu_types:
+                if index.select(partition, gpu_type):
+                    self._add(index, partition, gpu_type, estimator, timelimit)
+
+    def _add(self, index, partition, gpu_type, estimator, timelimit):
+        available = index.availability(partition, gpu_type)
+        wait = "-"
+        if estimator is not None:
+            # The partition's row covers all of its jobs, GPU rows those with that
+            # GPU type; estimates backed off beyond them are left out
+            estimate = estimator.estimate(partition, gpu_type, timelimit)
+            scope = (partition,) if gpu_type is None else (partition, gpu_type)
+            if estimate is not None and estimate.group[:len(scope)] == scope:
+                wait = f"~{format_wait(estimate.median)}"
+        self.add_row(partition if gpu_type is None else "", gpu_type.upper() if gpu_type else "",
+                     f"{available.usable_nodes}/{available.nodes}", str(available.idle_nodes),
+                     str(available.free_cpus), format_memory(available.free_memory),
+                     f"{available.free_gpus}/{available.gpus}" if available.gpus else "-", wait)
@@ -0,0 +1,178 @@
+from rich.segment import Segment
+from rich.style import Style
+from textual import events
+from textual.binding import Binding
+from textual.cache import LRUCache
+from textual.geometry import Size
+from textual.reactive import reactive
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+
+# Rows fetched from the source at a time, and the number of pages kept
+PAGE_SIZE = 200
+PAGE_CACHE_SIZE = 8
+# Blank cells on either side of every column, as in DataTable
+CELL_PADDING = 1
+
+
+class VirtualJobTable(ScrollView, can_focus=True):
+    """Read-only job table over a sequence of any length.
+
+    The source only needs len() and slicing, e.g. a list or a HistoryView,
+    and its items a row() method returning the display strings. Rows are
+    fetched a page at a time as they scroll into view and only the last few
+    pages are kept, so the table uses the same memory for ten jobs as for a
+    million. Styled segments are built only for the lines being drawn.
+    """
+
+    COMPONENT_CLASSES = {"job-table--header", "job-table--cursor"}
+
+    DEFAULT_CSS = """
+    VirtualJobTable > .job-table--header {
+        text-style: bold;
+        background: $panel;
+        color: $foreground;
+    }
+    VirtualJobTable > .job-table--cursor {
+        background: $block-cursor-background;
+        color: $block-cursor-foreground;
+        text-style: bold;
+    }
+    """
+
+    BINDINGS = [
+        Binding("up", "cursor_up", "Cursor up", show=False),
+        Binding("down", "cursor_down", "Cursor down", show=False),
+        Binding("pageup", "page_up", "Page up", show=False),
+        Binding("pagedown", "page_down", "Page down", show=False),
+        Binding("home,ctrl+home", "cursor_first", "First row", show=False),
+        Binding("end,ctrl+end", "cursor_last", "Last row", show=False),
+    ]
+
+    cursor_row = reactive(0)
+
+    def __init__(self, *columns, name=None, id=None, classes=None):
+        super().__init__(name=name, id=id, classes=classes)
+        self.columns = columns
+        self.widths = [len(column) for column in columns]
+        self.source = ()
+        self._pages = LRUCache(PAGE_CACHE_SIZE)
+
+    @property
+    def row_count(self):
+        return len(self.source)
+
+    @property
+    def cursor_item(self):
+        """The source item under the cursor, or None when the table is empty."""
+        return self.source[self.cursor_row] if len(self.source) else None
+
+    def set_source(self, source, keep_position=False):
+        """Show the rows of source, from the top, or with keep_position at the
+        same scroll offset and with the cursor on the same job, e.g. when a
+        sync re-applies the filter the table was showing."""
+        job = self.cursor_item if keep_position else None
+        row, scroll_y = self.cursor_row, self.scroll_y
+        self.source = source
+        self._pages.clear()
+        self.widths = [len(column) for column in self.columns]
+        self._update_virtual_size()
+        if job is None:
+            self.cursor_row = 0
+            self.scroll_to(0, 0, animate=False)
+        else:
+            self.scroll_to(y=scroll_y, animate=False)
+            self.cursor_row = self._find(job.job_id, row)
+        self.refresh()
+
+    def _find(self, job_id, near):
+        """Row of job_id within a page either side of row near, which is
+        where a sync that added a few jobs leaves it, or near if it is not there."""
+        start = max(near - PAGE_SIZE, 0)
+        for index, job in enumerate(self.source[start:near + PAGE_SIZE], start):
+            if job.job_id == job_id:
+                return index
+        return near
+
+    def get_row(self, index):
+        """Display strings of row index, fetching its page if needed."""
+        page, offset = divmod(index, PAGE_SIZE)
+        rows = self._pages.get(page)
+        if rows is None:
+            rows = [job.row() for job in self.source[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]]
+            self._pages[page] = rows
+            # Columns only ever widen, so scrolling back never jitters
+            widths = [max(width, *map(len, column)) for width, column in zip(self.widths, zip(*rows))]
+            if widths != self.widths:
+                self.widths = widths
+                self._update_virtual_size()
+        return rows[offset]
+
+    def _update_virtual_size(self):
+        width = sum(self.widths) + 2 * CELL_PADDING * len(self.columns)
+        # One line for the header, which stays put while the rows scroll
+        self.virtual_size = Size(width, len(self.source) + 1)
+
+    def render_line(self, y):
+        scroll_x, scroll_y = self.scroll_offset
+        width = self.size.width
+        padding = " " * CELL_PADDING
+        if y == 0:
+            style = self.get_component_rich_style("job-table--header")
+            line = "".join(padding + column.ljust(width) + padding
+                           for column, width in zip(self.columns, self.widths))
+        else:
+            index = scroll_y + y - 1
+            if index >= len(self.source):
+                return Strip.blank(width, self.rich_style)
+            style = self.rich_style + Style(bold=True)
+            if index == self.cursor_row and self.has_focus:
+                style += self.get_component_rich_style("job-table--cursor")
+            line = "".join(padding + value.rjust(width) + padding
+                           for value, width in zip(self.get_row(index), self.widths))
+        strip = Strip([Segment(line, style)], len(line))
+        return strip.crop_extend(scroll_x, scroll_x + width, style)
+
+    def watch_cursor_row(self, old_row, new_row):
+        self._scroll_cursor_into_view()
+        self.refresh()
+
+    def validate_cursor_row(self, row):
+        return max(0, min(row, len(self.source) - 1))
+
+    def on_focus(self):
+        self.refresh()
+
+    def on_blur(self):
+        self.refresh()
+
+    def _scroll_cursor_into_view(self):
+        visible = max(self.scrollable_content_region.height - 1, 1)
+        top = int(self.scroll_y)
+        if self.cursor_row < top:
+            self.scroll_to(y=self.cursor_row, animate=False)
+        elif self.cursor_row >= top + visible:
+            self.scroll_to(y=self.cursor_row - visible + 1, animate=False)
+
+    def on_click(self, event: events.Click):
+        offset = event.get_content_offset(self)
+        if offset is not None and offset.y > 0:
+            self.cursor_row = int(self.scroll_y) + offset.y - 1
+
+    def action_cursor_up(self):
+        self.cursor_row -= 1
+
+    def action_cursor_down(self):
+        self.cursor_row += 1
+
+    def action_page_up(self):
+        self.cursor_row -= max(self.scrollable_content_region.height - 1, 1)
+
+    def action_page_down(self):
+        self.cursor_row += max(self.scrollable_content_region.height - 1, 1)
+
+    def action_cursor_first(self):
+        self.cursor_row = 0
+
+    def action_cursor_last(self):
+        self.cursor_row = len(self.source) - 1
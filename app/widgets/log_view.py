@@ -0,0 +1,202 @@
+import re
+from rich.segment import Segment
+from textual.geometry import Size
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+from app.config import LOG_BUFFER_LINES, LOG_FRAME_RATE
+
+# Colour and cursor escape sequences, which the view does not interpret
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[ -/]*[@-~]")
+
+def clean_line(line):
+    """Plain text of a line of program output."""
+    # Progress bars redraw themselves after '\r'; keep what was shown last
+    line = line.rpartition("\r")[2]
+    if "\x1b" in line:
+        line = ANSI_ESCAPE.sub("", line)
+    if "\t" in line:
+        line = line.expandtabs()
+    return line
+
+class LineRing:
+    """Lines in a fixed number of slots; once full, each new line replaces the oldest."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._slots = [""] * capacity
+        self._start = 0
+        self._count = 0
+        # Lines ever appended, so readers can tell how many were dropped
+        self.total = 0
+
+    def append(self, line):
+        if self._count < self.capacity:
+            self._slots[(self._start + self._count) % self.capacity] = line
+            self._count += 1
+        else:
+            self._slots[self._start] = line
+            self._start = (self._start + 1) % self.capacity
+        self.total += 1
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        return self._slots[(self._start + index) % self.capacity]
+
+    @property
+    def first(self):
+        """Number (counting from 0 since the start) of the oldest line kept."""
+        return self.total - self._count
+
+    def snapshot(self):
+        end = self._start + self._count
+        return self._slots[self._start:end] + self._slots[:max(end - self.capacity, 0)]
+
+
+class LogView(ScrollView, can_focus=True):
+    """Scrollable view of the last lines of a growing log.
+
+    write() only stores the line; the view redraws at most frame_rate times
+    a second, so a program printing thousands of lines a second costs one
+    redraw per frame. It follows the end of the log until scrolled up, and
+    keeps the lines on screen still while older ones are dropped. Pausing
+    freezes a copy of the lines, which is what search works on.
+    """
+
+    COMPONENT_CLASSES = {"log-view--match"}
+
+    DEFAULT_CSS = """
+    LogView > .log-view--match {
+        background: $warning;
+        color: $background;
+    }
+    """
+
+    def __init__(self, capacity=LOG_BUFFER_LINES, frame_rate=LOG_FRAME_RATE, name=None, id=None, classes=None):
+        super().__init__(name=name, id=id, classes=classes)
+        self.ring = LineRing(capacity)
+        self.frame_rate = frame_rate
+        # Copy of the lines while paused, and ring.total when it was taken
+        self.frozen = None
+        self.frozen_total = 0
+        self.following = True
+        self.search = ""
+        self.match_line = None
+        self._width = 0
+        self._first = 0
+        self._drawn_total = 0
+
+    @property
+    def lines(self):
+        return self.frozen if self.frozen is not None else self.ring
+
+    @property
+    def paused(self):
+        return self.frozen is not None
+
+    def on_mount(self):
+        self.set_interval(1 / self.frame_rate, self._frame)
+
+    def write(self, line):
+        line = clean_line(line)
+        self.ring.append(line)
+        if len(line) > self._width:
+            self._width = len(line)
+
+    def _frame(self):
+        if self.frozen is not None or self.ring.total == self._drawn_total:
+            return
+        dropped = self.ring.first - self._first
+        self._first = self.ring.first
+        self._drawn_total = self.ring.total
+        self.virtual_size = Size(self._width, len(self.ring))
+        if self.following:
+            self._scroll_to_line(len(self.ring) - self.scrollable_content_region.height)
+        elif dropped:
+            # Keep the same lines on screen while older ones drop off the top
+            self._scroll_to_line(self.scroll_y - dropped)
+        self.refresh()
+
+    def _scroll_to_line(self, y):
+        # Forced, since the scrollbars that allow scrolling only appear once
+        # the new virtual size has been laid out
+        self.scroll_to(y=max(y, 0), animate=False, immediate=True, force=True)
+
+    def watch_scroll_y(self, old_value, new_value):
+        super().watch_scroll_y(old_value, new_value)
+        if self.frozen is None:
+            self.following = new_value >= self.max_scroll_y
+
+    def pause(self):
+        self.frozen = self.ring.snapshot()
+        self.frozen_total = self.ring.total
+        self.following = False
+        self.virtual_size = Size(self._width, len(self.frozen))
+
+    def resume(self):
+        """Unfreeze and jump back to the end of the log."""
+        self.frozen = None
+        self.match_line = None
+        self.following = True
+        self._drawn_total = -1
+        self._frame()
+
+    def jump_to_end(self):
+        if self.paused:
+            self.resume()
+        else:
+            self.following = True
+            self._drawn_total = -1
+            self._frame()
+
+    def find(self, text, backwards=False):
+        """Pause and scroll to the next line containing text (case-insensitive),
+        searching from the current match or the top of the screen. Returns the
+        line number or None."""
+        if not self.paused:
+            self.pause()
+        if text.lower() != self.search:
+            self.match_line = None
+        self.search = text.lower()
+        self.refresh()
+        if not self.search:
+            return None
+        lines = self.frozen
+        start = self.match_line if self.match_line is not None else int(self.scroll_y) - (1 if not backwards else 0)
+        step = -1 if backwards else 1
+        candidates = range(start + step, -1, -1) if backwards else range(start + step, len(lines))
+        for index in candidates:
+            if self.search in lines[index].lower():
+                self.match_line = index
+                # Put the match a few lines below the top, with some context above
+                self._scroll_to_line(index - 3)
+                self.refresh()
+                return index
+        return None
+
+    def render_line(self, y):
+        scroll_x, scroll_y = self.scroll_offset
+        width = self.size.width
+        index = scroll_y + y
+        lines = self.lines
+        if index >= len(lines):
+            return Strip.blank(width, self.rich_style)
+        line = lines[index]
+        style = self.rich_style
+        if self.search and self.search in line.lower():
+            segments = self._highlight(line, style, self.get_component_rich_style("log-view--match"))
+        else:
+            segments = [Segment(line, style)]
+        return Strip(segments).crop_extend(scroll_x, scroll_x + width, style)
+
+    def _highlight(self, line, style, match_style):
+        segments = []
+        lowered = line.lower()
+        position = 0
+        while (found := lowered.find(self.search, position)) != -1:
+            end = found + len(self.search)
+            segments += [Segment(line[position:found], style), Segment(line[found:end], match_style)]
+            position = end
+        segments.append(Segment(line[position:], style))
+        return segments
@@ -0,0 +1,24 @@
+from textual.suggester import Suggester
+
+class NodeListSuggester(Suggester):
+    """Completes the last node name of a comma separated node list from the
+    cluster's node index, skipping nodes already in the list."""
+
+    def __init__(self, cluster_nodes: object):
+        """
+        :param cluster_nodes: The app's ClusterNodes.
+        """
+        # The index changes under it, so nothing is cached
+        super().__init__(use_cache=False, case_sensitive=True)
+        self.cluster_nodes = cluster_nodes
+
+    async def get_suggestion(self, value):
+        head, _, prefix = value.rpartition(",")
+        prefix = prefix.lstrip()
+        if not prefix:
+            return None
+        listed = {name.strip() for name in head.split(",")}
+        for name in self.cluster_nodes.index.complete(prefix, limit=len(listed) + 1):
+            if name not in listed:
+                return value[:len(value) - len(prefix)] + name
+        return None
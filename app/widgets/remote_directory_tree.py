@@ -0,0 +1,47 @@
+from pathlib import PurePosixPath
+from textual import work
+from textual.widgets import DirectoryTree
+
+class RemotePath(PurePosixPath):
+    """A path in a RemoteDirectoryTree. Entries of a listing know whether
+    they are directories, so the tree never has to stat them; the root (and
+    any path made from another) counts as a directory."""
+    directory = True
+
+    def is_dir(self):
+        return self.directory
+
+# The tree's root; SFTP paths without a leading slash are relative to it
+HOME = RemotePath("~")
+
+class RemoteDirectoryTree(DirectoryTree):
+    """DirectoryTree of a directory on the cluster, listed through
+    RemoteFiles (SFTP on the shared session) when a node is expanded."""
+
+    PATH = RemotePath
+
+    def __init__(self, remote_files: object, path=HOME, **kwargs):
+        """
+        :param remote_files: The app's RemoteFiles (or DaemonRemoteFiles).
+        :param path: Directory shown as the root, the home directory by default.
+        """
+        self.remote_files = remote_files
+        super().__init__(path, **kwargs)
+
+    @work(thread=True, exit_on_error=False)
+    def _load_directory(self, node):
+        path = node.data.path
+        remote_path = path.relative_to(HOME) if path.is_relative_to(HOME) else path
+        try:
+            entries = self.remote_files.list_dir(str(remote_path))
+        except Exception as e:
+            # Expanding the node again retries
+            node.data.loaded = False
+            self.app.call_from_thread(self.notify, f"Could not list {path}: {e}", severity="error")
+            raise
+        paths = []
+        for entry in entries:
+            child = path / entry.name
+            child.directory = entry.is_dir
+            paths.append(child)
+        return list(self.filter_paths(paths))
@@ -0,0 +1,106 @@
+import math
+from rich.text import Text
+from textual.widget import Widget
+from app.config import SUCCESS_COLOR, WARNING_COLOR, ERROR_COLOR, RESOURCE_SAMPLE_INTERVAL
+
+BARS = "▁▂▃▄▅▆▇█"
+LABEL_WIDTH = 5
+SUMMARY_WIDTH = 40
+# Below this share of what was allocated a job is flagged as not using it,
+# above MEMORY_HIGH it is close to being killed for running out of memory
+USAGE_LOW = 25
+MEMORY_HIGH = 90
+
+def sparkline(values, width):
+    """One bar per 0-100 sample, newest on the right; missing samples are blank."""
+    bars = []
+    for value in values[-width:]:
+        if math.isnan(value):
+            bars.append(" ")
+        else:
+            bars.append(BARS[round(min(max(value, 0), 100) / 100 * (len(BARS) - 1))])
+    return "".join(bars).rjust(width)
+
+def count(number, noun):
+    return f"{number} {noun}" if number == 1 else f"{number} {noun}s"
+
+def format_memory(megabytes):
+    if megabytes is None:
+        return "?"
+    if megabytes >= 1024:
+        return f"{megabytes / 1024:.1f}G"
+    return f"{megabytes:.0f}M"
+
+class ResourcePanel(Widget):
+    """CPU, memory and GPU sparklines of one monitored job (a JobSeries)."""
+
+    DEFAULT_CSS = """
+    ResourcePanel {
+        height: 5;
+    }
+    """
+
+    def __init__(self, gpu=False, name=None, id=None, classes=None):
+        """
+        :param gpu: Whether the monitor samples GPUs at all.
+        """
+        super().__init__(name=name, id=id, classes=classes)
+        self.gpu = gpu
+        self.series = None
+        self.error = None
+
+    def show(self, series, error=None):
+        self.series = series
+        self.error = error
+        self.border_title = f"Resources of job {series.job_id}" if series else None
+        self.refresh()
+
+    def render(self):
+        series = self.series
+        if series is None:
+            return Text("")
+        if not series.samples:
+            return Text("Error: " + str(self.error) if self.error else "Sampling...",
+                        style=ERROR_COLOR if self.error else "white")
+        width = max(self.content_region.width - LABEL_WIDTH - SUMMARY_WIDTH, 10)
+        lines = [
+            self._line("CPU", series.cpu, width, self._cpu_summary(series), low=USAGE_LOW),
+            self._line("Mem", series.mem, width, self._memory_summary(series), high=MEMORY_HIGH),
+            self._line("GPU", series.gpu, width, self._gpu_summary(series), low=USAGE_LOW),
+        ]
+        if self.error:
+            lines[-1].append(f"  (last sample failed: {self.error})", style=ERROR_COLOR)
+        return Text("\n").join(lines)
+
+    @staticmethod
+    def _line(label, ring, width, summary, low=None, high=None):
+        last = ring.last
+        color = SUCCESS_COLOR
+        if last is not None and ((low is not None and last < low) or (high is not None and last > high)):
+            color = ERROR_COLOR if high is not None else WARNING_COLOR
+        line = Text(label.ljust(LABEL_WIDTH), style="bold white")
+        line.append(sparkline(ring.values(width), width), style=color)
+        line.append(" " + summary, style="white")
+        return line
+
+    @staticmethod
+    def _cpu_summary(series):
+        if series.cpu.last is None:
+            return f"{count(series.cpus or '?', 'CPU')}, next sample in {RESOURCE_SAMPLE_INTERVAL}s"
+        return f"{series.cpu.last:5.1f}% of {count(series.cpus, 'CPU')} ({series.cpus_busy:.1f} busy)"
+
+    @staticmethod
+    def _memory_summary(series):
+        if series.mem.last is None:
+            return f"{format_memory(series.memory_used)} of {format_memory(series.memory)}"
+        return f"{series.mem.last:5.1f}% of {format_memory(series.memory)} ({format_memory(series.memory_used)})"
+
+    def _gpu_summary(self, series):
+        if not series.gpus:
+            return "no GPUs allocated"
+        if not self.gpu:
+            return "not sampled (IDUN_MONITOR_GPU=1)"
+        if series.gpu.last is None:
+            return f"{count(series.gpus, 'GPU')}, no nvidia-smi sample"
+        used, total = series.gpu_memory
+        return f"{series.gpu.last:5.1f}% of {count(series.gpus, 'GPU')} ({format_memory(used)} of {format_memory(total)})"
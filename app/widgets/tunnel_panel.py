@@ -0,0 +1,63 @@
+from rich.text import Text
+from textual.widgets import Static
+from app.widgets.wait_estimate import format_wait
+from app.config import SUCCESS_COLOR, WARNING_COLOR, ERROR_COLOR
+
+HEALTH_COLORS = {"ok": SUCCESS_COLOR, "idle": WARNING_COLOR, "dead": ERROR_COLOR}
+UNITS = ("B", "kB", "MB", "GB", "TB")
+
+def format_bytes(count):
+    """Compact byte count, e.g. '512B', '1.2MB', '340MB'."""
+    for unit in UNITS:
+        if count < 1000 or unit == UNITS[-1]:
+            break
+        count /= 1000
+    return f"{count:.0f}{unit}" if unit == "B" or count >= 100 else f"{count:.1f}{unit}"
+
+def format_rate(rate):
+    return f"{format_bytes(rate)}/s"
+
+def describe_idle(seconds):
+    return "just now" if seconds < 60 else f"{format_wait(seconds)} ago"
+
+def tunnel_cell(tunnels, stats):
+    """(value, style) of the Tunnel Port cell of a node with tunnels; flagged
+    tunnels get their health after the port and colour the whole cell."""
+    labels = []
+    worst = "ok"
+    for tunnel in tunnels:
+        health = stats[tunnel.key].health if tunnel.key in stats else "ok"
+        labels.append(tunnel.label if health == "ok" else f"{tunnel.label} ({health})")
+        if health == "dead" or (health == "idle" and worst == "ok"):
+            worst = health
+    return ", ".join(labels), worst
+
+class TunnelPanel(Static):
+    """Traffic and health of the tunnels to the selected job's node and of
+    the SOCKS proxy, one line each."""
+
+    def show(self, tunnels, stats):
+        self.display = bool(tunnels)
+        if not tunnels:
+            return
+        self.border_title = "Tunnels"
+        lines = []
+        for tunnel in tunnels:
+            tunnel_stats = stats.get(tunnel.key)
+            target = f"{tunnel.node}:{tunnel.remote_port}" if tunnel.node else "SOCKS5 proxy"
+            line = Text(f"localhost:{tunnel.local_port} -> {target}  ", style="bold")
+            if tunnel_stats is None:
+                lines.append(line)
+                continue
+            line.append(tunnel_stats.health, style=f"bold {HEALTH_COLORS[tunnel_stats.health]}")
+            channels = tunnel_stats.channels
+            line.append(f"  {channels} {'channel' if channels == 1 else 'channels'}"
+                        f"  in {format_bytes(tunnel_stats.bytes_in)} ({format_rate(tunnel_stats.rate_in)})"
+                        f"  out {format_bytes(tunnel_stats.bytes_out)} ({format_rate(tunnel_stats.rate_out)})"
+                        f"  active {describe_idle(tunnel_stats.idle_seconds)}")
+            if tunnel_stats.open_errors:
+                line.append(f"  {tunnel_stats.open_errors} failed to open", style=WARNING_COLOR)
+            if tunnel_stats.last_error:
+                line.append(f"  ({tunnel_stats.last_error})", style=ERROR_COLOR)
+            lines.append(line)
+        self.update(Text("\n").join(lines))
@@ -0,0 +1,49 @@
+import datetime
+from textual.widgets import Static
+from app.utils.wait_model import NO_GRES
+from app.config import SUCCESS_COLOR, WARNING_COLOR, INFO_COLOR
+
+def format_wait(seconds):
+    """Compact duration for wait times, e.g. '45m', '2h10m', '3d4h'."""
+    minutes = max(int(seconds // 60), 1)
+    days, minutes = divmod(minutes, 1440)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f"{days}d{hours}h" if hours else f"{days}d"
+    if hours:
+        return f"{hours}h{minutes:02d}m" if minutes else f"{hours}h"
+    return f"{minutes}m"
+
+def format_start(seconds):
+    return "soon" if seconds < 60 else f"in {format_wait(seconds)}"
+
+def describe_start(slurm_start, estimate, submitted, now=None):
+    """Est. Start cell of a pending job: SLURM's expected start ('in 2h10m'),
+    the history's ('~in 40m'), or both ('in 2h10m (~40m)')."""
+    now = now or datetime.datetime.now()
+    history = None
+    if estimate is not None and submitted is not None:
+        history = format_start((submitted - now).total_seconds() + estimate.median)
+    if slurm_start is None:
+        return f"~{history}" if history else "N/A"
+    slurm = format_start((slurm_start - now).total_seconds())
+    return f"{slurm} (~{history.removeprefix('in ')})" if history else slurm
+
+class WaitEstimateLine(Static):
+    """One line on how long a job like the one being requested typically waits."""
+
+    def show(self, estimator, partition, gres=None, timelimit=None):
+        estimate = estimator.estimate(partition, gres, timelimit)
+        if estimate is None:
+            if estimator.error is not None:
+                self.update(f"[{WARNING_COLOR}]No wait estimate: {estimator.error}[/{WARNING_COLOR}]")
+            elif estimator.synced_at is None:
+                self.update(f"[{INFO_COLOR}]Learning queue wait times from your history...[/{INFO_COLOR}]")
+            else:
+                self.update(f"[{WARNING_COLOR}]Too little history in {partition} to estimate the wait."
+                            f"[/{WARNING_COLOR}]")
+            return
+        scope = " ".join(value for value in estimate.group if value != NO_GRES) or "all partitions"
+        text = (f"Typical wait ({scope}): ~{format_wait(estimate.median)}, usually "
+                f"{format_wait(estimate.low)}-{format_wait(estimate.high)} ({estimate.samples} of your jobs)")
+        self.update(f"[{SUCCESS_COLOR}]{text}[/{SUCCESS_COLOR}]")
@@ -0,0 +1,148 @@
+"""Local TCP service for tunnel benchmarks.
+
+A client picks what the connection does with its first byte:
+- b"e": everything it sends is echoed back until it closes.
+- b"s" and a size (8 bytes, network order): that many bytes are read and
+  discarded, then the count is written back as one line.
+- b"g" and a size: that many bytes are sent to the client, then the
+  connection is closed.
+None of them relies on a half-close (EOF in one direction only) reaching
+the service, which not every forwarding loop passes on.
+
+Run as a script it starts the service and the stub SSH server in this
+process and prints both ports as one JSON line, so a benchmark can keep
+the far end of its tunnels off its own GIL, as it would be on a real node.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import threading
+import subprocess
+
+CHUNK = 256 * 1024
+
+
+def receive_exactly(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed early")
+        data += chunk
+    return data
+
+
+class EchoService:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self._listen_socket = None
+        self._payload = memoryview(os.urandom(CHUNK))
+
+    def start(self):
+        self._listen_socket = socket.create_server((self.host, self.port), backlog=socket.SOMAXCONN)
+        self.port = self._listen_socket.getsockname()[1]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self.port
+
+    def stop(self):
+        if self._listen_socket:
+            self._listen_socket.close()
+            self._listen_socket = None
+
+    def _accept_loop(self):
+        while self._listen_socket:
+            try:
+                client, _ = self._listen_socket.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client):
+        with client:
+            try:
+                mode = receive_exactly(client, 1)
+                if mode == b"e":
+                    self._echo(client)
+                elif mode in (b"s", b"g"):
+                    size = struct.unpack("!Q", receive_exactly(client, 8))[0]
+                    (self._sink if mode == b"s" else self._source)(client, size)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _echo(client):
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while data := client.recv(CHUNK):
+            client.sendall(data)
+
+    @staticmethod
+    def _sink(client, size):
+        buffer = bytearray(CHUNK)
+        left = size
+        while left and (count := client.recv_into(buffer, min(left, CHUNK))):
+            left -= count
+        client.sendall(f"{size - left}\n".encode())
+
+    def _source(self, client, size):
+        left = size
+        while left:
+            left -= client.send(self._payload[:min(left, CHUNK)])
+
+
+def direct(port):
+    """Connect function for the service (or a tunnel to it) on a local port."""
+    return lambda: socket.create_connection(("127.0.0.1", port))
+
+
+def upload(connect, size):
+    """Send size bytes to the sink over connect(), a new socket to the
+    service; returns the seconds it took."""
+    payload = memoryview(os.urandom(CHUNK))
+    start = time.perf_counter()
+    with connect() as sock:
+        sock.sendall(b"s" + struct.pack("!Q", size))
+        sent = 0
+        while sent < size:
+            sock.sendall(payload[:min(size - sent, CHUNK)])
+            sent += min(size - sent, CHUNK)
+        received = int(sock.makefile().readline())
+    elapsed = time.perf_counter() - start
+    if received != size:
+        raise AssertionError(f"Sent {size} bytes but the service received {received}")
+    return elapsed
+
+
+def download(connect, size):
+    """Receive size bytes from the service over connect(); returns the seconds it took."""
+    buffer = bytearray(CHUNK)
+    start = time.perf_counter()
+    with connect() as sock:
+        sock.sendall(b"g" + struct.pack("!Q", size))
+        received = 0
+        while received < size and (count := sock.recv_into(buffer)):
+            received += count
+    elapsed = time.perf_counter() - start
+    if received != size:
+        raise AssertionError(f"Expected {size} bytes but received {received}")
+    return elapsed
+
+
+def start_far_end():
+    """Start the stub SSH server and an EchoService in a child process.
+    Returns the process and its ports as {"ssh": ..., "service": ...};
+    closing the process's stdin (e.g. with communicate()) stops it."""
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__)], stdin=subprocess.PIPE,
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return child, json.loads(child.stdout.readline())
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from stub_ssh_server import StubSSHServer
+    ports = {"ssh": StubSSHServer().start(), "service": EchoService().start()}
+    print(json.dumps(ports), flush=True)
+    sys.stdin.read()
@@ -0,0 +1,171 @@
+"""Deterministic fake job data shared by the fake slurm commands."""
+import os
+import re
+import datetime
+
+SACCT_STATES = ["COMPLETED", "FAILED", "CANCELLED by 123", "TIMEOUT", "OUT_OF_MEMORY", "RUNNING"]
+BASE_TIME = datetime.datetime(2025, 1, 1, 8, 0, 0)
+
+
+def option(args, *names, default=None):
+    """Value of a '-x value', '--name value' or '--name=value' option."""
+    for i, arg in enumerate(args):
+        for name in names:
+            if arg == name and i + 1 < len(args):
+                return args[i + 1]
+            if arg.startswith(name + "="):
+                return arg.split("=", 1)[1]
+    return default
+
+
+def home(user):
+    """Home directory the job output paths point into (FAKE_SLURM_HOME overrides it)."""
+    return os.getenv("FAKE_SLURM_HOME", f"/cluster/home/{user}")
+
+
+def queue_jobs(user):
+    count = int(os.getenv("FAKE_SQUEUE_JOBS", "20"))
+    for i in range(count):
+        running = i % 3 != 0
+        gpu = i % 2 == 0
+        yield {
+            "i": str(20000000 + i),
+            "P": "GPUQ" if gpu else "CPUQ",
+            "j": f"train model {i}",
+            "u": user,
+            "t": "R" if running else "PD",
+            "T": "RUNNING" if running else "PENDING",
+            "M": f"{i % 24}:{i % 60:02d}:{(i * 7) % 60:02d}" if running else "0:00",
+            "l": "1-00:00:00",
+            "D": "1",
+            "C": "8",
+            "m": "64G",
+            "b": "gpu:a100:1" if gpu else "N/A",
+            "V": (BASE_TIME + datetime.timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%S"),
+            "S": (BASE_TIME + datetime.timedelta(minutes=i + 5)).strftime("%Y-%m-%dT%H:%M:%S"),
+            "R": f"idun-06-{i % 20 + 1:02d}" if running else "(Priority)",
+            "N": f"idun-06-{i % 20 + 1:02d}" if running else "",
+            "o": f"{home(user)}/slurm_output/job_{i}.out",
+            "AllocTRES": "billing=8,cpu=8,mem=64G,node=1" + (",gres/gpu=1" if gpu else ""),
+        }
+
+
+def queue_usage(job, now):
+    """sstat TRESUsageInTot of a running queue job at time now (seconds since the epoch).
+
+    Each job keeps a steady share of its 8 CPUs busy, so its CPU time grows
+    by that many seconds per second, and slowly grows its memory.
+    """
+    i = int(job["i"]) - 20000000
+    busy = 8 * (i * 37 % 100) / 100
+    memory = (i * 13 % 48 + 1) * 1024 + int(now) % 600
+    seconds = int(now * busy) % (30 * 86400)
+    days, rest = divmod(seconds, 86400)
+    return (f"cpu={days}-{rest // 3600:02d}:{rest // 60 % 60:02d}:{rest % 60:02d},energy=0,"
+            f"fs/disk=1048576,mem={memory}M,pages=0,vmem={memory * 2}M")
+
+
+def queue_gpu_usage(job, now):
+    """nvidia-smi utilization.gpu,memory.used,memory.total of a GPU queue job."""
+    i = int(job["i"]) - 20000000
+    return f"{(i * 29 + int(now) // 10) % 101}, {(i * 997) % 40960}, 40960"
+
+
+# (name prefix, partition, GPU type, GPUs per node, node count)
+NODE_GROUPS = [("idun-01", "CPUQ", None, 0, 40), ("idun-04", "GPUQ", "p100", 2, 8),
+               ("idun-05", "GPUQ", "v100", 4, 16), ("idun-06", "GPUQ", "a100", 4, 20),
+               ("idun-07", "GPUQ", "h100", 4, 8)]
+
+
+def node_groups():
+    """NODE_GROUPS, or FAKE_NODES nodes in groups of 100 alternating CPUQ and A100 GPUQ."""
+    count = int(os.getenv("FAKE_NODES", "0"))
+    if not count:
+        return NODE_GROUPS
+    return [(f"idun-{g:02d}", "GPUQ" if g % 2 else "CPUQ", "a100" if g % 2 else None, 4 if g % 2 else 0, 100)
+            for g in range(1, count // 100 + 1)]
+
+
+def cluster_nodes(now):
+    """'scontrol show node -o' records; about one node in ten changes its load every minute."""
+    minute = int(now) // 60
+    for prefix, partition, gpu_type, gpus, nodes in node_groups():
+        for n in range(1, nodes + 1):
+            seed = (n * 7919 + sum(map(ord, prefix)) * 31) % 1000
+            load = (seed + (minute if seed % 10 == 0 else 0)) % 5
+            if seed % 23 == 0:
+                state = "DOWN*"
+            elif seed % 17 == 0:
+                state = "IDLE+DRAIN"
+            else:
+                state = ["IDLE", "MIXED", "MIXED", "ALLOCATED", "MIXED"][load]
+            cpus_alloc = {"IDLE": 0, "ALLOCATED": 64, "MIXED": 16 * load}.get(state, 0)
+            gpus_used = 0 if cpus_alloc == 0 else gpus if state == "ALLOCATED" else min(load, gpus)
+            gres = f"gpu:{gpu_type}:{gpus}(S:0-1)" if gpus else "(null)"
+            gres_used = f"gpu:{gpu_type}:{gpus_used}(IDX:N/A)" if gpus else "gpu:0"
+            yield (f"NodeName={prefix}-{n:02d} Arch=x86_64 CoresPerSocket=32 CPUAlloc={cpus_alloc} CPUEfctv=64 "
+                   f"CPUTot=64 CPULoad={cpus_alloc * 0.9:.2f} AvailableFeatures={gpu_type or 'cpu'} "
+                   f"Gres={gres} NodeAddr={prefix}-{n:02d} Version=23.11.6 OS=Linux 4.18.0 #1 SMP "
+                   f"RealMemory=512000 AllocMem={cpus_alloc * 4000} FreeMem=400000 Sockets=2 "
+                   f"State={state} ThreadsPerCore=1 Partitions={partition},short "
+                   f"CfgTRES=cpu=64,mem=500G,billing=64{f',gres/gpu={gpus}' if gpus else ''} "
+                   f"GresUsed={gres_used}")
+
+
+def history_jobs(user):
+    """Jobs started every 17 minutes up to the current minute, oldest first."""
+    count = int(os.getenv("FAKE_SACCT_JOBS", "200"))
+    first = history_first_start(count)
+    for i in range(count):
+        yield history_job(user, i, first)
+
+
+def history_first_start(count):
+    return datetime.datetime.now().replace(second=0, microsecond=0) - datetime.timedelta(minutes=17 * count)
+
+
+def history_job(user, i, first):
+    """The i-th job of history_jobs, for callers that only need some of them."""
+    start = first + datetime.timedelta(minutes=17 * i)
+    elapsed = datetime.timedelta(seconds=(i * 137) % 86400)
+    state = SACCT_STATES[i % len(SACCT_STATES)]
+    gpu_type = ("a100", "v100")[i // 2 % 2] if i % 2 == 0 else None
+    return {
+        "JobID": str(10000000 + i),
+        "JobName": f"experiment {i} lr=0.{i % 9 + 1}",
+        "User": user,
+        "Partition": "GPUQ" if i % 2 == 0 else "CPUQ",
+        "State": state,
+        "Submit": (start - datetime.timedelta(minutes=i % 90)).strftime("%Y-%m-%dT%H:%M:%S"),
+        "Start": start.strftime("%Y-%m-%dT%H:%M:%S"),
+        "End": "Unknown" if state == "RUNNING" else (start + elapsed).strftime("%Y-%m-%dT%H:%M:%S"),
+        "Elapsed": str(elapsed).rjust(8, "0"),
+        "Timelimit": "1-00:00:00",
+        "NodeList": f"idun-0{i % 9 + 1}-{i % 20 + 1:02d}",
+        "AllocTRES": "billing=8,cpu=8,mem=64G,node=1" + (f",gres/gpu=1,gres/gpu:{gpu_type}=1" if gpu_type else ""),
+        "ReqTRES": "billing=8,cpu=8,mem=64G,node=1" + (",gres/gpu=1" if i % 2 == 0 else ""),
+        "ExitCode": "0:0" if state == "COMPLETED" else "1:0",
+        "StdOut": f"{home(user)}/slurm_output/job_{i}.out",
+    }
+
+
+def parse_time(value):
+    """sacct's --starttime/--endtime: an ISO timestamp, 'now' or 'now-<n>days'."""
+    now = datetime.datetime.now()
+    if value == "now":
+        return now
+    if value.startswith("now-") and value.endswith("days"):
+        return now - datetime.timedelta(days=int(value[4:-4]))
+    return datetime.datetime.fromisoformat(value)
+
+
+def format_percent(fmt, job):
+    """Render a squeue style '%.18i %j' format string for one job."""
+    def field(match):
+        width, letter = match.group(2), match.group(3)
+        value = job.get(letter, "")
+        if width:
+            value = value[:int(width)]
+            value = value.rjust(int(width)) if match.group(1) else value.ljust(int(width))
+        return value
+    return re.sub(r"%(\.?)(\d*)([a-zA-Z])", field, fmt)
@@ -0,0 +1,93 @@
+"""Compare round-trip latency of exec-per-command queries against the helper agent.
+
+Runs the same queue/history/list-configs queries through
+SSHConnectionManager.run_command_async (one exec channel each) and through
+HelperAgentManager (one long-lived channel), both sequentially and as a
+pipelined batch, against the local stub SSH server with the fake slurm
+commands on PATH. --exec-latency adds a per-channel startup delay on the
+server to mimic a loaded login node. Prints the results as JSON.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app"), BENCH_DIR]
+from stub_ssh_server import StubSSHServer
+
+USER = "bench"
+EXEC_QUERIES = [
+    f"squeue -u {USER}",
+    f"sacct -u {USER} --format=JobID,JobName%50,State,Start,End,Elapsed,NodeList",
+    "ls ./slurm_configs/cpu/*.slurmconfig ./slurm_configs/gpu/*.slurmconfig",
+]
+HELPER_QUERIES = [
+    ("queue", {"user": USER}),
+    ("history", {"user": USER}),
+    ("list_configs", {"base": "./slurm_configs", "types": ["cpu", "gpu"]}),
+]
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_ms": statistics.mean(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p95_ms": samples[int(len(samples) * 0.95) - 1] * 1000,
+    }
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    await coro
+    return time.perf_counter() - start
+
+
+async def run(manager, helper, rounds):
+    await helper.start()
+    await helper.request("ping")
+    results = {}
+    for (command, (op, args)) in zip(EXEC_QUERIES, HELPER_QUERIES):
+        results[op] = {
+            "exec": summarize([await timed(manager.run_command_async(command)) for _ in range(rounds)]),
+            "helper": summarize([await timed(helper.request(op, **args)) for _ in range(rounds)]),
+        }
+    results["pipelined_batch"] = {
+        "exec": summarize([await timed(manager.run_commands(*EXEC_QUERIES)) for _ in range(rounds)]),
+        "helper": summarize([await timed(asyncio.gather(*(helper.request(op, **args) for op, args in HELPER_QUERIES)))
+                             for _ in range(rounds)]),
+    }
+    helper.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--exec-latency", type=float, default=0.05,
+                        help="Seconds of simulated channel/shell startup cost per exec")
+    args = parser.parse_args()
+
+    from app.ssh_connection import SSHConnectionManager
+    from app.helper_agent_manager import HelperAgentManager
+    server = StubSSHServer(path_prefix=os.path.join(BENCH_DIR, "fake_slurm"), exec_latency=args.exec_latency)
+    port = server.start()
+    manager = SSHConnectionManager()
+    manager.username, manager.password = USER, USER
+    manager.host, manager.port = "127.0.0.1", port
+    manager.connect()
+    try:
+        results = asyncio.run(run(manager, HelperAgentManager(manager), args.rounds))
+    finally:
+        manager.close()
+        server.stop()
+    print(json.dumps({"exec_latency": args.exec_latency, "rounds": args.rounds, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
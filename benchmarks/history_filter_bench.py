@@ -0,0 +1,93 @@
+"""Measure per-keystroke filter latency of the history search on a large history.
+
+Builds HistoryIndex over synthetic sacct records (500k by default, from the
+fake slurm data), then types a set of queries one character at a time,
+timing each keystroke as the history screen does it: run the query, count
+the matches and fetch the first page of rows. Prints the index build time
+and per-query latency percentiles as JSON.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app"), os.path.join(BENCH_DIR, "fake_slurm")]
+from _jobs import history_jobs
+from app.utils.parser import SACCT_COLUMNS, parse_sacct_line
+from app.utils.history_index import HistoryIndex
+
+PAGE_SIZE = 100
+QUERIES = [
+    "experiment",
+    "experiment 4242",
+    "lr=0.3",
+    "state:failed",
+    "state:cancelled,timeout node:idun-03",
+    "node:idun-0",
+    "after:{month_ago} before:{week_ago}",
+    "state:completed sort:-elapsed",
+    "sort:elapsed",
+    "experiment re:lr=0\\.[12]$",
+]
+
+
+def keystrokes(query):
+    """Every prefix of query, as typed."""
+    return [query[:i] for i in range(1, len(query) + 1)]
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "keystrokes": len(samples),
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p95_ms": samples[max(int(len(samples) * 0.95) - 1, 0)] * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    args = parser.parse_args()
+
+    os.environ["FAKE_SACCT_JOBS"] = str(args.rows)
+    jobs = [parse_sacct_line("|".join(job[column] for column in SACCT_COLUMNS)) for job in history_jobs("bench")]
+    newest = max(job.start for job in jobs)
+    fill = {"month_ago": (newest.replace(day=1)).date().isoformat(),
+            "week_ago": newest.date().isoformat()}
+
+    start = time.perf_counter()
+    index = HistoryIndex(jobs)
+    build_seconds = time.perf_counter() - start
+
+    results = {}
+    all_samples = []
+    for template in QUERIES:
+        query = template.format(**fill)
+        samples = []
+        for typed in keystrokes(query):
+            start = time.perf_counter()
+            try:
+                view = index.search(typed)
+                matches = len(view)
+                view[:PAGE_SIZE]
+            except ValueError:
+                # Half-typed dates and patterns are rejected, which is part of the cost too
+                matches = None
+            samples.append(time.perf_counter() - start)
+        results[query] = dict(summarize(samples), matches=matches)
+        all_samples += samples
+    print(json.dumps({
+        "rows": args.rows,
+        "index_build_seconds": build_seconds,
+        "all_keystrokes": summarize(all_samples),
+        "queries": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
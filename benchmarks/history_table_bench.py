@@ -0,0 +1,148 @@
+"""Measure render time and memory of the history table at 10k, 100k and 1M rows.
+
+Each case runs in a fresh interpreter that mounts the table headless
+(Textual's run_test) and hands it a lazy synthetic history, so the jobs
+themselves cost no memory and any RSS growth belongs to the table. It
+records the time from handing over the rows to the first frame, the RSS
+added by the table, and per-keystroke latency and RSS while paging through
+the table and jumping to its end. The previous table (a DataTable with a
+styled Text per cell, all added up front) is measured up to --legacy-max-rows
+for comparison. Prints the results as JSON.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+# Page downs pressed (fewer on short tables, where a page down at the end
+# changes nothing on screen and so draws no frame)
+PAGE_DOWNS = 200
+ROWS_PER_PAGE_DOWN = 100
+FRAME_TIMEOUT = 10
+
+
+class SyntheticHistory:
+    """Sequence of SacctJobs generated on demand, holding none of them."""
+
+    def __init__(self, count):
+        from _jobs import history_first_start
+        self.count = count
+        self.first = history_first_start(count)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, item):
+        from _jobs import history_job
+        from app.utils.parser import SACCT_COLUMNS, SacctJob
+        # Newest first, like the history screen
+        return [SacctJob(*(job[column] for column in SACCT_COLUMNS))
+                for job in (history_job("bench", self.count - 1 - i, self.first)
+                            for i in range(*item.indices(self.count)))]
+
+
+def rss_mb():
+    import psutil
+    return psutil.Process().memory_info().rss / 2**20
+
+
+async def next_frame(pilot, frames, since):
+    deadline = time.perf_counter() + FRAME_TIMEOUT
+    while not frames or frames[-1] < since:
+        if time.perf_counter() > deadline:
+            raise TimeoutError("No frame was drawn")
+        await pilot.pause()
+
+
+async def measure_once(rows, table_kind):
+    sys.path[:0] = [ROOT, os.path.join(ROOT, "app"), os.path.join(BENCH_DIR, "fake_slurm")]
+    from rich.text import Text
+    from textual.app import App
+    from textual.widgets import DataTable
+    from app.widgets.job_table import VirtualJobTable
+    columns = ("JOBID", "JOBNAME", "STATE", "START", "END", "ELAPSED", "NODELIST")
+    history = SyntheticHistory(rows)
+    frames = []
+
+    class TableApp(App):
+        def compose(self):
+            if table_kind == "virtual":
+                yield VirtualJobTable(*columns, id="job-table")
+            else:
+                table = DataTable(id="job-table", cursor_type="row")
+                table.add_columns(*columns)
+                yield table
+
+        def _display(self, screen, renderable):
+            # Headless apps skip painting, but every frame still passes here
+            if renderable is not None:
+                frames.append(time.perf_counter())
+            return super()._display(screen, renderable)
+
+    app = TableApp()
+    async with app.run_test(size=(160, 50)) as pilot:
+        table = app.query_one("#job-table")
+        table.focus()
+        await pilot.pause()
+        rss_before = rss_mb()
+
+        start = time.perf_counter()
+        if table_kind == "virtual":
+            table.set_source(history)
+        else:
+            # What the history screen used to do for every load
+            for page in range(0, rows, 10_000):
+                for job in history[page:page + 10_000]:
+                    table.add_row(*(Text(value, style="bold white", justify="right") for value in job.row()))
+        await next_frame(pilot, frames, start)
+        first_frame = frames[-1] - start
+        rss_first_frame = rss_mb()
+
+        keystrokes = []
+        for key in ["pagedown"] * min(PAGE_DOWNS, rows // ROWS_PER_PAGE_DOWN) + ["ctrl+end", "ctrl+home"]:
+            start = time.perf_counter()
+            await pilot.press(key)
+            await next_frame(pilot, frames, start)
+            keystrokes.append(frames[-1] - start)
+        rss_after_scroll = rss_mb()
+        app.exit()
+
+    keystrokes.sort()
+    return {
+        "first_frame_seconds": first_frame,
+        "table_rss_mb": rss_first_frame - rss_before,
+        "table_rss_after_scroll_mb": rss_after_scroll - rss_before,
+        "keystroke_p50_ms": keystrokes[len(keystrokes) // 2] * 1000,
+        "keystroke_max_ms": keystrokes[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy-max-rows", type=int, default=100_000,
+                        help="Largest history to render with the previous DataTable")
+    parser.add_argument("--child", nargs=2, metavar=("ROWS", "TABLE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure_once(int(args.child[0]), args.child[1]))))
+        return
+
+    results = {}
+    for rows in args.rows:
+        kinds = ["virtual"] + (["legacy"] if rows <= args.legacy_max_rows else [])
+        for kind in kinds:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", str(rows), kind],
+                                    capture_output=True, text=True, check=True).stdout
+            results.setdefault(str(rows), {})[kind] = json.loads(output.strip().splitlines()[-1])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Measure how the job log viewer holds up against a job flooding its output file.
+
+Starts the local stub login node, writes a fake job's output file at
+--rate lines per second from a background thread, and opens the log viewer
+on that job in the headless app. While the output streams in it samples
+the event loop's responsiveness (how late a 10 ms timer fires), the frames
+drawn per second, the lines that reached the viewer and the process RSS.
+Prints the results as JSON.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app"), BENCH_DIR]
+
+JOB_ID = "20000001"
+# Fake job 20000001 writes to job_1.out (see fake_slurm/_jobs.py)
+OUTPUT_FILE = "slurm_output/job_1.out"
+WRITE_INTERVAL = 0.01
+LAG_INTERVAL = 0.01
+
+
+def write_output(path, rate, seconds, stop):
+    """Append rate lines a second to path for seconds, in small batches."""
+    batch = max(int(rate * WRITE_INTERVAL), 1)
+    written = 0
+    start = time.perf_counter()
+    with open(path, "a", buffering=1024 * 1024) as out:
+        while not stop.is_set() and time.perf_counter() - start < seconds:
+            due = int((time.perf_counter() - start) * rate)
+            while written < due:
+                lines = min(batch, due - written)
+                out.write("".join(f"step {written + i} loss=0.{(written + i) % 997:03d} lr=0.001\n"
+                                  for i in range(lines)))
+                written += lines
+            out.flush()
+            time.sleep(WRITE_INTERVAL)
+    return written
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)] if samples else None
+
+
+async def measure(rate, seconds):
+    import psutil
+    from app.ui import IDUNTUI
+    app = IDUNTUI()
+    frames = []
+    display = app._display
+
+    def timed_display(screen, renderable):
+        if renderable is not None:
+            frames.append(time.perf_counter())
+        return display(screen, renderable)
+
+    app._display = timed_display
+
+    async with app.run_test(size=(160, 50)):
+        deadline = time.perf_counter() + 30
+        while not getattr(app.screen, "job_rows", None):
+            if time.perf_counter() > deadline:
+                raise TimeoutError("Job table was never filled")
+            await asyncio.sleep(0.05)
+        app.open_log(JOB_ID)
+        while not getattr(app.screen, "streaming", False):
+            await asyncio.sleep(0.01)
+        screen = app.screen
+        rss_before = psutil.Process().memory_info().rss
+
+        stop = threading.Event()
+        result = {}
+        path = os.path.join(os.environ["FAKE_SLURM_HOME"], OUTPUT_FILE)
+        writer = threading.Thread(target=lambda: result.update(written=write_output(path, rate, seconds, stop)))
+        start = time.perf_counter()
+        writer.start()
+        lags = []
+        while writer.is_alive():
+            before = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            lags.append(time.perf_counter() - before - LAG_INTERVAL)
+        elapsed = time.perf_counter() - start
+        # Let the tail catch up with the end of the file
+        settle = time.perf_counter() + 5
+        while screen.log_view.ring.total < result["written"] and time.perf_counter() < settle:
+            await asyncio.sleep(0.05)
+        rss_after = psutil.Process().memory_info().rss
+        drawn = [frame for frame in frames if start <= frame <= start + elapsed]
+        view = screen.log_view
+        app.action_quit()
+
+    return {
+        "rate_lines_per_second": rate,
+        "seconds": seconds,
+        "lines_written": result["written"],
+        "lines_received": view.ring.total,
+        "lines_kept": len(view.ring),
+        "frames_per_second": len(drawn) / elapsed,
+        "event_loop_lag_p50_ms": percentile(lags, 0.5) * 1000,
+        "event_loop_lag_p99_ms": percentile(lags, 0.99) * 1000,
+        "event_loop_lag_max_ms": max(lags) * 1000,
+        "rss_growth_mb": (rss_after - rss_before) / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=int, default=10_000, help="Lines written per second")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    from stub_ssh_server import StubSSHServer
+    home = tempfile.mkdtemp(prefix="idun-log-bench-")
+    os.makedirs(os.path.join(home, os.path.dirname(OUTPUT_FILE)))
+    open(os.path.join(home, OUTPUT_FILE), "w").close()
+    server = StubSSHServer(path_prefix=os.path.join(BENCH_DIR, "fake_slurm"))
+    port = server.start()
+    os.environ.update(IDUN_USERNAME="bench", IDUN_PASSWORD="bench", IDUN_SSH_HOST="127.0.0.1",
+                      IDUN_SSH_PORT=str(port), IDUN_REMOTE_HELPER="0", IDUN_SESSION_DAEMON="0",
+                      FAKE_SLURM_HOME=home, XDG_DATA_HOME=home)
+    try:
+        print(json.dumps(asyncio.run(measure(args.rate, args.seconds)), indent=2))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
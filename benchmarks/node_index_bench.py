@@ -0,0 +1,86 @@
+"""Measure building, refreshing and querying the cluster node index.
+
+Generates 'scontrol show node -o' snapshots of 1k and 10k synthetic nodes
+with the fake slurm data (about one node in ten changes between two
+minutes) and reports the time to build the index, to refresh it from an
+unchanged and from a changed snapshot, and to answer "free A100s right
+now" from the index, the first time after a refresh and again after
+that. For comparison it parses the snapshot and scans every node for the
+same question. Prints the results as JSON.
+"""
+import os
+import sys
+import json
+import time
+import statistics
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app"), os.path.join(BENCH_DIR, "fake_slurm")]
+from _jobs import cluster_nodes
+
+NODE_COUNTS = (1_000, 10_000)
+QUERIES = 200
+
+
+def timed(function, repeat=1):
+    """Median seconds of function() over repeat runs."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def scan_free_gpus(lines, gpu_type):
+    from app.utils.node_index import parse_node
+    return sum(node.free_gpus(gpu_type) for node in map(parse_node, lines) if gpu_type in node.gpus)
+
+
+def measure(count):
+    from app.utils.node_index import NodeIndex
+    os.environ["FAKE_NODES"] = str(count)
+    now = time.time()
+    snapshot = list(cluster_nodes(now))
+    next_snapshot = list(cluster_nodes(now + 60))
+    changed_lines = sum(a != b for a, b in zip(snapshot, next_snapshot))
+
+    build = timed(lambda: NodeIndex().update(snapshot), repeat=5)
+    index = NodeIndex()
+    index.update(snapshot)
+    unchanged = timed(lambda: index.update(snapshot), repeat=5)
+
+    def refresh_changed():
+        refreshed = NodeIndex()
+        refreshed.update(snapshot)
+        start = time.perf_counter()
+        refreshed.update(next_snapshot)
+        return time.perf_counter() - start
+    changed = statistics.median(refresh_changed() for _ in range(5))
+
+    free = index.availability(gpu_type="a100").free_gpus
+    if free != scan_free_gpus(snapshot, "a100"):
+        raise AssertionError("Index and scan disagree on the free A100s")
+    # The first question after a refresh counts the nodes, later ones reuse the answer
+    first_query = timed(lambda: index._count(None, "a100"), repeat=10)
+    query = timed(lambda: index.availability(gpu_type="a100"), repeat=QUERIES)
+    scan = timed(lambda: scan_free_gpus(snapshot, "a100"), repeat=10)
+    return {
+        "nodes": count,
+        "changed_nodes": changed_lines,
+        "build_ms": build * 1000,
+        "refresh_unchanged_ms": unchanged * 1000,
+        "refresh_changed_ms": changed * 1000,
+        "free_a100s": free,
+        "query_first_ms": first_query * 1000,
+        "query_repeated_ms": query * 1000,
+        "query_parse_and_scan_ms": scan * 1000,
+    }
+
+
+def main():
+    print(json.dumps([measure(count) for count in NODE_COUNTS], indent=2))
+
+
+if __name__ == "__main__":
+    main()
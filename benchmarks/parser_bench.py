@@ -0,0 +1,151 @@
+"""Compare the delimiter based squeue/sacct parsers with the previous whitespace parsers.
+
+Generates 100k-row fixtures with the fake slurm commands, once in the old
+column layout and once in the '|' separated layout the app now requests, and
+times both parsers on them. The old parsers printed four lines per row; they
+are timed with those prints going to /dev/null and with the prints removed,
+to separate parsing cost from print cost. Also reports how many rows each
+parser kept and the memory held by the parsed results. Prints JSON.
+"""
+import os
+import re
+import sys
+import gc
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tracemalloc
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app")]
+from app.utils.parser import parse_squeue_output, parse_sacct_output, squeue_command, sacct_command
+
+USER = "bench"
+LEGACY_SQUEUE = f"squeue -u {USER}"
+# The fake history ends now and reaches back 17 minutes per row
+SINCE = "2000-01-01T00:00:00"
+LEGACY_SACCT = f"sacct -u {USER} --format=JobID,JobName%50,State,Start,End,Elapsed,NodeList -S {SINCE}"
+
+# The parsers as they were before the delimiter based engine, with print()
+# routed through _print so it can be silenced.
+_print = print
+
+sacct_states = ['BOOT_FAIL', 'CANCELLED', 'COMPLETED', 'DEADLINE', 'FAILED', 'NODE_FAIL',
+                'OUT_OF_MEMORY', 'PENDING', 'PREEMPTED', 'RUNNING', 'SUSPENDED', 'TIMEOUT']
+
+
+def legacy_parse_squeue_output(output, username):
+    lines = output.strip().split("\n")
+    if len(lines) < 2:
+        return []
+    header = re.split(r'\s+', lines[0].strip())
+    jobs = []
+    for line in lines[1:]:
+        row = re.split(r'\s+', line.strip())
+        job_name = ""
+        i = 2
+        while (row[i] != username):
+            job_name += row[i] + " "
+            i += 1
+        output_row = row[:2] + [job_name.strip()[:30]] + row[i:]
+        _print(row)
+        _print(output_row)
+        _print(len(output_row))
+        _print(len(header))
+        if len(output_row) == len(header):
+            jobs.append(dict(zip(header, output_row)))
+    return jobs
+
+
+def legacy_parse_sacct_output(output):
+    lines = output.strip().split("\n")
+    if len(lines) < 2:
+        return []
+    header = re.split(r'\s+', lines[0].strip())
+    jobs = []
+    for line in lines[1:]:
+        if set(line.strip()) <= {'-', ' '}:
+            continue
+        _print(line)
+        row = re.split(r'\s+', line.strip())
+        job_name = ""
+        i = 1
+        while i < len(row) and not any(state in row[i] for state in sacct_states):
+            job_name += row[i] + " "
+            i += 1
+        output_row = row[:1] + [job_name.strip()[:30]] + row[i:]
+        _print(output_row)
+        _print(len(output_row))
+        _print(len(header))
+        if len(output_row) == len(header):
+            jobs.append(dict(zip(header, output_row)))
+    return jobs
+
+
+def fixture(command, rows):
+    env = dict(os.environ, FAKE_SQUEUE_JOBS=str(rows), FAKE_SACCT_JOBS=str(rows),
+               PATH=os.path.join(BENCH_DIR, "fake_slurm") + os.pathsep + os.environ["PATH"])
+    return subprocess.run(command, shell=True, env=env, capture_output=True, text=True, check=True).stdout
+
+
+def measure(parse, repeat):
+    samples = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        jobs = parse()
+        samples.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    jobs = parse()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {
+        "rows": len(jobs),
+        "median_ms": statistics.median(samples) * 1000,
+        "min_ms": min(samples) * 1000,
+        "result_mb": retained / 1e6,
+    }
+
+
+def compare(legacy, current, repeat):
+    global _print
+    devnull = open(os.devnull, "w")
+    _print = lambda *args: print(*args, file=devnull)
+    with_prints = measure(legacy, repeat)
+    _print = lambda *args: None
+    without_prints = measure(legacy, repeat)
+    devnull.close()
+    delimited = measure(current, repeat)
+    return {
+        "legacy_with_prints": with_prints,
+        "legacy_without_prints": without_prints,
+        "delimited": delimited,
+        "speedup_vs_legacy_with_prints": with_prints["median_ms"] / delimited["median_ms"],
+        "speedup_vs_legacy_without_prints": without_prints["median_ms"] / delimited["median_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    legacy_squeue = fixture(LEGACY_SQUEUE, args.rows)
+    legacy_sacct = fixture(LEGACY_SACCT, args.rows)
+    squeue = fixture(squeue_command(USER), args.rows)
+    sacct = fixture(sacct_command(USER, starttime=SINCE), args.rows)
+    print(json.dumps({
+        "rows": args.rows,
+        "squeue": compare(lambda: legacy_parse_squeue_output(legacy_squeue, USER),
+                          lambda: parse_squeue_output(squeue), args.repeat),
+        "sacct": compare(lambda: legacy_parse_sacct_output(legacy_sacct),
+                         lambda: parse_sacct_output(sacct), args.repeat),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
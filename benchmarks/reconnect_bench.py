@@ -0,0 +1,77 @@
+"""Measure how quickly the session supervisor recovers from dropped connections.
+
+Starts the local stub SSH server, connects an SSHConnectionManager to it and
+repeatedly kills the connection, both while idle and while an idempotent
+command is in flight. Prints the results as JSON.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app"), os.path.dirname(os.path.abspath(__file__))]
+from stub_ssh_server import StubSSHServer
+
+
+def make_manager(port, check_interval):
+    from app.ssh_connection import SSHConnectionManager
+    from app.session_supervisor import SessionSupervisor
+    manager = SSHConnectionManager()
+    manager.username, manager.password = "bench", "bench"
+    manager.host, manager.port = "127.0.0.1", port
+    manager.supervisor = SessionSupervisor(manager, check_interval=check_interval)
+    manager.connect()
+    return manager
+
+
+def wait_for_reconnect(manager, count, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while manager.supervisor.reconnect_count < count:
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Supervisor did not reconnect")
+        time.sleep(0.01)
+
+
+async def in_flight_round(server, manager):
+    """Drop the connection under a running idempotent command."""
+    start = time.perf_counter()
+    task = asyncio.create_task(manager.run_command_async("sleep 0.3; echo ok", idempotent=True))
+    await asyncio.sleep(0.1)
+    server.drop_connections()
+    result = await task
+    return {"ok": result.ok and result.stdout == "ok", "total_seconds": time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--check-interval", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = StubSSHServer()
+    port = server.start()
+    manager = make_manager(port, args.check_interval)
+
+    idle_latencies = []
+    for _ in range(args.rounds):
+        expected = manager.supervisor.reconnect_count + 1
+        dropped_at = time.perf_counter()
+        server.drop_connections()
+        wait_for_reconnect(manager, expected)
+        idle_latencies.append(time.perf_counter() - dropped_at)
+
+    in_flight = [asyncio.run(in_flight_round(server, manager)) for _ in range(args.rounds)]
+
+    manager.close()
+    server.stop()
+    print(json.dumps({
+        "idle_drop_to_reconnected_seconds": idle_latencies,
+        "supervisor": manager.supervisor.stats(),
+        "in_flight_retries": in_flight,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
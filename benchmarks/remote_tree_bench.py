@@ -0,0 +1,121 @@
+"""Measure how fast the job screen's remote file tree answers over SFTP.
+
+Builds a synthetic home directory (--directories top-level directories,
+each with --subdirectories subdirectories and --files files), serves it
+over SFTP from the stub SSH server with --latency seconds added to every
+request, and browses it with RemoteFiles like a user would: list the
+home directory, then expand top-level directories and one of their
+subdirectories, pausing --think seconds before each expansion. After the
+listings' TTL has passed it browses the same directories again, which
+only checks their mtimes. This runs with the cache and prefetch, with
+the cache alone, and with plain SFTP listings (every expansion lists the
+directory again, as walking a mount without a cache does). Prints the
+time to each answer and the SFTP requests made as JSON.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, BENCH_DIR]
+from stub_ssh_server import StubSSHServer
+from tunnel_bench import percentiles
+
+# RemoteFiles options per mode; None lists every directory straight over SFTP
+MODES = {
+    "cached_prefetch": {},
+    "cached": {"prefetch": 0},
+    "uncached": None,
+}
+
+
+def build_tree(root, directories, subdirectories, files):
+    for directory in range(directories):
+        for subdirectory in range(subdirectories):
+            os.makedirs(os.path.join(root, f"project{directory:03}", f"run{subdirectory:03}"))
+        for number in range(files):
+            open(os.path.join(root, f"project{directory:03}", f"job{number:04}.sh"), "w").close()
+
+
+def timed(call, *args):
+    start = time.perf_counter()
+    call(*args)
+    return time.perf_counter() - start
+
+
+def browse(list_dir, directories, think):
+    """Expand each directory and its first subdirectory; returns the seconds each took."""
+    times = []
+    for directory in directories:
+        time.sleep(think)
+        times.append(timed(list_dir, directory))
+        time.sleep(think)
+        times.append(timed(list_dir, f"{directory}/run000"))
+    return times
+
+
+def measure(manager, server, mode, args):
+    import paramiko
+    from app.remote_files import RemoteFiles
+    requests = server.sftp_requests
+    if MODES[mode] is None:
+        sftp = paramiko.SFTPClient.from_transport(manager.get_transport())
+        list_dir = sftp.listdir_attr
+    else:
+        remote_files = RemoteFiles(manager, **{"ttl": args.ttl, **MODES[mode]})
+        list_dir = remote_files.list_dir
+    first_listing = timed(list_dir, ".")
+    directories = sorted(entry.filename if MODES[mode] is None else entry.name for entry in list_dir("."))
+    expand = browse(list_dir, directories[:args.expand], args.think)
+    time.sleep(args.ttl)
+    revisit = [timed(list_dir, ".")] + browse(list_dir, directories[:args.expand], args.think)
+    result = {
+        "first_listing_ms": first_listing * 1000,
+        "expand_ms": percentiles(expand),
+        "revisit_ms": percentiles(revisit),
+        "sftp_requests": server.sftp_requests - requests,
+    }
+    if MODES[mode] is None:
+        sftp.close()
+    else:
+        result.update(listed=remote_files.listed, revalidated=remote_files.revalidated)
+        remote_files.clear()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--directories", type=int, default=30)
+    parser.add_argument("--subdirectories", type=int, default=10)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--expand", type=int, default=10, help="Top-level directories to expand")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to each SFTP request")
+    parser.add_argument("--think", type=float, default=0.2, help="Seconds between expansions")
+    parser.add_argument("--ttl", type=float, default=5,
+                        help="Listing TTL, shortened so revisits happen sooner but longer than one browse")
+    args = parser.parse_args()
+
+    from app.ssh_connection import SSHConnectionManager
+    home = tempfile.mkdtemp()
+    build_tree(home, args.directories, args.subdirectories, args.files)
+    server = StubSSHServer(sftp_root=home, sftp_latency=args.latency)
+    port = server.start()
+    manager = SSHConnectionManager()
+    manager.username, manager.password = "bench", "bench"
+    manager.host, manager.port = "127.0.0.1", port
+    manager.connect()
+    try:
+        results = {mode: measure(manager, server, mode, args) for mode in MODES}
+    finally:
+        manager.close()
+        server.stop()
+        shutil.rmtree(home)
+    print(json.dumps({"latency": args.latency, "think": args.think, "ttl": args.ttl, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Compare the shared resource monitor against one sampling loop per job.
+
+Monitors 1, 5 and 20 running jobs of the fake queue (with nvidia-smi
+sampling on) against the local stub SSH server and takes --rounds samples
+three ways: one ResourceMonitor for all jobs over exec channels, the same
+through the helper agent, and one ResourceMonitor per job sampled
+concurrently, as separate polling loops would. Reports the exec channels
+opened and the wall time per round. --exec-latency adds a per-channel
+startup delay on the server to mimic a loaded login node. Prints the
+results as JSON.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app"), BENCH_DIR]
+from stub_ssh_server import StubSSHServer
+
+USER = "bench"
+JOB_COUNTS = (1, 5, 20)
+# Every third fake queue job is pending, so 30 jobs have 20 running
+QUEUE_JOBS = 30
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "mean_ms": statistics.mean(samples) * 1000,
+        "p95_ms": samples[max(int(len(samples) * 0.95) - 1, 0)] * 1000,
+    }
+
+
+async def measure(server, monitors, rounds):
+    """Channels opened and seconds taken per round of sampling every monitor once."""
+    # The first round also looks up the allocations
+    await asyncio.gather(*(monitor.sample() for monitor in monitors))
+    channels_before = server.exec_count
+    durations = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await asyncio.gather(*(monitor.sample() for monitor in monitors))
+        durations.append(time.perf_counter() - start)
+    errors = [str(monitor.error) for monitor in monitors if monitor.error]
+    if errors:
+        raise RuntimeError(errors[0])
+    return {"channels_per_round": (server.exec_count - channels_before) / rounds, **summarize(durations)}
+
+
+async def run(server, manager, helper, rounds):
+    from app.command_cache import CommandCache
+    from app.resource_monitor import ResourceMonitor
+    from app.utils.parser import parse_squeue_output, squeue_command
+    jobs = parse_squeue_output((await manager.run_command_async(squeue_command(USER))).stdout)
+    running = [job.job_id for job in jobs if job.state == "R"]
+    exec_cache = CommandCache(manager)
+    helper_cache = CommandCache(manager, helper)
+    await helper.start()
+
+    def monitor(cache, job_ids, helper_agent=None):
+        resource_monitor = ResourceMonitor(cache, helper_agent, gpu=True)
+        for job_id in job_ids:
+            resource_monitor.watch(job_id)
+        return resource_monitor
+
+    results = {}
+    for count in JOB_COUNTS:
+        job_ids = running[:count]
+        results[count] = {
+            "shared_exec": await measure(server, [monitor(exec_cache, job_ids)], rounds),
+            "shared_helper": await measure(server, [monitor(helper_cache, job_ids, helper)], rounds),
+            "loop_per_job": await measure(server, [monitor(exec_cache, [job_id]) for job_id in job_ids], rounds),
+        }
+    helper.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--exec-latency", type=float, default=0.05,
+                        help="Seconds of simulated channel/shell startup cost per exec")
+    args = parser.parse_args()
+
+    from app.ssh_connection import SSHConnectionManager
+    from app.helper_agent_manager import HelperAgentManager
+    os.environ.update(FAKE_SQUEUE_JOBS=str(QUEUE_JOBS), USER=USER)
+    server = StubSSHServer(path_prefix=os.path.join(BENCH_DIR, "fake_slurm"), exec_latency=args.exec_latency)
+    port = server.start()
+    manager = SSHConnectionManager()
+    manager.username, manager.password = USER, USER
+    manager.host, manager.port = "127.0.0.1", port
+    manager.connect()
+    try:
+        results = asyncio.run(run(server, manager, HelperAgentManager(manager), args.rounds))
+    finally:
+        manager.close()
+        server.stop()
+    print(json.dumps({"exec_latency": args.exec_latency, "rounds": args.rounds, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
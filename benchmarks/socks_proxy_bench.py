@@ -0,0 +1,108 @@
+"""Check and measure the SOCKS5 proxy (dynamic forward) end to end.
+
+Runs the stub SSH server and the benchmark service (echo_service.py) in a
+child process and starts the proxy with TunnelManager.setup_proxy. The
+stub forwards every host name to 127.0.0.1, so clients reach the service
+by asking for any node and the service's port. It first checks the
+protocol:
+- CONNECT by node name, IPv4 and IPv6 address, with data sent before the reply,
+- a port nothing listens on (connection refused),
+- an unsupported command and a client that insists on a password.
+Then it measures connect latency (including the SOCKS handshake), round
+trips and bulk MB/s through the proxy like tunnel_bench.py, at 1, 8 and
+64 concurrent clients. Prints the results as JSON; --output and
+--baseline work as in tunnel_bench.py.
+"""
+import os
+import sys
+import socket
+import struct
+import argparse
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, BENCH_DIR]
+from echo_service import receive_exactly, start_far_end
+from tunnel_bench import add_arguments, measure, report
+
+
+def handshake(sock, host, port, command=1, methods=b"\0", early=b""):
+    """Greet the proxy and ask for host:port; returns the reply code.
+    early is sent straight after the request, before the reply."""
+    sock.sendall(bytes((5, len(methods))) + methods)
+    version, method = receive_exactly(sock, 2)
+    if method == 0xFF:
+        return method
+    try:
+        address = bytes((1,)) + socket.inet_pton(socket.AF_INET, host)
+    except OSError:
+        try:
+            address = bytes((4,)) + socket.inet_pton(socket.AF_INET6, host)
+        except OSError:
+            address = bytes((3, len(host))) + host.encode()
+    sock.sendall(bytes((5, command, 0)) + address + struct.pack("!H", port) + early)
+    reply = receive_exactly(sock, 10)
+    return reply[1]
+
+
+def through_proxy(proxy_port, host, port):
+    """Connect function opening sockets to host:port through the proxy."""
+    def connect():
+        sock = socket.create_connection(("127.0.0.1", proxy_port))
+        code = handshake(sock, host, port)
+        if code != 0:
+            sock.close()
+            raise ConnectionError(f"Proxy refused {host}:{port} with reply {code}")
+        return sock
+    return connect
+
+
+def check(proxy_port, service_port, closed_port):
+    """Protocol checks; returns {name: passed}."""
+    results = {}
+    for name, host in (("connect_by_name", "idun-01-01"), ("connect_ipv4", "10.0.0.1"), ("connect_ipv6", "::1")):
+        with socket.create_connection(("127.0.0.1", proxy_port)) as sock:
+            code = handshake(sock, host, service_port, early=b"eearly")
+            results[name] = code == 0 and receive_exactly(sock, 5) == b"early"
+    with socket.create_connection(("127.0.0.1", proxy_port)) as sock:
+        results["connection_refused"] = handshake(sock, "idun-01-01", closed_port) == 5
+    with socket.create_connection(("127.0.0.1", proxy_port)) as sock:
+        results["bind_not_supported"] = handshake(sock, "idun-01-01", service_port, command=2) == 7
+    with socket.create_connection(("127.0.0.1", proxy_port)) as sock:
+        results["password_only_rejected"] = handshake(sock, "idun-01-01", service_port, methods=b"\2") == 0xFF
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    from app.ssh_connection import SSHConnectionManager
+    from app.tunnel_manager import TunnelManager, PROXY_KEY
+    child, ports = start_far_end()
+    os.environ.update(IDUN_USERNAME="bench", IDUN_PASSWORD="bench", IDUN_SSH_HOST="127.0.0.1",
+                      IDUN_SSH_PORT=str(ports["ssh"]))
+    ssh_manager = SSHConnectionManager()
+    ssh_manager.connect()
+    tunnel_manager = TunnelManager(ssh_manager)
+    tunnel_manager.setup_proxy(None)
+    proxy_port = tunnel_manager.tunnels[PROXY_KEY].local_port
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        checks = check(proxy_port, ports["service"], unused.getsockname()[1])
+    connect = through_proxy(proxy_port, "idun-01-01", ports["service"])
+    levels = [measure(connect, clients, args.pings, args.megabytes * 1024 * 1024) for clients in args.clients]
+    stats = tunnel_manager.stats()[PROXY_KEY]
+    tunnel_manager.close_all_tunnels()
+    ssh_manager.close()
+    child.communicate()
+
+    report({"checks": checks, "pings": args.pings, "megabytes": args.megabytes,
+            "channels_opened": stats.opened, "open_errors": stats.open_errors, "health": stats.health,
+            "levels": levels}, args)
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Measure time-to-first-frame and time-to-first-job-table of the TUI.
+
+Each run starts a fresh interpreter that launches the app headless (Textual's
+run_test) with stored credentials pointing at the local stub SSH server, so
+import time, the SSH handshake and the first squeue all count. Prints the
+per-run samples and a summary as JSON.
+"""
+import time
+T0 = time.perf_counter()
+import os
+import sys
+import json
+import asyncio
+import argparse
+import statistics
+import subprocess
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+
+
+async def measure_once(timeout):
+    sys.path[:0] = [ROOT, os.path.join(ROOT, "app")]
+    from app.ui import IDUNTUI
+    app = IDUNTUI()
+    marks = {}
+
+    # Headless apps skip painting, but every frame still goes through
+    # _display, so the first call marks the first frame.
+    display = app._display
+
+    def timed_display(screen, renderable):
+        if renderable is not None and "first_frame" not in marks:
+            marks["first_frame"] = time.perf_counter() - T0
+            marks["paramiko_imported_at_first_frame"] = "paramiko" in sys.modules
+        return display(screen, renderable)
+
+    app._display = timed_display
+
+    async def wait_for_job_table():
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            table = getattr(app.screen, "job_table", None) if app.is_running else None
+            if table is not None and table.row_count > 0:
+                marks["first_job_table"] = time.perf_counter() - T0
+                return
+            await asyncio.sleep(0.002)
+        raise TimeoutError("Job table was never filled")
+
+    async with app.run_test(size=(160, 50)):
+        await wait_for_job_table()
+        app.action_quit()
+    return {
+        "first_frame_seconds": marks["first_frame"],
+        "first_job_table_seconds": marks["first_job_table"],
+        "paramiko_imported_at_first_frame": marks["paramiko_imported_at_first_frame"],
+    }
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "mean_ms": statistics.mean(samples) * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "min_ms": samples[0] * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(measure_once(args.timeout))))
+        return
+
+    sys.path.insert(0, BENCH_DIR)
+    from stub_ssh_server import StubSSHServer
+    server = StubSSHServer(path_prefix=os.path.join(BENCH_DIR, "fake_slurm"))
+    port = server.start()
+    env = dict(os.environ, IDUN_USERNAME="bench", IDUN_PASSWORD="bench", IDUN_SSH_HOST="127.0.0.1",
+               IDUN_SSH_PORT=str(port), IDUN_REMOTE_HELPER="0")
+    runs = []
+    try:
+        for _ in range(args.runs):
+            child = subprocess.run([sys.executable, os.path.abspath(__file__), "--child",
+                                    "--timeout", str(args.timeout)],
+                                   env=env, cwd=ROOT, capture_output=True, text=True, check=True)
+            runs.append(json.loads(child.stdout.strip().splitlines()[-1]))
+    finally:
+        server.stop()
+    print(json.dumps({
+        "runs": runs,
+        "first_frame": summarize([run["first_frame_seconds"] for run in runs]),
+        "first_job_table": summarize([run["first_job_table_seconds"] for run in runs]),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Local stand-in for the IDUN login node.
+
+A small paramiko SSH server that accepts any password, runs exec requests
+with the local shell, keeps interactive shells open and forwards
+direct-tcpip channels to 127.0.0.1 (whatever node name is asked for) and
+serves SFTP (read-only listings of a local directory standing in for the
+home directory), so
+the app can be exercised on one machine with no network. Connections can
+be dropped on demand to simulate the login node going away.
+"""
+import os
+import select
+import socket
+import struct
+import subprocess
+import threading
+import paramiko
+from paramiko.common import cMSG_CHANNEL_SUCCESS
+
+FORWARD_CHUNK = 65536
+
+
+class _StubTransport(paramiko.Transport):
+    """Transport that lets exec threads wait until their request was acknowledged.
+
+    paramiko only sends the reply to a channel request after the server
+    callback returns, so a fast command could otherwise close its channel
+    before the client has seen the exec succeed.
+    """
+
+    def __init__(self, sock):
+        super().__init__(sock)
+        self._acknowledged = {}
+        self._acknowledged_lock = threading.Lock()
+
+    def request_acknowledged(self, remote_chanid):
+        with self._acknowledged_lock:
+            return self._acknowledged.setdefault(remote_chanid, threading.Event())
+
+    def _send_user_message(self, data):
+        super()._send_user_message(data)
+        raw = data.asbytes()
+        if raw[:1] == cMSG_CHANNEL_SUCCESS:
+            self.request_acknowledged(struct.unpack(">I", raw[1:5])[0]).set()
+
+
+class _StubServerInterface(paramiko.ServerInterface):
+    def __init__(self, server):
+        self.server = server
+        self.direct_tcpip = {}
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        try:
+            target = socket.create_connection(("127.0.0.1", destination[1]), timeout=5)
+        except OSError:
+            return paramiko.OPEN_FAILED_CONNECT_FAILED
+        self.direct_tcpip[chanid] = target
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        threading.Thread(target=self._discard, args=(channel,), daemon=True).start()
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.server.run_exec, args=(channel, command.decode()),
+                         daemon=True).start()
+        return True
+
+    @staticmethod
+    def _discard(channel):
+        while channel.recv(1024):
+            pass
+
+
+class _StubSFTPServer(paramiko.SFTPServerInterface):
+    """Lists and stats files under the server's sftp_root; relative paths
+    start there, like a login shell's home directory."""
+
+    def __init__(self, transport_server, server):
+        super().__init__(transport_server)
+        self.server = server
+
+    def _local(self, path):
+        return os.path.join(self.server.sftp_root, path.lstrip("/"))
+
+    def _answer(self, call, *args):
+        with self.server._lock:
+            self.server.sftp_requests += 1
+        if self.server.sftp_latency:
+            threading.Event().wait(self.server.sftp_latency)
+        try:
+            return call(*args)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def canonicalize(self, path):
+        return os.path.normpath(os.path.join("/", path))
+
+    def list_folder(self, path):
+        local = self._local(path)
+        return self._answer(lambda: [paramiko.SFTPAttributes.from_stat(os.lstat(os.path.join(local, name)), name)
+                                     for name in os.listdir(local)])
+
+    def stat(self, path):
+        return self._answer(lambda: paramiko.SFTPAttributes.from_stat(os.stat(self._local(path))))
+
+    def lstat(self, path):
+        return self._answer(lambda: paramiko.SFTPAttributes.from_stat(os.lstat(self._local(path))))
+
+
+class StubSSHServer:
+    def __init__(self, host="127.0.0.1", port=0, path_prefix=None, exec_latency=0.0,
+                 sftp_root=None, sftp_latency=0.0):
+        """
+        :param path_prefix: Directory put first on PATH for exec requests, e.g.
+                            one holding fake squeue/sacct scripts.
+        :param exec_latency: Seconds to wait before starting each command,
+                             to mimic a loaded login node.
+        :param sftp_root: Directory SFTP clients see as their home directory
+                          (the current directory by default).
+        :param sftp_latency: Seconds to wait before answering each SFTP
+                             listing or stat, to mimic the network.
+        """
+        self.host = host
+        self.port = port
+        self.path_prefix = path_prefix
+        self.exec_latency = exec_latency
+        self.sftp_root = sftp_root or os.getcwd()
+        self.sftp_latency = sftp_latency
+        self.sftp_requests = 0
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.transports = []
+        self.exec_count = 0
+        self._listen_socket = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listen_socket.bind((self.host, self.port))
+        self._listen_socket.listen(64)
+        self.port = self._listen_socket.getsockname()[1]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self.port
+
+    def stop(self):
+        if self._listen_socket:
+            self._listen_socket.close()
+            self._listen_socket = None
+        self.drop_connections()
+
+    def drop_connections(self):
+        """Kill every open SSH connection, like an idle timeout on the login node."""
+        with self._lock:
+            transports, self.transports = self.transports, []
+        for transport in transports:
+            transport.close()
+
+    def _accept_loop(self):
+        while self._listen_socket:
+            try:
+                client, _ = self._listen_socket.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client):
+        transport = _StubTransport(client)
+        transport.add_server_key(self.host_key)
+        transport.set_subsystem_handler("sftp", paramiko.SFTPServer, _StubSFTPServer, self)
+        interface = _StubServerInterface(self)
+        try:
+            transport.start_server(server=interface)
+        except Exception:
+            return
+        with self._lock:
+            self.transports.append(transport)
+        # paramiko closes channels that are garbage collected, so session
+        # channels are kept here until they close.
+        sessions = []
+        while transport.is_active():
+            channel = transport.accept(timeout=1)
+            sessions = [session for session in sessions if not session.closed]
+            if channel is None:
+                continue
+            target = interface.direct_tcpip.pop(channel.get_id(), None)
+            if target is not None:
+                threading.Thread(target=self._forward, args=(channel, target), daemon=True).start()
+            else:
+                sessions.append(channel)
+
+    def run_exec(self, channel, command):
+        with self._lock:
+            self.exec_count += 1
+        channel.get_transport().request_acknowledged(channel.remote_chanid).wait(5)
+        if self.exec_latency:
+            threading.Event().wait(self.exec_latency)
+        env = dict(os.environ)
+        if self.path_prefix:
+            env["PATH"] = f"{self.path_prefix}{os.pathsep}{env.get('PATH', '')}"
+        process = subprocess.Popen(command, shell=True, env=env, stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        def pump_stdin():
+            try:
+                while True:
+                    data = channel.recv(FORWARD_CHUNK)
+                    if not data:
+                        break
+                    process.stdin.write(data)
+                    process.stdin.flush()
+            except (OSError, EOFError):
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+
+        def pump(stream, send):
+            try:
+                for chunk in iter(lambda: stream.read1(FORWARD_CHUNK), b""):
+                    send(chunk)
+            except (OSError, EOFError):
+                process.kill()
+
+        threading.Thread(target=pump_stdin, daemon=True).start()
+        stderr_thread = threading.Thread(target=pump, args=(process.stderr, channel.sendall_stderr),
+                                         daemon=True)
+        stderr_thread.start()
+        pump(process.stdout, channel.sendall)
+        stderr_thread.join()
+        status = process.wait()
+        try:
+            # Report signals the way a shell does (128 + signal number)
+            channel.send_exit_status(status if status >= 0 else 128 - status)
+            channel.shutdown_write()
+            channel.close()
+        except (OSError, EOFError):
+            pass
+
+    @staticmethod
+    def _forward(channel, target):
+        """Forward until both sides have closed, passing a half-close (EOF)
+        from one side on to the other."""
+        readers = [channel, target]
+        try:
+            while readers:
+                r, _, _ = select.select(readers, [], [])
+                if channel in r:
+                    data = channel.recv(FORWARD_CHUNK)
+                    if data:
+                        target.sendall(data)
+                    else:
+                        readers.remove(channel)
+                        target.shutdown(socket.SHUT_WR)
+                if target in r:
+                    data = target.recv(FORWARD_CHUNK)
+                    if data:
+                        channel.sendall(data)
+                    else:
+                        readers.remove(target)
+                        channel.shutdown_write()
+        except (OSError, EOFError):
+            pass
+        finally:
+            channel.close()
+            target.close()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--path-prefix", default=None,
+                        help="Directory with fake slurm commands to put first on PATH")
+    args = parser.parse_args()
+    server = StubSSHServer(port=args.port, path_prefix=args.path_prefix)
+    print(f"Stub SSH server listening on 127.0.0.1:{server.start()}")
+    threading.Event().wait()
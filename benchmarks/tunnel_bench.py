@@ -0,0 +1,158 @@
+"""Measure tunnel latency and throughput with 1, 8 and 64 concurrent clients.
+
+Runs the stub SSH server and the benchmark service (echo_service.py) in a
+child process and opens one tunnel to the service with TunnelManager,
+timing the setup (setup_ms, which includes probing the service). At
+each level of concurrency every client:
+- connects and waits for its first echoed byte (connect latency, which
+  includes opening the client's SSH channel),
+- sends --pings small messages one at a time and waits for each echo
+  (round trip latency),
+- then all clients together upload and download their share of
+  --megabytes (bulk MB/s across all clients).
+Latencies are reported as percentiles in milliseconds. Prints the results
+as JSON; --output also writes them to a file, and --baseline adds the
+ratio of each figure to the same figure in an earlier results file.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import threading
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, BENCH_DIR]
+from echo_service import receive_exactly, start_far_end, direct, upload, download
+
+CLIENT_COUNTS = (1, 8, 64)
+PING_SIZE = 64
+
+
+def percentiles(samples):
+    """p50, p90, p99 and max of samples in seconds, as milliseconds."""
+    cuts = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return {"p50": cuts[49] * 1000, "p90": cuts[89] * 1000, "p99": cuts[98] * 1000, "max": max(samples) * 1000}
+
+
+def run_clients(count, client):
+    """Run client(index) on count threads started together; returns their
+    results and the wall time from the start to the last one finishing."""
+    results = [None] * count
+    barrier = threading.Barrier(count + 1)
+
+    def run(index):
+        barrier.wait()
+        results[index] = client(index)
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def ping_client(connect, pings):
+    message = os.urandom(PING_SIZE)
+    start = time.perf_counter()
+    with connect() as sock:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(b"e\0")
+        receive_exactly(sock, 1)
+        connect = time.perf_counter() - start
+        round_trips = []
+        for _ in range(pings):
+            start = time.perf_counter()
+            sock.sendall(message)
+            if receive_exactly(sock, PING_SIZE) != message:
+                raise AssertionError("Echo does not match what was sent")
+            round_trips.append(time.perf_counter() - start)
+    return connect, round_trips
+
+
+def measure(connect, clients, pings, size):
+    """One level of concurrency, each client opening its sockets with connect()."""
+    results, _ = run_clients(clients, lambda _index: ping_client(connect, pings))
+    share = size // clients
+    _, upload_seconds = run_clients(clients, lambda _index: upload(connect, share))
+    _, download_seconds = run_clients(clients, lambda _index: download(connect, share))
+    return {
+        "clients": clients,
+        "connect_ms": percentiles([connect for connect, _ in results]),
+        "round_trip_ms": percentiles([sample for _, round_trips in results for sample in round_trips]),
+        "upload_mb_s": share * clients / upload_seconds / 1e6,
+        "download_mb_s": share * clients / download_seconds / 1e6,
+    }
+
+
+def compare(level, baseline):
+    """Ratio of each figure in level to the one in baseline (current / baseline)."""
+    ratios = {}
+    for key, value in level.items():
+        if key == "clients" or key not in baseline:
+            continue
+        if isinstance(value, dict):
+            ratios[key] = {name: value[name] / baseline[key][name] for name in value if baseline[key].get(name)}
+        elif baseline[key]:
+            ratios[key] = value / baseline[key]
+    return ratios
+
+
+def add_arguments(parser):
+    parser.add_argument("--clients", type=int, nargs="+", default=list(CLIENT_COUNTS))
+    parser.add_argument("--pings", type=int, default=200, help="Round trips per client")
+    parser.add_argument("--megabytes", type=int, default=64,
+                        help="Bytes moved each way per level, split between its clients")
+    parser.add_argument("--output", help="Also write the results to this file")
+    parser.add_argument("--baseline", help="Results file of an earlier run to compare with")
+
+
+def report(results, args):
+    """Print results (with "levels" as measure() returns them) as JSON,
+    compared with --baseline and saved to --output if given."""
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = {level["clients"]: level for level in json.load(file)["levels"]}
+        for level in results["levels"]:
+            if level["clients"] in baseline:
+                level["vs_baseline"] = compare(level, baseline[level["clients"]])
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    from app.ssh_connection import SSHConnectionManager
+    from app.tunnel_manager import TunnelManager
+    child, ports = start_far_end()
+    os.environ.update(IDUN_USERNAME="bench", IDUN_PASSWORD="bench", IDUN_SSH_HOST="127.0.0.1",
+                      IDUN_SSH_PORT=str(ports["ssh"]))
+    ssh_manager = SSHConnectionManager()
+    ssh_manager.connect()
+    tunnel_manager = TunnelManager(ssh_manager)
+    # The stub server forwards every node name to 127.0.0.1
+    start = time.perf_counter()
+    tunnel_manager.setup_tunnel("localhost", remote_port=ports["service"])
+    setup = time.perf_counter() - start
+    local_port = tunnel_manager.tunnels[("localhost", ports["service"])].local_port
+    levels = [measure(direct(local_port), clients, args.pings, args.megabytes * 1024 * 1024)
+              for clients in args.clients]
+    tunnel_manager.close_all_tunnels()
+    ssh_manager.close()
+    child.communicate()
+
+    report({"pings": args.pings, "megabytes": args.megabytes, "setup_ms": setup * 1000, "levels": levels}, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Measure bulk throughput through a tunnel, now and with the previous data path.
+
+Runs the stub SSH server and the benchmark service (echo_service.py) in a
+child process, so the far end does not share the GIL with the tunnel as
+it would not on a real node. A tunnel to the service is opened with
+TunnelManager and one client moves --megabytes through it in each
+direction. The same transfers straight over a channel give the ceiling of
+the SSH transport itself, and for comparison they also run through the
+previous forwarding loop (1 KiB reads and unchecked blocking sends on a
+thread per tunnel). Prints MB/s as JSON.
+"""
+import os
+import sys
+import json
+import time
+import select
+import socket
+import struct
+import argparse
+import threading
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, BENCH_DIR]
+from echo_service import CHUNK, start_far_end, direct, upload, download
+from app.config import TUNNEL_WINDOW_SIZE
+
+
+def previous_tunnel(transport, local_port, remote_port):
+    """The forwarding loop tunnels used before the engine: one thread, one
+    client at a time, 1 KiB reads and plain send() calls."""
+    listener = socket.create_server(("127.0.0.1", local_port))
+
+    def forward_socket(client_socket, remote_channel):
+        try:
+            while True:
+                r, _, _ = select.select([client_socket, remote_channel], [], [])
+                if client_socket in r:
+                    data = client_socket.recv(1024)
+                    if not data:
+                        break
+                    remote_channel.send(data)
+                if remote_channel in r:
+                    data = remote_channel.recv(1024)
+                    if not data:
+                        break
+                    client_socket.send(data)
+        finally:
+            client_socket.close()
+            remote_channel.close()
+
+    def tunnel_forward():
+        while True:
+            try:
+                client_socket, _ = listener.accept()
+            except OSError:
+                break
+            channel = transport.open_channel("direct-tcpip", ("localhost", remote_port), ("127.0.0.1", local_port))
+            forward_socket(client_socket, channel)
+    threading.Thread(target=tunnel_forward, daemon=True).start()
+    return listener
+
+
+def direct_channel(transport, port, size):
+    """MB/s straight over a channel with blocking calls and no local socket,
+    i.e. what the SSH transport itself manages."""
+    def open_channel():
+        return transport.open_channel("direct-tcpip", ("localhost", port), ("127.0.0.1", 0),
+                                      window_size=TUNNEL_WINDOW_SIZE)
+    payload = memoryview(os.urandom(CHUNK))
+    start = time.perf_counter()
+    channel = open_channel()
+    channel.sendall(b"s" + struct.pack("!Q", size))
+    sent = 0
+    while sent < size:
+        channel.sendall(payload[:min(size - sent, CHUNK)])
+        sent += min(size - sent, CHUNK)
+    reply = b""
+    while not reply.endswith(b"\n"):
+        reply += channel.recv(64)
+    upload_mb_s = size / (time.perf_counter() - start) / 1e6
+    channel.close()
+
+    start = time.perf_counter()
+    channel = open_channel()
+    channel.sendall(b"g" + struct.pack("!Q", size))
+    received = 0
+    while received < size and (data := channel.recv(CHUNK)):
+        received += len(data)
+    download_mb_s = size / (time.perf_counter() - start) / 1e6
+    channel.close()
+    if int(reply) != size or received != size:
+        raise AssertionError("Direct channel transfer incomplete")
+    return {"upload_mb_s": upload_mb_s, "download_mb_s": download_mb_s}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure(port, size):
+    return {"upload_mb_s": size / upload(direct(port), size) / 1e6,
+            "download_mb_s": size / download(direct(port), size) / 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=int, default=256)
+    parser.add_argument("--previous-megabytes", type=int, default=32,
+                        help="Transfer size for the previous loop, which is much slower")
+    args = parser.parse_args()
+    size = args.megabytes * 1024 * 1024
+    previous_size = args.previous_megabytes * 1024 * 1024
+    results = {"megabytes": args.megabytes}
+
+    from app.ssh_connection import SSHConnectionManager
+    from app.tunnel_manager import TunnelManager
+    child, ports = start_far_end()
+    os.environ.update(IDUN_USERNAME="bench", IDUN_PASSWORD="bench", IDUN_SSH_HOST="127.0.0.1",
+                      IDUN_SSH_PORT=str(ports["ssh"]))
+    ssh_manager = SSHConnectionManager()
+    ssh_manager.connect()
+    tunnel_manager = TunnelManager(ssh_manager)
+    # The stub server forwards every node name to 127.0.0.1
+    tunnel_manager.setup_tunnel("localhost", remote_port=ports["service"])
+    local_port = tunnel_manager.tunnels[("localhost", ports["service"])].local_port
+    results["engine"] = measure(local_port, size)
+    results["direct_channel"] = direct_channel(ssh_manager.get_transport(), ports["service"], size)
+    tunnel_manager.close_all_tunnels()
+    ssh_manager.close()
+    child.communicate()
+
+    child, ports = start_far_end()
+    os.environ["IDUN_SSH_PORT"] = str(ports["ssh"])
+    ssh_manager = SSHConnectionManager()
+    ssh_manager.connect()
+    local_port = free_port()
+    listener = previous_tunnel(ssh_manager.get_transport(), local_port, ports["service"])
+    results["previous"] = dict(measure(local_port, previous_size), megabytes=args.previous_megabytes)
+    listener.close()
+    ssh_manager.close()
+    child.communicate()
+
+    for direction in ("upload_mb_s", "download_mb_s"):
+        results[f"speedup_{direction[:-5]}"] = results["engine"][direction] / results["previous"][direction]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
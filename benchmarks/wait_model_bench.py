@@ -0,0 +1,95 @@
+"""Measure fitting the queue wait model on a large history.
+
+Fills a temporary history store with 10k and 100k synthetic jobs from the
+fake slurm data, fits the wait model on all but the last day of them, then
+merges that day (about 85 jobs) and reports the time to take it in as the
+wait estimator does, from the jobs outside the fitted span, against
+refitting the whole history. Also reports the time per estimate and the
+size of the saved model. Prints the results as JSON.
+"""
+import os
+import sys
+import json
+import time
+import datetime
+import tempfile
+import statistics
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app"), os.path.join(BENCH_DIR, "fake_slurm")]
+from _jobs import history_jobs
+from app.history_store import HistoryStore
+from app.utils.parser import SACCT_COLUMNS
+from app.utils.wait_model import WaitModel
+
+HISTORY_SIZES = (10_000, 100_000)
+ESTIMATES = 10_000
+
+
+class Host:
+    host = "bench"
+
+
+def timed(function, repeat=1):
+    """Median seconds of function() over repeat runs."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def measure(count, directory):
+    os.environ["FAKE_SACCT_JOBS"] = str(count)
+    rows = [[job[column] for column in SACCT_COLUMNS] for job in history_jobs("bench")]
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=1)).isoformat(timespec="seconds")
+    old = [row for row in rows if row[SACCT_COLUMNS.index("Start")] <= cutoff]
+    new = rows[len(old):]
+
+    store = HistoryStore(Host(), "bench", path=os.path.join(directory, f"history-{count}.sqlite3"))
+    store._merge(old)
+    model = WaitModel()
+    model.update(store.jobs_started_outside(None, None))
+    saved = model.to_json()
+    store._merge(new)
+
+    def incremental():
+        fitted = WaitModel.from_json(saved)
+        fitted.update(store.jobs_started_outside(fitted.first_start, fitted.last_start))
+        return fitted
+    def refit():
+        fitted = WaitModel()
+        fitted.update(store.jobs_started_outside(None, None))
+        return fitted
+    # The running means only differ in rounding, so compare the counts
+    counts = [{group: stats.count for group, stats in fitted.groups.items()} for fitted in (incremental(), refit())]
+    if counts[0] != counts[1]:
+        raise AssertionError("Incremental update and refit disagree")
+
+    load = timed(lambda: WaitModel.from_json(saved), repeat=5)
+    update = timed(incremental, repeat=5) - load
+    full = timed(refit, repeat=3)
+    fitted = refit()
+    now = datetime.datetime.now()
+    estimate = timed(lambda: [fitted.estimate("GPUQ", "a100", 4 * 3600, now) for _ in range(ESTIMATES)], repeat=3)
+    store.close()
+    return {
+        "history_jobs": count,
+        "new_jobs": len(new),
+        "groups": len(fitted.groups),
+        "model_bytes": len(saved),
+        "load_model_ms": load * 1000,
+        "incremental_update_ms": update * 1000,
+        "full_refit_ms": full * 1000,
+        "estimate_us": estimate / ESTIMATES * 1e6,
+    }
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        print(json.dumps([measure(count, directory) for count in HISTORY_SIZES], indent=2))
+
+
+if __name__ == "__main__":
+    main()